@@ -0,0 +1,11 @@
+"""
+Benchmarks run against a local database, e.g. `python -m benchmarks.db_connections` from the app directory.
+Django is set up with the settings of the current ENV profile.
+"""
+import os
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
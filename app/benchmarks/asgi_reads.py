@@ -0,0 +1,67 @@
+"""
+Compares the read endpoints served by the sync WSGI workers with the async
+views under ASGI. Start both servers on the same database, e.g.
+
+    gunicorn --workers=5 config.wsgi -b 127.0.0.1:8888
+    gunicorn --workers=5 -k uvicorn.workers.UvicornWorker config.asgi -b 127.0.0.1:8889
+
+then run
+
+    python -m benchmarks.asgi_reads --email guest@example.com \\
+        --server wsgi=http://127.0.0.1:8888 --server asgi=http://127.0.0.1:8889
+
+The requests are authenticated with an access token minted for the user,
+whose most recently created trip is read unless --trip is given.
+"""
+import argparse
+import json
+
+from . import setup_django
+from .http import run_load
+
+
+def get_paths(trip):
+    from destinations.models import Location
+
+    location = Location.objects.filter(destination_id=trip.destination_id).first()
+    paths = [
+        f'/trips/trips/{trip.id}/',
+        f'/trips/trips/{trip.id}/itinerary-items/',
+        f'/trips/trips/{trip.id}/itinerary-items/?fields=id,day,content_type,activity',
+        '/destinations/destinations/',
+        f'/destinations/destinations/{trip.destination_id}/locations/',
+    ]
+    if location:
+        paths.append(f'/destinations/locations/{location.id}/experiences/')
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--trip')
+    parser.add_argument('--server', action='append', required=True, metavar='NAME=URL')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from custom_auth.models import User
+    from custom_auth.tokens import ClaimsRefreshToken
+    from trips.models import Trip
+
+    user = User.objects.get(email=args.email)
+    trips = Trip.objects.filter(created_by=user)
+    trip = trips.get(pk=args.trip) if args.trip else trips.latest('date_created')
+    headers = {'Authorization': f'Bearer {ClaimsRefreshToken.for_user(user).access_token}'}
+    paths = get_paths(trip)
+
+    for server in args.server:
+        name, base_url = server.split('=', 1)
+        urls = [base_url.rstrip('/') + path for path in paths]
+        result = run_load(urls, args.requests, args.concurrency, headers=headers, warmup=1)
+        print(f"{name:>8}: {json.dumps(result)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares two result files of benchmarks.endpoints, e.g. of the main branch and of a change:
+
+    python -m benchmarks.compare results/main.json results/change.json
+
+Prints the median and p95 latency and the median query count of each
+endpoint with their change, and exits with status 1 when an endpoint runs
+more queries or its p95 latency grew by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+
+def change(before, after):
+    if not before:
+        return ''
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def compare(before, after, threshold):
+    """
+    Returns the rows of the comparison table and the names of the endpoints that regressed.
+    """
+    rows, regressions = [], []
+    for name in sorted(before['results'].keys() | after['results'].keys()):
+        old, new = before['results'].get(name), after['results'].get(name)
+        if old is None or new is None:
+            rows.append([name, 'only in ' + ('after' if old is None else 'before')] + [''] * 6)
+            continue
+        old_queries, new_queries = old['queries']['median'], new['queries']['median']
+        rows.append([
+            name,
+            f"{old['p50_ms']:.2f}", f"{new['p50_ms']:.2f}", change(old['p50_ms'], new['p50_ms']),
+            f"{old['p95_ms']:.2f}", f"{new['p95_ms']:.2f}", change(old['p95_ms'], new['p95_ms']),
+            f'{old_queries:g} -> {new_queries:g}',
+        ])
+        if new_queries > old_queries or (old['p95_ms'] and new['p95_ms'] > old['p95_ms'] * (1 + threshold / 100)):
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10, help="Allowed p95 latency growth, in percent.")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"before: {before.get('commit')} ({before.get('date')}), after: {after.get('commit')} ({after.get('date')})")
+    if before.get('dataset') != after.get('dataset'):
+        print("warning: the results were measured on different datasets")
+
+    header = ['endpoint', 'p50 before', 'p50 after', '', 'p95 before', 'p95 after', '', 'queries']
+    rows, regressions = compare(before, after, args.threshold)
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print('  '.join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+    if regressions:
+        print(f"\nregressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
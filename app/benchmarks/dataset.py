@@ -0,0 +1,254 @@
+"""
+Generates a reproducible dataset for the endpoint benchmarks:
+
+    python -m benchmarks.dataset --seed 1 --destinations 2 --locations 6 --lands 4 --experiences 30 \\
+        --users 10 --trips 2 --days 7 --items 8
+
+Each destination gets --locations locations, each park --lands lands and
+--experiences experiences. Each of the --users users gets --trips trips of
+--days days with --items itinerary items a day, spread across the five
+activity types. The same seed and sizes give the same names, dates and
+shapes, so results of different commits compare.
+
+Rows are inserted in bulk. A previous benchmark dataset is deleted first:
+its users are named bench-user-<n>@example.com and its catalog disney_ids
+start with "bench-".
+"""
+import argparse
+import datetime
+import json
+import random
+from itertools import cycle
+
+from . import setup_django
+
+PREFIX = 'bench-'
+USER_EMAIL = 'bench-user-{}@example.com'
+
+DEFAULTS = {
+    'seed': 1,
+    'destinations': 2,
+    'locations': 6,
+    'lands': 4,
+    'experiences': 30,
+    'users': 10,
+    'trips': 2,
+    'days': 7,
+    'items': 8,
+}
+
+WORDS = [
+    'Big', 'Thunder', 'Mountain', 'Space', 'Haunted', 'Pirates', 'Jungle', 'Cruise', 'Frozen', 'Castle', 'Royal',
+    'Tiki', 'Star', 'Galaxy', 'Flight', 'Adventure', 'Splash', 'Tower', 'Safari', 'Parade', 'Garden', 'Kitchen',
+    'Cafe', 'Grill', 'Carousel', 'Railroad', 'Voyage', 'Magic', 'Lagoon', 'Canyon',
+]
+
+
+def bench_users():
+    from custom_auth.models import User
+
+    return User.objects.filter(email__startswith='bench-user-', email__endswith='@example.com')
+
+
+def delete_dataset():
+    """
+    Deletes the rows of a previous benchmark dataset, activities first since items only point to them.
+    """
+    from destinations import models as dest_models
+    from trips import models
+
+    items = models.ItineraryItem.all_objects.filter(trip__created_by__in=bench_users())
+    for model in (models.Break, models.Meal, models.TravelEvent, models.Note):
+        model.all_objects.filter(pk__in=items.values('activity_id')).delete()
+    # Trips and their items go with their users
+    bench_users().delete()
+    for model in (dest_models.Experience, dest_models.Land, dest_models.Location, dest_models.Destination):
+        model.all_objects.filter(disney_id__startswith=PREFIX).delete()
+
+
+def generate_catalog(rng, destinations, locations, lands, experiences):
+    from destinations import models as dest_models
+
+    Location = dest_models.Location
+    Experience = dest_models.Experience
+
+    catalog = []
+    for d in range(destinations):
+        destination = dest_models.Destination(name=f'Bench destination {d}', disney_id=f'{PREFIX}destination-{d}')
+        parks, resorts = [], []
+        for i in range(locations):
+            # Two thirds of the locations are parks, they hold the lands and experiences
+            location_type = [Location.LocationType.THEME_PARK, Location.LocationType.WATER_PARK,
+                             Location.LocationType.RESORT][i % 3]
+            location = Location(
+                name=f'Bench {rng.choice(WORDS)} {location_type.label} {d}-{i}',
+                disney_id=f'{PREFIX}location-{d}-{i}',
+                location_type=location_type,
+                destination=destination,
+            )
+            (resorts if location_type == Location.LocationType.RESORT else parks).append(location)
+        park_lands = {
+            park.disney_id: [
+                dest_models.Land(name=f'{rng.choice(WORDS)}land {i}', disney_id=f'{park.disney_id}-land-{i}', park=park)
+                for i in range(lands)
+            ]
+            for park in parks
+        }
+        park_experiences = {}
+        for park in parks:
+            park_experiences[park.disney_id] = []
+            for i in range(experiences):
+                experience = Experience(
+                    name=' '.join(rng.sample(WORDS, rng.randint(2, 4))) + f' {i}',
+                    disney_id=f'{park.disney_id}-experience-{i}',
+                    destination=destination,
+                    experience_type=rng.choice(Experience.ExperienceType.values),
+                )
+                land = rng.choice(park_lands[park.disney_id]) if lands else None
+                park_experiences[park.disney_id].append((experience, park, land))
+        catalog.append((destination, parks + resorts, park_lands, park_experiences))
+
+    dest_models.Destination.objects.bulk_create([destination for destination, *_ in catalog])
+    Location.objects.bulk_create([location for _, locations, *_ in catalog for location in locations])
+    dest_models.Land.objects.bulk_create([
+        land for *_, park_lands, _ in catalog for lands in park_lands.values() for land in lands
+    ])
+    rows = [row for *_, park_experiences in catalog for rows in park_experiences.values() for row in rows]
+    Experience.objects.bulk_create([experience for experience, _, _ in rows])
+    Experience.locations.through.objects.bulk_create([
+        Experience.locations.through(experience_id=experience.pk, location_id=park.pk) for experience, park, _ in rows
+    ])
+    Experience.lands.through.objects.bulk_create([
+        Experience.lands.through(experience_id=experience.pk, land_id=land.pk) for experience, _, land in rows if land
+    ])
+    return catalog
+
+
+def generate_trips(rng, catalog, users, trips, days, items):
+    from django.contrib.contenttypes.models import ContentType
+
+    from custom_auth.models import User
+    from destinations import models as dest_models
+    from trips import models, ordering
+
+    user_rows = []
+    for i in range(users):
+        user = User(email=USER_EMAIL.format(i), username=USER_EMAIL.format(i), first_name=f'Bench {i}')
+        user.set_unusable_password()
+        user_rows.append(user)
+    User.objects.bulk_create(user_rows)
+
+    content_types = ContentType.objects.get_for_models(
+        dest_models.Experience, models.Break, models.Meal, models.TravelEvent, models.Note,
+    )
+    trip_rows, activities, item_rows = [], [], []
+    first_day = datetime.date(2030, 1, 1)
+    for user in user_rows:
+        for t in range(trips):
+            destination, locations, park_lands, park_experiences = rng.choice(catalog)
+            start_date = first_day + datetime.timedelta(days=rng.randint(0, 365))
+            trip = models.Trip(
+                title=f'Bench trip {t} of {user.first_name}',
+                created_by=user,
+                destination=destination,
+                start_date=start_date,
+                end_date=start_date + datetime.timedelta(days=days - 1),
+            )
+            trip_rows.append(trip)
+
+            experiences = [row[0] for rows in park_experiences.values() for row in rows]
+            restaurants = [
+                experience for experience in experiences
+                if experience.experience_type == dest_models.Experience.ExperienceType.RESTAURANT
+            ] or experiences
+            # The items cycle through the five activity types
+            kinds = cycle(['experience', 'break', 'meal', 'travelevent', 'note'])
+            for day in range(days):
+                for position in range(items):
+                    kind = next(kinds)
+                    location = rng.choice(locations)
+                    if kind == 'experience':
+                        activity = rng.choice(experiences)
+                    elif kind == 'break':
+                        activity = models.Break(location=location)
+                    elif kind == 'meal':
+                        activity = models.Meal(
+                            meal_experience=rng.choice(restaurants), meal_type=rng.choice(models.Meal.MealType.values),
+                        )
+                    elif kind == 'travelevent':
+                        activity = models.TravelEvent(
+                            from_location=location, to_location=rng.choice(locations),
+                            travel_type=models.TravelEvent.EventType.PARK_HOP,
+                        )
+                    else:
+                        land = rng.choice(park_lands.get(location.disney_id) or [None])
+                        activity = models.Note(location=location, land=land, note=' '.join(rng.sample(WORDS, 6)))
+                    if kind != 'experience':
+                        activities.append(activity)
+                    start_time = datetime.time(8 + position * 14 // max(items, 1), rng.choice([0, 15, 30, 45]))
+                    item_rows.append(models.ItineraryItem(
+                        trip=trip,
+                        day=start_date + datetime.timedelta(days=day),
+                        activity_order=ordering.legacy_key(position),
+                        start_time=start_time,
+                        activity_id=activity.pk,
+                        content_type=content_types[type(activity)],
+                    ))
+
+    models.Trip.objects.bulk_create(trip_rows)
+    for model in (models.Break, models.Meal, models.TravelEvent, models.Note):
+        model.objects.bulk_create([activity for activity in activities if type(activity) is model])
+    models.ItineraryItem.objects.bulk_create(item_rows, batch_size=1000)
+    return user_rows, trip_rows, activities, item_rows
+
+
+def generate(seed=DEFAULTS['seed'], destinations=DEFAULTS['destinations'], locations=DEFAULTS['locations'],
+             lands=DEFAULTS['lands'], experiences=DEFAULTS['experiences'], users=DEFAULTS['users'],
+             trips=DEFAULTS['trips'], days=DEFAULTS['days'], items=DEFAULTS['items']):
+    """
+    Replaces the benchmark dataset and returns the number of rows created per kind.
+    """
+    from django.db import transaction
+
+    from destinations.signals import bump_catalog_version
+
+    rng = random.Random(seed)
+    with transaction.atomic():
+        delete_dataset()
+        catalog = generate_catalog(rng, destinations, locations, lands, experiences)
+        user_rows, trip_rows, activities, item_rows = generate_trips(rng, catalog, users, trips, days, items)
+        # Bulk inserts don't send the signals that move the catalog version
+        bump_catalog_version()
+
+    return {
+        'destinations': len(catalog),
+        'locations': sum(len(locations) for _, locations, *_ in catalog),
+        'lands': sum(len(lands) for *_, park_lands, _ in catalog for lands in park_lands.values()),
+        'experiences': sum(len(rows) for *_, park_experiences in catalog for rows in park_experiences.values()),
+        'users': len(user_rows),
+        'trips': len(trip_rows),
+        'activities': len(activities),
+        'itinerary_items': len(item_rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in DEFAULTS.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--delete', action='store_true', help="Only delete the benchmark dataset.")
+    args = parser.parse_args()
+
+    setup_django()
+    if args.delete:
+        from django.db import transaction
+
+        with transaction.atomic():
+            delete_dataset()
+        return
+    options = {name: getattr(args, name) for name in DEFAULTS}
+    print(json.dumps(generate(**options)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares the request throughput of the database connection modes of config.settings.
+
+Every simulated request acquires the connection, runs a query and releases the
+connection the way Django does at the end of a request, from several threads at
+once like a threaded worker. Needs the PostgreSQL database of the ENV profile:
+
+    ENV=local python -m benchmarks.db_connections --requests 2000 --threads 5
+"""
+import argparse
+import json
+import threading
+import time
+
+from . import setup_django
+from .http import summarize
+
+
+def run(settings_dict, requests, threads, query):
+    from django.db.utils import ConnectionHandler
+
+    handler = ConnectionHandler({'default': settings_dict})
+    latencies = []
+    errors = []
+    latencies_lock = threading.Lock()
+    per_thread = requests // threads
+
+    def worker():
+        try:
+            measure()
+        except Exception as e:
+            errors.append(e)
+
+    def measure():
+        # Each thread gets its own connection wrapper, like django.db.connections
+        wrapper = handler['default']
+        timings = []
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            with wrapper.cursor() as cursor:
+                cursor.execute(query)
+                cursor.fetchall()
+            # What the request_finished signal does
+            wrapper.close_if_unusable_or_obsolete()
+            timings.append(time.perf_counter() - started)
+        wrapper.close()
+        with latencies_lock:
+            latencies.extend(timings)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+
+    return summarize(latencies, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=5)
+    parser.add_argument('--modes', nargs='+', default=['per_request', 'persistent', 'pooled'])
+    parser.add_argument('--query', default='SELECT 1')
+    args = parser.parse_args()
+
+    setup_django()
+    from common.pooled_postgresql.pool import pool_stats
+    from config.settings import ENV, database_settings
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = run(database_settings(ENV, mode), args.requests, args.threads, args.query)
+
+    baseline = results.get('per_request')
+    for mode, result in results.items():
+        if baseline:
+            result['speedup'] = round(result['requests_per_second'] / baseline['requests_per_second'], 2)
+        print(f"{mode:>12}: {json.dumps(result)}")
+    print(f"{'pools':>12}: {json.dumps(pool_stats())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Times the trip, itinerary and catalog endpoints in process, through the whole
+middleware stack, and writes their latency percentiles and query counts to a
+JSON file. Run it on the dataset of benchmarks.dataset:
+
+    python -m benchmarks.dataset
+    python -m benchmarks.endpoints --output results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.compare results/<before>.json results/<after>.json
+
+Requests are authenticated with an access token of the first benchmark user
+and read its first trip. Each bulk iteration creates --bulk-size items with
+POST, updates them with PUT and deletes them with DELETE, and the rows it
+created are removed at the end, so the dataset stays the same between runs.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+from itertools import cycle
+
+from . import setup_django
+from .http import summarize
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def query_stats(queries):
+    return {'min': min(queries), 'median': statistics.median(queries), 'max': max(queries)}
+
+
+class EndpointBenchmark:
+
+    def __init__(self, iterations, warmup, bulk_size):
+        from django.test.utils import override_settings
+        from rest_framework.test import APIClient
+
+        from custom_auth.tokens import ClaimsRefreshToken
+        from destinations import models as dest_models
+        from trips import models
+        from .dataset import bench_users
+
+        self.iterations = iterations
+        self.warmup = warmup
+        self.bulk_size = bulk_size
+
+        self.user = bench_users().order_by('email').first()
+        if self.user is None:
+            raise SystemExit("There is no benchmark dataset, run `python -m benchmarks.dataset` first.")
+        self.trip = models.Trip.objects.filter(created_by=self.user).order_by('title').first()
+        self.locations = list(dest_models.Location.objects.filter(destination_id=self.trip.destination_id))
+        self.park = next(location for location in self.locations if location.experience_set.exists())
+        self.experiences = list(dest_models.Experience.objects.filter(locations=self.park))
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(self.user).access_token}')
+        # The test client's host name
+        self.settings = override_settings(ALLOWED_HOSTS=['testserver'])
+        self.created = set()
+
+    def request(self, method, path, data=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(path, data, format='json')
+            latency = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise SystemExit(f"{method.upper()} {path} failed with {response.status_code}: {response.content[:500]}")
+        return response, latency, len(context.captured_queries)
+
+    def measure(self, requests):
+        """
+        Runs `requests()`, which returns a list of `request()` results, --warmup then --iterations times.
+        """
+        for _ in range(self.warmup):
+            for _ in requests():
+                pass
+        latencies, queries = [], []
+        started = time.perf_counter()
+        for _ in range(self.iterations):
+            for _, latency, query_count in requests():
+                latencies.append(latency)
+                queries.append(query_count)
+        result = summarize(latencies, time.perf_counter() - started)
+        result['queries'] = query_stats(queries)
+        return result
+
+    def read(self, path):
+        return lambda: [self.request('get', path)]
+
+    def new_items(self):
+        kinds = cycle(['experience', 'break', 'meal', 'travelevent', 'note'])
+        items = []
+        for position in range(self.bulk_size):
+            kind = next(kinds)
+            item = {
+                'trip': str(self.trip.id),
+                'day': self.trip.start_date.isoformat(),
+                'activity_order': 1000 + position,
+                'content_type': kind,
+            }
+            location = str(self.locations[position % len(self.locations)].id)
+            experience = str(self.experiences[position % len(self.experiences)].id)
+            if kind == 'experience':
+                item['activity_id'] = experience
+            elif kind == 'break':
+                item['activity'] = {'location': location}
+            elif kind == 'meal':
+                item['activity'] = {'meal_experience_id': experience, 'meal_type': 'lunch'}
+            elif kind == 'travelevent':
+                item['activity'] = {'from_location_id': location, 'to_location_id': location, 'travel_type': 'park-hop'}
+            else:
+                item['activity'] = {'location_id': location, 'note': 'Benchmark'}
+            items.append(item)
+        return items
+
+    def bulk_requests(self):
+        path = f'/trips/trips/{self.trip.id}/itinerary-items-bulk/'
+        created, latency, queries = self.request('post', path, self.new_items())
+        self.created.update(item['id'] for item in created.json())
+        yield 'post', latency, queries
+
+        changes = []
+        for item in created.json():
+            change = {key: item[key] for key in ('id', 'trip', 'day', 'activity_order', 'content_type', 'activity_id')}
+            change.update(note='Updated', start_time='10:00')
+            if item['content_type'] == 'note':
+                change['activity'] = {'note': 'Updated'}
+            changes.append(change)
+        _, latency, queries = self.request('put', path, changes)
+        yield 'put', latency, queries
+
+        _, latency, queries = self.request('delete', path, [item['id'] for item in created.json()])
+        yield 'delete', latency, queries
+
+    def measure_bulk(self):
+        for _ in range(self.warmup):
+            for _ in self.bulk_requests():
+                pass
+        timings = {method: ([], []) for method in ('post', 'put', 'delete')}
+        started = time.perf_counter()
+        for _ in range(self.iterations):
+            for method, latency, queries in self.bulk_requests():
+                timings[method][0].append(latency)
+                timings[method][1].append(queries)
+        elapsed = time.perf_counter() - started
+
+        results = {}
+        for method, (latencies, queries) in timings.items():
+            result = summarize(latencies, elapsed)
+            # The three requests share the run, so throughput isn't meaningful per request
+            del result['requests_per_second'], result['seconds']
+            result['queries'] = query_stats(queries)
+            results[f'itinerary-bulk-{method}'] = result
+        return results
+
+    def cleanup(self):
+        from trips import models
+
+        items = models.ItineraryItem.all_objects.filter(pk__in=self.created)
+        for model in (models.Break, models.Meal, models.TravelEvent, models.Note):
+            model.all_objects.filter(pk__in=items.values('activity_id')).delete()
+        items.delete()
+
+    def run(self):
+        trip_path = f'/trips/trips/{self.trip.id}'
+        scenarios = {
+            'trip-list': self.read('/trips/trips/'),
+            'trip-detail': self.read(f'{trip_path}/'),
+            'itinerary-list': self.read(f'{trip_path}/itinerary-items/'),
+            'itinerary-list-fields': self.read(f'{trip_path}/itinerary-items/?fields=id,day,content_type,activity'),
+            'experience-list': self.read(f'/destinations/locations/{self.park.id}/experiences/'),
+        }
+        results = {}
+        # The bulk views print their payloads
+        with self.settings, contextlib.redirect_stdout(io.StringIO()):
+            for name, requests in scenarios.items():
+                results[name] = self.measure(requests)
+            try:
+                results.update(self.measure_bulk())
+            finally:
+                self.cleanup()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help="Write the results to this file instead of stdout.")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--bulk-size', type=int, default=20, help="Items per bulk request.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+
+    from trips import models
+    from .dataset import bench_users
+
+    benchmark = EndpointBenchmark(args.iterations, args.warmup, args.bulk_size)
+    results = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'options': vars(args),
+        'dataset': {
+            'users': bench_users().count(),
+            'trips': models.Trip.objects.filter(created_by__in=bench_users()).count(),
+            'trip_items': models.ItineraryItem.objects.filter(trip=benchmark.trip).count(),
+        },
+        'results': benchmark.run(),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+A small threaded HTTP load generator shared by the endpoint benchmarks.
+"""
+import statistics
+import threading
+import time
+from itertools import cycle
+
+import requests
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(latencies, elapsed, errors=0):
+    if not latencies:
+        return {'requests': 0, 'errors': errors}
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def run_load(urls, total, concurrency, headers=None, warmup=0):
+    """
+    Requests `urls` in turn from `concurrency` threads until `total` requests
+    are done and returns the throughput and latency percentiles. Responses
+    other than 2xx and 304 count as errors.
+    """
+    for _ in range(warmup):
+        for url in urls:
+            requests.get(url, headers=headers)
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    remaining = iter(range(total))
+
+    def worker(offset):
+        session = requests.Session()
+        session.headers.update(headers or {})
+        targets = cycle(urls[offset % len(urls):] + urls[:offset % len(urls)])
+        timings, failures = [], 0
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    break
+            started = time.perf_counter()
+            response = session.get(next(targets))
+            timings.append(time.perf_counter() - started)
+            if not (200 <= response.status_code < 300 or response.status_code == 304):
+                failures += 1
+        with lock:
+            latencies.extend(timings)
+            errors.append(failures)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started, sum(errors))
@@ -0,0 +1,111 @@
+"""
+Times rendering and parsing a large itinerary payload with DRF's JSON
+renderer and parser and with the ones of common.renderers and
+common.parsers, and checks that the orjson renderer's output is identical:
+
+    python -m benchmarks.dataset
+    python -m benchmarks.renderers --items 2000 --output results/renderers.json
+
+The payload is the serialized itinerary of the first benchmark user,
+repeated up to --items items, as ItineraryItemSerializer returns it (with
+UUID objects for the related ids).
+"""
+import argparse
+import datetime
+import io
+import json
+import platform
+import time
+from itertools import cycle, islice
+
+from . import setup_django
+from .endpoints import git_commit
+from .http import summarize
+
+
+def itinerary_payload(items):
+    from trips import models, serializers
+    from trips.prefetch import prefetch_activities
+    from .dataset import bench_users
+
+    user = bench_users().order_by('email').first()
+    if user is None:
+        raise SystemExit("There is no benchmark dataset, run `python -m benchmarks.dataset` first.")
+    rows = models.ItineraryItem.objects.filter(trip__created_by=user).order_by('trip', 'day', 'activity_order')
+    data = serializers.ItineraryItemSerializer(prefetch_activities(list(rows)), many=True).data
+    return list(islice(cycle(data), items))
+
+
+def measure(function, iterations, warmup):
+    for _ in range(warmup):
+        function()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - call_started)
+    result = summarize(latencies, time.perf_counter() - started)
+    del result['requests'], result['errors'], result['requests_per_second']
+    return result
+
+
+def run(payload, iterations, warmup):
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from common.parsers import MessagePackParser, ORJSONParser
+    from common.renderers import MessagePackRenderer, ORJSONRenderer
+
+    rendered = {
+        'drf-json': JSONRenderer().render(payload),
+        'orjson': ORJSONRenderer().render(payload),
+        'msgpack': MessagePackRenderer().render(payload),
+    }
+    if rendered['orjson'] != rendered['drf-json']:
+        raise SystemExit("The orjson renderer's output differs from DRF's JSONRenderer.")
+
+    cases = {
+        'render-drf-json': lambda: JSONRenderer().render(payload),
+        'render-orjson': lambda: ORJSONRenderer().render(payload),
+        'render-msgpack': lambda: MessagePackRenderer().render(payload),
+        'parse-drf-json': lambda: JSONParser().parse(io.BytesIO(rendered['drf-json'])),
+        'parse-orjson': lambda: ORJSONParser().parse(io.BytesIO(rendered['orjson'])),
+        'parse-msgpack': lambda: MessagePackParser().parse(io.BytesIO(rendered['msgpack'])),
+    }
+    results = {name: measure(function, iterations, warmup) for name, function in cases.items()}
+    for name, result in results.items():
+        operation, renderer = name.split('-', 1)
+        result['bytes'] = len(rendered['drf-json' if renderer == 'orjson' else renderer])
+        baseline = results[f'{operation}-drf-json']['p50_ms']
+        result['speedup'] = round(baseline / result['p50_ms'], 2) if result['p50_ms'] else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help="Write the results to this file instead of stdout.")
+    parser.add_argument('--items', type=int, default=2000, help="Itinerary items in the payload.")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    results = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'options': vars(args),
+        'results': run(itinerary_payload(args.items), args.iterations, args.warmup),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,385 @@
+"""
+Replays an nginx access log (the default "combined" format written to
+/service/logs/nginx-access.log, see deployment/django.conf) against a
+running stack, e.g. the docker-compose one:
+
+    python -m benchmarks.dataset --users 50 --trips 3
+    python -m benchmarks.replay logs/nginx-access.log --base-url http://127.0.0.1:8080 \\
+        --speed 2 --concurrency 20 --output replay.json
+
+Recorded paths are resolved with the project's URLs and their ids are mapped
+onto the dataset of benchmarks.dataset: each client address becomes a
+benchmark user, and each recorded trip, item or catalog id becomes one of
+that user's trips or items, or a catalog row under the mapped parent, the
+same one every time it is seen. Requests are authenticated with access
+tokens of the mapped users. nginx doesn't log request bodies, so only GET
+and HEAD requests are replayed, the others are counted as skipped.
+
+Requests are sent at their recorded times divided by --speed (0 sends them
+as fast as the workers allow) from --concurrency threads. The report gives
+the throughput, the error rate and p50/p95/p99 latencies per URL pattern,
+and how far behind schedule requests were sent when the workers couldn't
+keep up.
+"""
+import argparse
+import datetime
+import gzip
+import json
+import re
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict, namedtuple
+from queue import Queue
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests as http
+
+from . import setup_django
+from .http import percentile
+
+LOG_LINE = re.compile(
+    r'(?P<address>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+)[^"]*" (?P<status>\d{3}) '
+)
+LOG_TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+UUID = re.compile(r'^[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}$', re.IGNORECASE)
+
+REPLAYED_METHODS = ('GET', 'HEAD')
+
+# The objects named by the URL kwargs of each route, parents first. Routes without ids are replayed as recorded.
+URL_OBJECTS = {
+    'trip-detail': [('pk', 'trip')],
+    'itinerary-item-list': [('trip_id', 'trip')],
+    'trip-export': [('trip_id', 'trip')],
+    'itinerary-items-bulk': [('trip_id', 'trip')],
+    'itinerary-item-detail': [('pk', 'item')],
+    'itinerary-item-move': [('pk', 'item')],
+    'break-detail': [('itinerary_item_pk', 'item:break'), ('pk', 'activity')],
+    'travel-event-detail': [('itinerary_item_pk', 'item:travelevent'), ('pk', 'activity')],
+    'meal-detail': [('itinerary_item_pk', 'item:meal'), ('pk', 'activity')],
+    'destination-detail': [('dest_id', 'destination')],
+    'location-list': [('dest_id', 'destination')],
+    'location-detail': [('dest_id', 'destination'), ('loc_id', 'location')],
+    'catalog-search': [('dest_id', 'destination')],
+    'catalog-autocomplete': [('dest_id', 'destination')],
+    'land-list': [('loc_id', 'park')],
+    'land-detail': [('loc_id', 'park'), ('land_id', 'land')],
+    'experience-list': [('loc_id', 'park')],
+    'experience-detail': [('loc_id', 'park'), ('exp_id', 'experience')],
+}
+
+LogEntry = namedtuple('LogEntry', ['address', 'time', 'method', 'path', 'status'])
+Replay = namedtuple('Replay', ['offset', 'method', 'path', 'pattern', 'user'])
+
+
+def read_log(path):
+    """
+    Yields the entries of an access log, and None for the lines that can't be parsed.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as log:
+        for line in log:
+            match = LOG_LINE.match(line)
+            if match is None:
+                yield None
+                continue
+            try:
+                recorded_at = datetime.datetime.strptime(match['time'], LOG_TIME_FORMAT)
+            except ValueError:
+                yield None
+                continue
+            yield LogEntry(match['address'], recorded_at, match['method'], match['path'], int(match['status']))
+
+
+def pick(candidates, key):
+    """
+    The candidate a recorded id maps to, always the same one for the same id.
+    """
+    if not candidates:
+        return None
+    return candidates[zlib.crc32(str(key).encode()) % len(candidates)]
+
+
+class DatasetMapper:
+    """
+    Maps the recorded paths onto the benchmark dataset.
+    """
+
+    def __init__(self):
+        from django.contrib.contenttypes.models import ContentType
+
+        from destinations import models as dest_models
+        from trips import models
+        from .dataset import PREFIX, bench_users
+
+        self.users = list(bench_users().order_by('email'))
+        if not self.users:
+            raise SystemExit("There is no benchmark dataset, run `python -m benchmarks.dataset` first.")
+
+        self.trips = defaultdict(list)
+        for user_id, trip_id in models.Trip.objects.filter(created_by__in=self.users).order_by('id').values_list(
+                'created_by_id', 'id'):
+            self.trips[user_id].append(trip_id)
+
+        content_types = {
+            content_type.id: model._meta.model_name
+            for model, content_type in ContentType.objects.get_for_models(
+                models.Break, models.Meal, models.TravelEvent, models.Note, dest_models.Experience,
+            ).items()
+        }
+        # (user id, kind) -> [(item id, activity id)], kind None holds every item
+        self.items = defaultdict(list)
+        items = models.ItineraryItem.objects.filter(trip__created_by__in=self.users).order_by('id')
+        for user_id, item_id, content_type_id, activity_id in items.values_list(
+                'trip__created_by_id', 'id', 'content_type_id', 'activity_id'):
+            self.items[user_id, None].append((item_id, activity_id))
+            self.items[user_id, content_types.get(content_type_id)].append((item_id, activity_id))
+
+        self.destinations = list(
+            dest_models.Destination.objects.filter(disney_id__startswith=PREFIX).order_by('id').values_list('id', flat=True)
+        )
+        self.locations = defaultdict(list)
+        for destination_id, location_id in dest_models.Location.objects.filter(
+                disney_id__startswith=PREFIX).order_by('id').values_list('destination_id', 'id'):
+            self.locations[destination_id].append(location_id)
+        self.lands = defaultdict(list)
+        for park_id, land_id in dest_models.Land.objects.filter(
+                disney_id__startswith=PREFIX).order_by('id').values_list('park_id', 'id'):
+            self.lands[park_id].append(land_id)
+        self.experiences = defaultdict(list)
+        for location_id, experience_id in dest_models.Experience.locations.through.objects.filter(
+                experience__disney_id__startswith=PREFIX).order_by('id').values_list('location_id', 'experience_id'):
+            self.experiences[location_id].append(experience_id)
+        self.parks = sorted(set(self.lands) | set(self.experiences))
+
+    def choose(self, kind, recorded_id, user, chosen):
+        """
+        Returns the local id a recorded id of `kind` maps to, given the objects already chosen for the URL.
+        """
+        if kind == 'trip':
+            return pick(self.trips[user.id], recorded_id)
+        if kind.startswith('item'):
+            activity_kind = kind.partition(':')[2] or None
+            item = pick(self.items[user.id, activity_kind], recorded_id)
+            if item is None:
+                return None
+            chosen['activity'] = item[1]
+            return item[0]
+        if kind == 'activity':
+            return chosen['activity']
+        if kind == 'destination':
+            return pick(self.destinations, recorded_id)
+        if kind == 'location':
+            return pick(self.locations[chosen['destination']], recorded_id)
+        if kind == 'park':
+            return pick(self.parks, recorded_id)
+        if kind == 'land':
+            return pick(self.lands[chosen['park']], recorded_id)
+        if kind == 'experience':
+            return pick(self.experiences[chosen['park']], recorded_id)
+        raise ValueError(f"Unknown kind: {kind}")
+
+    def map(self, entry):
+        """
+        Returns the local path and URL pattern of a log entry, or None when it doesn't resolve.
+        """
+        from django.urls import Resolver404, resolve, reverse
+
+        url = urlsplit(entry.path)
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            return None
+        user = pick(self.users, entry.address)
+
+        kwargs = dict(match.kwargs)
+        chosen = {}
+        for name, kind in URL_OBJECTS.get(match.url_name, []):
+            local_id = self.choose(kind, kwargs[name], user, chosen)
+            if local_id is None:
+                return None
+            chosen[kind.partition(':')[0]] = kwargs[name] = local_id
+        path = reverse(match.view_name, kwargs=kwargs) if kwargs else url.path
+
+        # Ids in the query string, e.g. ?user= of staff exports, don't exist locally
+        query = [(name, value) for name, value in parse_qsl(url.query, keep_blank_values=True) if not UUID.match(value)]
+        if query:
+            path += '?' + urlencode(query)
+        return path, match.route, user
+
+
+class Tokens:
+    """
+    Access tokens of the benchmark users, minted again before they expire.
+    """
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self.tokens = {}
+
+    def header(self, user):
+        from custom_auth.tokens import ClaimsRefreshToken
+
+        token, minted_at = self.tokens.get(user.id, (None, 0))
+        if token is None or time.monotonic() - minted_at > self.max_age:
+            token = str(ClaimsRefreshToken.for_user(user).access_token)
+            self.tokens[user.id] = (token, time.monotonic())
+        return {'Authorization': f'Bearer {token}'}
+
+
+def plan(log_path, mapper, limit=None):
+    """
+    Returns the requests to replay, with their offset in seconds from the first one, and the skipped line counts.
+    """
+    replays, skipped = [], Counter()
+    first = None
+    for entry in read_log(log_path):
+        if limit is not None and len(replays) >= limit:
+            break
+        if entry is None:
+            skipped['unparsable'] += 1
+            continue
+        if entry.method not in REPLAYED_METHODS:
+            skipped[f'{entry.method} (no body in the log)'] += 1
+            continue
+        mapped = mapper.map(entry)
+        if mapped is None:
+            skipped['unmapped'] += 1
+            continue
+        path, pattern, user = mapped
+        first = first or entry.time
+        replays.append(Replay((entry.time - first).total_seconds(), entry.method, path, pattern, user))
+    return replays, skipped
+
+
+def replay(replays, base_url, concurrency, speed, timeout=30):
+    """
+    Sends the requests at their offsets divided by `speed` and returns (pattern, status, latency, lag) tuples.
+    """
+    tokens = Tokens()
+    jobs = Queue(maxsize=concurrency * 2)
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        session = http.Session()
+        done = []
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            request, headers, scheduled = job
+            started = time.perf_counter()
+            try:
+                status = session.request(request.method, base_url + request.path, headers=headers,
+                                         timeout=timeout).status_code
+            except http.RequestException:
+                status = None
+            done.append((request.method, request.pattern, status, time.perf_counter() - started,
+                         max(0.0, started - scheduled)))
+        with lock:
+            results.extend(done)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    started = time.perf_counter()
+    for request in replays:
+        scheduled = started + request.offset / speed if speed else time.perf_counter()
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        # Blocks while every worker is busy, the wait shows up as lag
+        jobs.put((request, tokens.header(request.user), scheduled))
+    for _ in threads:
+        jobs.put(None)
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def latency_stats(latencies):
+    return {
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def summarize_replay(results, elapsed, skipped):
+    by_pattern = defaultdict(list)
+    for method, pattern, status, latency, _ in results:
+        by_pattern[f'{method} /{pattern}'].append((status, latency))
+
+    patterns = {}
+    for name, requests in sorted(by_pattern.items(), key=lambda item: -len(item[1])):
+        errors = sum(status is None or status >= 400 for status, _ in requests)
+        patterns[name] = {
+            'requests': len(requests),
+            'errors': errors,
+            'error_rate': round(errors / len(requests), 4),
+            **latency_stats([latency for _, latency in requests]),
+        }
+
+    errors = sum(pattern['errors'] for pattern in patterns.values())
+    statuses = Counter('failed' if status is None else str(status) for _, _, status, _, _ in results)
+    lags = [lag for *_, lag in results]
+    return {
+        'requests': len(results),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(results) / elapsed, 1) if elapsed else 0,
+        'error_rate': round(errors / len(results), 4) if results else 0,
+        'statuses': dict(sorted(statuses.items())),
+        'lag_p95_ms': round(percentile(lags, 0.95) * 1000, 3) if lags else 0,
+        'skipped': dict(skipped),
+        'patterns': patterns,
+    }
+
+
+def print_report(summary):
+    print(
+        f"{summary['requests']} requests in {summary['seconds']}s, {summary['requests_per_second']} req/s, "
+        f"error rate {summary['error_rate']:.2%}, p95 lag behind schedule {summary['lag_p95_ms']}ms"
+    )
+    print(f"statuses: {summary['statuses']}")
+    if summary['skipped']:
+        print(f"skipped log lines: {summary['skipped']}")
+    width = max([len(name) for name in summary['patterns']] + [7])
+    print(f"\n{'pattern'.ljust(width)}  {'requests':>8}  {'errors':>7}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}")
+    for name, stats in summary['patterns'].items():
+        print(
+            f"{name.ljust(width)}  {stats['requests']:>8}  {stats['error_rate']:>7.1%}  "
+            f"{stats['p50_ms']:>8.1f}  {stats['p95_ms']:>8.1f}  {stats['p99_ms']:>8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', help="An nginx access log, files ending in .gz are decompressed.")
+    parser.add_argument('--base-url', default='http://127.0.0.1:8080')
+    parser.add_argument('--speed', type=float, default=1,
+                        help="Replay speed relative to the recorded traffic, 0 replays as fast as possible.")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--limit', type=int, help="Replay at most this many requests.")
+    parser.add_argument('--output', help="Also write the report as JSON to this file.")
+    args = parser.parse_args()
+    if args.speed < 0 or args.concurrency < 1:
+        parser.error("--speed can't be negative and --concurrency must be at least 1.")
+
+    setup_django()
+    replays, skipped = plan(args.log, DatasetMapper(), args.limit)
+    if not replays:
+        raise SystemExit(f"Nothing to replay, skipped: {dict(skipped)}")
+    results, elapsed = replay(replays, args.base_url.rstrip('/'), args.concurrency, args.speed)
+    summary = summarize_replay(results, elapsed, skipped)
+
+    print_report(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
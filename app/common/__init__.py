@@ -1,2 +1,3 @@
 from .models import BaseModel
 from .permissions import IsStaffOrSuperuser
+from .serializers import DynamicFieldsMixin
@@ -0,0 +1,99 @@
+"""
+Async read handlers for DRF views, served when the app runs under ASGI.
+
+DRF only dispatches to sync handlers, so a view opts in by defining
+`async_<action>` coroutines next to its sync handlers, and the URL is routed
+with `read_view()`. With settings.ASYNC_READ_VIEWS set (see config.asgi),
+GET and HEAD requests go to the coroutine and every other method to the usual
+sync view in a thread. Under WSGI the sync view is used as is.
+
+The coroutines run in the event loop: database access has to go through the
+async ORM or `sync_to_async`, the rest (rendering, serializing loaded objects)
+runs inline.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .profiling import timed
+
+
+class AsyncReadMixin:
+    """
+    Adds `as_async_view()` to DRF views and viewsets defining `async_<action>` coroutines.
+    """
+
+    @classmethod
+    def as_async_view(cls, action, **initkwargs):
+        handler_name = f'async_{action}'
+
+        async def view(request, *args, **kwargs):
+            self = cls(**initkwargs)
+            # Viewsets read the action from the action map when the request is initialized
+            self.action_map = {'get': action, 'head': action}
+            self.action = action
+            self.args = args
+            self.kwargs = kwargs
+            request = self.initialize_request(request, *args, **kwargs)
+            self.request = request
+            self.headers = self.default_response_headers
+
+            try:
+                # Authentication may load the user
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+                response = await getattr(self, handler_name)(request, *args, **kwargs)
+            except Exception as exc:
+                response = self.handle_exception(exc)
+
+            self.response = self.finalize_response(request, response, *args, **kwargs)
+            if hasattr(self.response, 'render'):
+                # Render in the event loop, Django would otherwise render it in a thread
+                with timed('render'):
+                    self.response.render()
+            return self.response
+
+        view.cls = cls
+        view.initkwargs = initkwargs
+        view.csrf_exempt = True
+        return view
+
+
+def read_view(sync_view, async_view):
+    """
+    Routes GET and HEAD requests of a URL to `async_view` when async reads are enabled, see the module docstring.
+    """
+    if not settings.ASYNC_READ_VIEWS:
+        return sync_view
+
+    sync_handler = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await sync_handler(request, *args, **kwargs)
+
+    view.cls = getattr(sync_view, 'cls', None)
+    view.csrf_exempt = True
+    return view
+
+
+async def aiterate(iterator):
+    """
+    Iterates a sync iterator that reads the database from async code, moving to a thread for each item.
+    """
+    iterator = iter(iterator)
+    done = object()
+    while True:
+        item = await sync_to_async(next)(iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+def streaming_content(iterator):
+    """
+    Content for a StreamingHttpResponse. Under ASGI Django buffers sync
+    iterators whole before sending them, so they are handed over as async iterators.
+    """
+    if settings.ASYNC_READ_VIEWS:
+        return aiterate(iterator)
+    return iterator
@@ -0,0 +1,102 @@
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .profiling import RequestProfile, current_profile, install_query_recorders, timed
+
+logger = logging.getLogger(__name__)
+
+
+class RequestProfileMiddleware:
+    """
+    Counts the queries of each request and times its database access, serialization and rendering.
+
+    The numbers are sent back in a Server-Timing header, and requests running
+    more than settings.REQUEST_QUERY_BUDGET queries or taking more than
+    settings.REQUEST_TIME_BUDGET milliseconds are logged with their most
+    repeated queries. Streamed content is produced after the response leaves
+    the middleware, so only the work done before streaming starts is counted.
+
+    Should be the first middleware, so the whole request is measured and the
+    response is rendered here, after every other middleware is done with it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.process_template_response = self.aprocess_template_response
+        install_query_recorders()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        install_query_recorders()
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        self.report(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        self.report(request, response, profile)
+        return response
+
+    def process_template_response(self, request, response):
+        # Rendering here makes the render() call of the handler a no-op
+        with timed('render'):
+            response.render()
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        # Async views render in the event loop, the rest is rendered in a thread as the handler would
+        if not response.is_rendered:
+            await sync_to_async(self.process_template_response)(request, response)
+        return response
+
+    def report(self, request, response, profile):
+        elapsed = profile.elapsed
+        if getattr(settings, 'SERVER_TIMING', True):
+            metrics = [
+                f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"',
+                *(f'{name};dur={duration * 1000:.1f}' for name, duration in profile.timings.items()),
+                f'total;dur={elapsed * 1000:.1f}',
+            ]
+            response['Server-Timing'] = ', '.join(metrics)
+
+        query_budget = getattr(settings, 'REQUEST_QUERY_BUDGET', None)
+        time_budget = getattr(settings, 'REQUEST_TIME_BUDGET', None)
+        over_queries = query_budget is not None and profile.queries > query_budget
+        over_time = time_budget is not None and elapsed * 1000 > time_budget
+        if not (over_queries or over_time):
+            return
+
+        match = getattr(request, 'resolver_match', None)
+        view = match._func_path if match is not None else None
+        lines = [
+            f"{request.method} {request.path} ({view}) took {elapsed * 1000:.0f}ms, "
+            f"{profile.queries} queries in {profile.db_time * 1000:.0f}ms "
+            f"(budget: {query_budget} queries, {time_budget}ms)",
+        ]
+        for shape, count, duration in profile.repeated_shapes():
+            lines.append(f"  {count}x {duration * 1000:.1f}ms: {shape}")
+        logger.warning('\n'.join(lines), extra={
+            'view': view,
+            'queries': profile.queries,
+            'db_time': profile.db_time,
+            'duration': elapsed,
+            'status_code': response.status_code,
+        })
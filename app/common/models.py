@@ -1,9 +1,18 @@
 import uuid
 
 from django.db import models
+from django.utils import timezone
 
 
-class BaseModelManager(models.Manager):
+class BaseModelQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """
+        Marks every row of the queryset deleted with a single UPDATE. Returns the number of rows updated.
+        """
+        return self.update(is_deleted=True, date_updated=timezone.now())
+
+
+class BaseModelManager(models.Manager.from_queryset(BaseModelQuerySet)):
     def get_queryset(self):
         return super().get_queryset().filter(is_deleted=False)
 
@@ -19,14 +28,18 @@ class BaseModel(models.Model):
     is_deleted = models.BooleanField(default=False, editable=False)
 
     objects = BaseModelManager()
-    all_objects = models.Manager()
+    all_objects = BaseModelQuerySet.as_manager()
 
     class Meta:
         abstract = True
+        indexes = [
+            # Soft deleted rows past their retention, see the purge_deleted command. Only deleted rows are indexed.
+            models.Index(fields=['date_updated'], name='%(class)s_purge_idx', condition=models.Q(is_deleted=True)),
+        ]
 
     def delete(self, *args, **kwargs):
         self.is_deleted = True
-        self.save()
+        self.save(update_fields=['is_deleted', 'date_updated'])
 
     def hard_delete(self):
         super(BaseModel, self).delete()
@@ -0,0 +1,186 @@
+import base64
+import binascii
+import json
+from bisect import bisect_left, bisect_right
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def normalize_key_value(value):
+    # Cursor values travel as JSON, compare everything that isn't a JSON scalar by its string form
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class SortedRows(list):
+    """
+    Rows sorted by a pagination's ordering along with their keys, see `KeysetPagination.sort_rows()`. Lists that
+    are paginated on every request, like the catalog cache's, are sorted once so a page is found by bisection only.
+    """
+
+    def __init__(self, rows, keys, ordering):
+        super().__init__(rows)
+        self.keys = keys
+        self.ordering = ordering
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a unique, stable sort key.
+
+    Pages are fetched with a `WHERE key > cursor ORDER BY key LIMIT n` query, so
+    every page costs the same no matter how deep it is, provided an index
+    matches `ordering`. The last field of `ordering` must be unique.
+
+    Lists (such as rows served from a cache) are paginated in memory with the same cursors.
+    """
+    ordering = ('id',)
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_key(self, row):
+        if isinstance(row, dict):
+            return tuple(normalize_key_value(row[field]) for field in self.ordering)
+        return tuple(normalize_key_value(getattr(row, field)) for field in self.ordering)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            key, reverse = tuple(cursor['k']), bool(cursor.get('r'))
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(key) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return key, reverse
+
+    def encode_cursor(self, key, reverse=False):
+        cursor = {'k': list(key)}
+        if reverse:
+            cursor['r'] = True
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def coerce_key(self, model, key):
+        """
+        Converts the values of a cursor to the types of the model's ordering fields, a cursor that doesn't fit
+        them is invalid rather than an error of the query.
+        """
+        try:
+            key = tuple(model._meta.get_field(field).to_python(value) for field, value in zip(self.ordering, key))
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        # The ordering fields aren't nullable
+        if None in key:
+            raise NotFound(self.invalid_cursor_message)
+        return key
+
+    def keyset_filter(self, key, reverse):
+        """
+        Expands `(a, b, c) > (x, y, z)` into `a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)`.
+        """
+        lookup = 'lt' if reverse else 'gt'
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            equal = {self.ordering[i]: key[i] for i in range(position)}
+            condition |= Q(**equal, **{f'{field}__{lookup}': key[position]})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size_value = self.get_page_size(request)
+        key, reverse = self.decode_cursor(request)
+
+        if isinstance(queryset, (list, tuple)):
+            rows, has_more = self.paginate_list(queryset, key, reverse)
+        else:
+            rows, has_more = self.paginate_keyset(queryset, key, reverse)
+
+        if reverse:
+            self.has_next, self.has_previous = key is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, key is not None
+
+        self.page = rows
+        return rows
+
+    def paginate_keyset(self, queryset, key, reverse):
+        ordering = [f'-{field}' for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if key is not None:
+            queryset = queryset.filter(self.keyset_filter(self.coerce_key(queryset.model, key), reverse))
+
+        rows = list(queryset[:self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+        return rows, has_more
+
+    def sort_rows(self, rows):
+        rows = sorted(rows, key=self.get_key)
+        return SortedRows(rows, [self.get_key(row) for row in rows], self.ordering)
+
+    def paginate_list(self, rows, key, reverse):
+        if not isinstance(rows, SortedRows) or rows.ordering != self.ordering:
+            rows = self.sort_rows(rows)
+        keys = rows.keys
+        # Keys of different types don't compare, the cursor's values must have the types of the rows' keys
+        if key is not None and keys and any(type(value) is not type(other) for value, other in zip(key, keys[0])):
+            raise NotFound(self.invalid_cursor_message)
+
+        if reverse:
+            end = bisect_left(keys, key) if key is not None else len(rows)
+            start = max(0, end - self.page_size_value)
+            return rows[start:end], start > 0
+
+        start = bisect_right(keys, key) if key is not None else 0
+        end = start + self.page_size_value
+        return rows[start:end], end < len(rows)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_key(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_key(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
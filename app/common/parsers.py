@@ -0,0 +1,30 @@
+import msgpack
+import orjson
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+
+class ORJSONParser(parsers.JSONParser):
+    """
+    Parses JSON with orjson, which like DRF's strict JSONParser rejects NaN and Infinity.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackParser(parsers.BaseParser):
+    """
+    Parses MessagePack request bodies sent with `Content-Type: application/msgpack`.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            # Map keys must be strings, like in JSON
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=True)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -0,0 +1,36 @@
+"""
+PostgreSQL backend handing out connections from a per process pool.
+
+Select it with `ENGINE: 'common.pooled_postgresql'` and tune the pool with the
+`POOL` key of the database settings, see common.pooled_postgresql.pool. Keep
+`CONN_MAX_AGE` at 0 so Django returns the connection to the pool at the end of
+every request instead of holding on to it.
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_pool(self, conn_params):
+        return get_pool(
+            self.alias,
+            conn_params,
+            self.settings_dict.get('POOL') or {},
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+        )
+
+    def get_new_connection(self, conn_params):
+        # Set by the parent class when a connection is opened, pooled connections keep the level they were opened with
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        self.pool = self.get_pool(conn_params)
+        return self.pool.getconn()
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                return self.pool.putconn(self.connection)
@@ -0,0 +1,263 @@
+"""
+A thread safe pool of psycopg2 connections, one per database alias and process.
+
+Connections are checked out by the database wrapper when Django connects and
+handed back when Django closes its connection at the end of a request, so a
+worker reuses a few warm connections instead of opening one per request.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+from psycopg2 import extensions
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Holds at most `max_size` connections opened by `connect`. `fill()` opens `min_size` ahead of time (get_pool()
+    calls it when it creates a pool, and a forked process refills its own pool), the others are opened on demand.
+    Idle connections are never closed below `min_size`.
+
+    - A checkout waits at most `timeout` seconds for a connection when `max_size` are in use.
+    - Connections are replaced once they are `max_lifetime` seconds old.
+    - Connections left idle for more than `max_idle` seconds are closed, down to `min_size`.
+    - A connection idle for more than `check_interval` seconds runs `SELECT 1` before being handed out,
+      connections that are closed or fail the check are replaced. `None` disables the check.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=10, max_lifetime=1800, max_idle=600,
+                 check_interval=30):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError("The pool needs 0 <= MIN_SIZE <= MAX_SIZE and MAX_SIZE >= 1.")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+        self._lock = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        # (connection, opened at, last used at), the most recently used last
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._waiting = 0
+        self._counters = dict.fromkeys([
+            'checkouts', 'connections_opened', 'connections_closed', 'failed_checks', 'timeouts',
+        ], 0)
+        self._wait_time = 0.0
+
+    def getconn(self):
+        if self.pid != os.getpid():
+            # Connections opened before a fork belong to the parent, forget them without closing their sockets
+            with self._lock:
+                self._reset()
+            self.fill()
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry = self._take(deadline)
+            if entry is None:
+                conn, opened_at = self._open(), time.monotonic()
+                break
+            conn, opened_at, last_used = entry
+            if self._usable(conn, opened_at, last_used):
+                break
+            self._discard(conn)
+
+        with self._lock:
+            self._in_use[id(conn)] = (conn, opened_at)
+        return conn
+
+    def putconn(self, conn):
+        with self._lock:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            # Not one of ours, e.g. opened before a fork
+            conn.close()
+            return
+
+        opened_at = entry[1]
+        if conn.closed or self._expired(opened_at):
+            self._discard(conn)
+            return
+        try:
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            self._idle.append((conn, opened_at, time.monotonic()))
+            stale = self._pop_stale()
+            self._lock.notify()
+        for stale_conn in stale:
+            self._discard(stale_conn)
+
+    def fill(self):
+        """
+        Opens connections until the pool holds `min_size`.
+        """
+        while True:
+            with self._lock:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            conn = self._open()
+            with self._lock:
+                self._idle.appendleft((conn, time.monotonic(), time.monotonic()))
+                self._lock.notify()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn, opened_at, last_used in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': self.pid,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiting': self._waiting,
+                **self._counters,
+                'wait_time': round(self._wait_time, 6),
+            }
+
+    def _take(self, deadline):
+        """
+        Returns an idle connection entry, or None after reserving a slot for a new connection.
+        """
+        with self._lock:
+            self._counters['checkouts'] += 1
+            started = time.monotonic()
+            try:
+                while True:
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"No database connection became available within {self.timeout}s "
+                            f"({self.max_size} in use)."
+                        )
+                    self._waiting += 1
+                    try:
+                        self._lock.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+            finally:
+                self._wait_time += time.monotonic() - started
+
+    def _open(self):
+        try:
+            conn = self.connect()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._counters['connections_opened'] += 1
+        return conn
+
+    def _usable(self, conn, opened_at, last_used):
+        if conn.closed or self._expired(opened_at):
+            return False
+        if self.check_interval is not None and time.monotonic() - last_used > self.check_interval:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                with self._lock:
+                    self._counters['failed_checks'] += 1
+                return False
+        return True
+
+    def _expired(self, opened_at):
+        return self.max_lifetime is not None and time.monotonic() - opened_at > self.max_lifetime
+
+    def _pop_stale(self):
+        # Called with the lock held, the least recently used connections are at the left
+        stale = []
+        now = time.monotonic()
+        while (self.max_idle is not None and len(self._idle) > self.min_size
+               and now - self._idle[0][2] > self.max_idle):
+            stale.append(self._idle.popleft()[0])
+        return stale
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._counters['connections_closed'] += 1
+            self._lock.notify()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options, connect):
+    """
+    Returns the pool of a database alias and its connection parameters, creating
+    it with `options` (the POOL setting of the database) on first use. Keying on
+    the parameters keeps connections to e.g. the test database apart.
+    """
+    key = (alias, repr(sorted(conn_params.items())))
+    pool = _pools.get(key)
+    if pool is None:
+        created = False
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                created = True
+                pool = _pools[key] = ConnectionPool(
+                    connect,
+                    min_size=options.get('MIN_SIZE', 1),
+                    max_size=options.get('MAX_SIZE', 10),
+                    timeout=options.get('TIMEOUT', 10),
+                    max_lifetime=options.get('MAX_LIFETIME', 1800),
+                    max_idle=options.get('MAX_IDLE', 600),
+                    check_interval=options.get('CHECK_INTERVAL', 30),
+                )
+                pool.alias = alias
+                pool.database = conn_params.get('database') or conn_params.get('dbname')
+        if created:
+            # Outside of the lock, pools of other databases don't wait for these connections
+            pool.fill()
+    return pool
+
+
+def pool_stats():
+    """
+    Statistics of every pool of this process.
+    """
+    return [
+        {'alias': pool.alias, 'database': pool.database, **pool.stats()}
+        for pool in list(_pools.values())
+    ]
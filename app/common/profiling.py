@@ -0,0 +1,107 @@
+"""
+Per request accounting of SQL queries and of the time spent serializing and rendering.
+
+`RequestProfileMiddleware` (see common.middleware) starts a `RequestProfile`
+for each request and keeps it in a context variable, which asgiref copies to
+the threads `sync_to_async()` runs code in, so every query of the request is
+counted whichever thread runs it. Queries are counted by a wrapper installed
+on every database connection, and `timed()` adds the time spent in a block
+to the profile of the current request, if any.
+"""
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+current_profile = ContextVar('current_profile', default=None)
+
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SQL_PLACEHOLDER_LISTS = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+def sql_shape(sql):
+    """
+    The SQL with literals replaced and lists of placeholders collapsed, so the queries of an N+1 loop look the same.
+    """
+    sql = SQL_LITERALS.sub('?', sql)
+    return SQL_PLACEHOLDER_LISTS.sub('%s, ...', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = defaultdict(float)
+        # Nesting level of each timed() name, only the outermost block counts
+        self.depth = Counter()
+        self.shapes = Counter()
+        self.shape_times = defaultdict(float)
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        shape = sql_shape(sql)
+        self.shapes[shape] += 1
+        self.shape_times[shape] += duration
+
+    def repeated_shapes(self, limit=5):
+        """
+        The most frequent query shapes run more than once, as (shape, count, seconds) tuples.
+        """
+        return [
+            (shape, count, self.shape_times[shape])
+            for shape, count in self.shapes.most_common(limit) if count > 1
+        ]
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def timed(name):
+    """
+    Adds the time spent in the block to `name` in the profile of the current request.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    profile.depth[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.depth[name] -= 1
+        if not profile.depth[name]:
+            profile.timings[name] += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install_query_recorders():
+    """
+    Counts the queries of every connection, the ones of this thread now and the others once they connect.
+    """
+    connection_created.connect(install_query_recorder, dispatch_uid='install_query_recorder')
+    for connection in connections.all():
+        install_query_recorder(connection)
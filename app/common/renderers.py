@@ -0,0 +1,48 @@
+import msgpack
+import orjson
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+# Types orjson and msgpack don't know (lazy strings, decimals, querysets...) are encoded like DRF does
+encode_default = JSONEncoder().default
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    Renders JSON with orjson, byte for byte like DRF's JSONRenderer with the default
+    settings (compact, unescaped unicode, UTC datetimes ending in Z).
+
+    UUIDs, datetimes, dates and times are encoded natively. Indented output
+    (`Accept: application/json; indent=4`) is left to DRF's renderer, orjson only
+    indents by two spaces.
+    """
+    options = orjson.OPT_UTC_Z
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            rendered = orjson.dumps(data, default=encode_default, option=self.options)
+        except orjson.JSONEncodeError:
+            # e.g. integers above 64 bits or non string keys, which the json module accepts
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like DRF, escape the line separators that are valid JSON but not valid javascript
+        return rendered.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Renders MessagePack for the clients that ask for it with `Accept: application/msgpack`
+    (or ?format=msgpack). Values are encoded as in JSON, UUIDs and dates as strings.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
@@ -0,0 +1,68 @@
+from rest_framework import serializers
+
+from .profiling import timed
+
+
+def get_query_param_set(request, name):
+    """
+    Returns the comma separated values of a query parameter as a set, or None when it isn't given.
+    """
+    if request is None:
+        return None
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+def is_expanded(request, field_name):
+    """
+    Nested objects are embedded unless the request passes ?expand= without them.
+    """
+    expand = get_query_param_set(request, 'expand')
+    return expand is None or field_name in expand
+
+
+class DynamicFieldsMixin:
+    """
+    Lets clients shape the output of a serializer from the query string:
+
+    - ?fields=id,title only returns the listed fields of the top level objects (GET only)
+    - ?expand=destination,location embeds only the listed nested objects, any
+      other nested object is returned as its id (or a list of ids)
+
+    Nested serializers that are serialized on their own, like itinerary item
+    activities, should get `nested` set in their context so ?fields= isn't applied to them.
+
+    The time spent serializing is added to the request's profile, see common.profiling.
+    """
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+    def is_top_level(self):
+        if self.context.get('nested'):
+            return False
+        parent = getattr(self, 'parent', None)
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+
+        expand = get_query_param_set(request, 'expand')
+        if expand is not None:
+            for name, field in list(fields.items()):
+                many = isinstance(field, serializers.ListSerializer)
+                nested = field.child if many else field
+                if isinstance(nested, serializers.BaseSerializer) and name not in expand:
+                    kwargs = {'source': field.source} if field.source else {}
+                    fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many, **kwargs)
+
+        requested = get_query_param_set(request, 'fields')
+        if requested is not None and request.method == 'GET' and self.is_top_level():
+            for name in set(fields) - requested:
+                fields.pop(name)
+
+        return fields
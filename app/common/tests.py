@@ -0,0 +1,139 @@
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.db.utils import OperationalError
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+
+from .pooled_postgresql import pool as pool_module
+from .pooled_postgresql.pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql):
+        if self.connection.broken:
+            raise OperationalError("server closed the connection unexpectedly")
+        self.connection.queries.append(sql)
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.queries = []
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def create_pool(self, **options):
+        return ConnectionPool(self.connect, **{'min_size': 0, 'check_interval': None, **options})
+
+    def test_get_pool_opens_min_size_connections(self):
+        options = {'MIN_SIZE': 2, 'MAX_SIZE': 4}
+        params = {'database': 'pool-test'}
+        with mock.patch.dict(pool_module._pools):
+            pool = pool_module.get_pool('pool-test', params, options, self.connect)
+            self.assertEqual(len(self.opened), 2)
+            self.assertEqual(pool.stats()['idle'], 2)
+            self.assertIs(pool_module.get_pool('pool-test', params, options, self.connect), pool)
+            self.assertEqual(len(self.opened), 2)
+
+            self.assertIn(pool.getconn(), self.opened)
+            self.assertEqual(len(self.opened), 2)
+
+    def test_checkout_waits_at_most_timeout(self):
+        pool = self.create_pool(max_size=1, timeout=0.05)
+        connection = pool.getconn()
+
+        started = time.monotonic()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+        pool.putconn(connection)
+        self.assertIs(pool.getconn(), connection)
+
+    def test_connections_are_replaced_after_max_lifetime(self):
+        pool = self.create_pool(max_lifetime=0.01)
+        connection = pool.getconn()
+        time.sleep(0.02)
+        pool.putconn(connection)
+
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.getconn(), connection)
+        self.assertEqual(pool.stats()['connections_closed'], 1)
+
+    def test_idle_connections_are_closed_down_to_min_size(self):
+        pool = self.create_pool(min_size=1, max_idle=0.01)
+        first, second, third = pool.getconn(), pool.getconn(), pool.getconn()
+        pool.putconn(first)
+        pool.putconn(second)
+        time.sleep(0.02)
+        pool.putconn(third)
+
+        self.assertEqual([connection.closed for connection in (first, second, third)], [1, 1, 0])
+        self.assertEqual(pool.stats()['idle'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_idle_connections_are_checked_before_reuse(self):
+        pool = self.create_pool(check_interval=0.01)
+        connection = pool.getconn()
+        pool.putconn(connection)
+        time.sleep(0.02)
+        self.assertIs(pool.getconn(), connection)
+        self.assertEqual(connection.queries, ['SELECT 1'])
+
+        pool.putconn(connection)
+        time.sleep(0.02)
+        connection.broken = True
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['failed_checks'], 1)
+
+    def test_forked_process_gets_its_own_connections(self):
+        pool = self.create_pool(min_size=1)
+        pool.fill()
+        parent_connection = pool.getconn()
+
+        with mock.patch.object(pool_module.os, 'getpid', return_value=pool.pid + 1):
+            child_connection = pool.getconn()
+            self.assertIsNot(child_connection, parent_connection)
+            self.assertFalse(parent_connection.closed)
+            self.assertEqual(pool.stats()['size'], 1)
+
+            # Connections of the parent aren't returned to the child's pool
+            pool.putconn(parent_connection)
+            self.assertTrue(parent_connection.closed)
+            self.assertEqual(pool.stats()['idle'], 0)
@@ -0,0 +1,28 @@
+from django.db import connections
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .permissions import IsStaffOrSuperuser
+from .pooled_postgresql.pool import pool_stats
+
+
+class DatabasePoolStatsView(APIView):
+    """
+    Connection pool statistics of the worker process serving the request, for monitoring.
+    Each gunicorn worker has its own pools, so successive requests may report different workers.
+    """
+    permission_classes = [IsAuthenticated, IsStaffOrSuperuser]
+
+    def get(self, request):
+        return Response({
+            'databases': {
+                alias: {
+                    'engine': connections[alias].settings_dict['ENGINE'],
+                    'conn_max_age': connections[alias].settings_dict['CONN_MAX_AGE'],
+                    'conn_health_checks': connections[alias].settings_dict['CONN_HEALTH_CHECKS'],
+                }
+                for alias in connections
+            },
+            'pools': pool_stats(),
+        })
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'allauth',  # for authentication
@@ -60,6 +61,8 @@ CORS_ALLOW_ALL_ORIGINS = True
 # ]
 
 MIDDLEWARE = [
+    # First, so it measures the whole request, see common.middleware
+    "common.middleware.RequestProfileMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     'django.middleware.security.SecurityMiddleware',
@@ -100,9 +103,21 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
 
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'custom_auth.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ),
+    # orjson renders the same JSON as DRF's renderer, faster; clients may ask for MessagePack instead
+    'DEFAULT_RENDERER_CLASSES': (
+        'common.renderers.ORJSONRenderer',
+        'common.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'common.parsers.ORJSONParser',
+        'common.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 #     'ACCESS_TOKEN_LIFETIME': timedelta(hours=2),
 SIMPLE_JWT = {
@@ -120,10 +135,11 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 
     'AUTH_TOKEN_CLASSES': (
-        'rest_framework_simplejwt.tokens.AccessToken',
-        'rest_framework_simplejwt.tokens.RefreshToken',
+        'custom_auth.tokens.ClaimsAccessToken',
+        'custom_auth.tokens.ClaimsRefreshToken',
     ),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_REFRESH_SERIALIZER': 'custom_auth.serializers.ClaimsTokenRefreshSerializer',
 }
 
 
@@ -151,6 +167,37 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# How each ENV profile holds its connections:
+# - "per_request": a new connection for every request.
+# - "persistent": each thread keeps one connection for CONN_MAX_AGE seconds, checked before reuse.
+# - "pooled": each process keeps a pool of connections shared by its threads, see common.pooled_postgresql.
+# DB_CONNECTION_MODE overrides the mode of the selected profile.
+DATABASE_CONNECTION_MODES = {
+    "per_request": {
+        "CONN_MAX_AGE": 0,
+    },
+    "persistent": {
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 300)),
+        "CONN_HEALTH_CHECKS": True,
+    },
+    "pooled": {
+        "ENGINE": "common.pooled_postgresql",
+        # Connections go back to the pool at the end of each request
+        "CONN_MAX_AGE": 0,
+        "POOL": {
+            "MIN_SIZE": int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+            "MAX_SIZE": int(os.getenv("DB_POOL_MAX_SIZE", 4)),
+            # Seconds to wait for a connection when MAX_SIZE are in use
+            "TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+            # Seconds before a connection is replaced, and before an idle one above MIN_SIZE is closed
+            "MAX_LIFETIME": int(os.getenv("DB_POOL_MAX_LIFETIME", 1800)),
+            "MAX_IDLE": int(os.getenv("DB_POOL_MAX_IDLE", 600)),
+            # Connections idle for longer are checked with SELECT 1 before being handed out
+            "CHECK_INTERVAL": int(os.getenv("DB_POOL_CHECK_INTERVAL", 30)),
+        },
+    },
+}
+
 DATABASE_ENVS = {
     "local": {
         "ENGINE": "django.db.backends.postgresql",
@@ -159,6 +206,7 @@ DATABASE_ENVS = {
         "PASSWORD": "turtlesareawesome",
         "HOST": "localhost",
         "PORT": "5633",
+        "CONNECTION_MODE": "persistent",
     },
     "docker_local": {
         "ENGINE": "django.db.backends.postgresql",
@@ -167,11 +215,19 @@ DATABASE_ENVS = {
         "PASSWORD": "turtlesareawesome",
         "HOST": os.getenv("DB_HOST"),
         "PORT": "5432",
+        "CONNECTION_MODE": "pooled",
     }
 }
 
+
+def database_settings(env, mode=None):
+    settings = dict(DATABASE_ENVS[env])
+    profile_mode = settings.pop("CONNECTION_MODE", "per_request")
+    return {**settings, **DATABASE_CONNECTION_MODES[mode or profile_mode]}
+
+
 DATABASES = {
-    "default": DATABASE_ENVS.get(ENV)
+    "default": database_settings(ENV, os.getenv("DB_CONNECTION_MODE"))
 }
 
 
@@ -217,4 +273,22 @@ STATIC_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'static')
 STATIC_URL = '/static/'
 
 MEDIA_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'media')
-MEDIA_URL = '/media/'
\ No newline at end of file
+MEDIA_URL = '/media/'
+
+# Seconds the in-process destination catalog cache trusts its version outside of a request.
+# During a request the version is checked once, see destinations.cache.
+CATALOG_CACHE_MAX_AGE = 5
+
+# Serve the read views that have an async version with it, see common.async_views.
+# Set when the app runs under ASGI (config.asgi, SERVER_MODE=asgi).
+ASYNC_READ_VIEWS = os.getenv("SERVER_MODE") == "asgi"
+
+# Seconds a worker keeps a user loaded for a token authenticated request, see custom_auth.authentication.
+# Changes to a user reach other workers after at most this long.
+USER_CACHE_TTL = 60
+
+# Requests running more queries or taking more milliseconds than this are logged with their most
+# repeated queries, see common.middleware. Every response reports its timings in a Server-Timing header.
+REQUEST_QUERY_BUDGET = int(os.getenv("REQUEST_QUERY_BUDGET", 30))
+REQUEST_TIME_BUDGET = int(os.getenv("REQUEST_TIME_BUDGET", 500))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
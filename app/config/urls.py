@@ -17,9 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from common.views import DatabasePoolStatsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('custom_auth.urls')),
     path('destinations/', include('destinations.urls')),
-    path('trips/', include('trips.urls'))
+    path('trips/', include('trips.urls')),
+    path('monitoring/db-pool/', DatabasePoolStatsView.as_view(), name='db-pool-stats'),
 ]
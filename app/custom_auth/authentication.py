@@ -0,0 +1,134 @@
+"""
+Stateless JWT authentication.
+
+The request user is built from the claims of the access token, so most
+requests are authenticated without a query. The full User is only loaded when
+a view reads an attribute the token doesn't carry, through a per-worker cache
+whose entries expire after USER_CACHE_TTL seconds.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+
+class UserCache:
+    """
+    Users by id, kept for `ttl` seconds. Cached users are shared between requests and must not be modified.
+    """
+
+    def __init__(self, ttl=60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def get(self, pk):
+        pk = str(pk)
+        entry = self._users.get(pk)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+
+        user = get_user_model().objects.filter(pk=pk).first()
+        if user is not None:
+            with self._lock:
+                if len(self._users) >= self.max_size:
+                    self._evict()
+                self._users[pk] = (user, time.monotonic() + self.ttl)
+        return user
+
+    def _evict(self):
+        now = time.monotonic()
+        for pk in [pk for pk, (_, expires) in self._users.items() if expires <= now]:
+            del self._users[pk]
+        # Still full, drop the oldest entries
+        while len(self._users) >= self.max_size:
+            del self._users[next(iter(self._users))]
+
+    def invalidate(self, pk=None):
+        with self._lock:
+            if pk is None:
+                self._users.clear()
+            else:
+                self._users.pop(str(pk), None)
+
+
+user_cache = UserCache(ttl=getattr(settings, 'USER_CACHE_TTL', 60))
+
+
+class ClaimsUser(TokenUser):
+    """
+    The user of a request authenticated with an access token.
+
+    `pk`, `is_staff` and `is_superuser` come from the token. Any other
+    attribute is read from the full User, loaded through the user cache.
+    Compares equal to the User it stands for.
+    """
+
+    @cached_property
+    def id(self):
+        return get_user_model()._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def user(self):
+        user = user_cache.get(self.pk)
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(_("User not found"), code='user_not_found')
+        return user
+
+    @cached_property
+    def username(self):
+        return self.user.username
+
+    @cached_property
+    def is_staff(self):
+        return self.get_claim('is_staff')
+
+    @cached_property
+    def is_superuser(self):
+        return self.get_claim('is_superuser')
+
+    def get_claim(self, claim):
+        # Tokens issued before the claims were added fall back to the user
+        if claim in self.token:
+            return self.token[claim]
+        return getattr(self.user, claim)
+
+    def __str__(self):
+        return str(self.user)
+
+    def __eq__(self, other):
+        if isinstance(other, (TokenUser, get_user_model())):
+            return self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_') or attr == 'token':
+            raise AttributeError(attr)
+        return getattr(self.user, attr)
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authenticates access tokens without loading the user, see ClaimsUser.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        return ClaimsUser(validated_token)
+
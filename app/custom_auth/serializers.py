@@ -1,6 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import user_cache
+from .tokens import ClaimsRefreshToken, add_user_claims
 
 User = get_user_model()
 
@@ -21,6 +26,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
 
     def validate(self, attrs):
         # The default result (access/refresh tokens)
@@ -31,6 +37,41 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
 
 
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refreshes the user claims of the token from the user cache, so a change of
+    is_staff or is_superuser reaches the next access token without logging in again.
+    """
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user = user_cache.get(refresh[api_settings.USER_ID_CLAIM])
+        if user is None or not user.is_active:
+            raise AuthenticationFailed("User not found", code='user_not_found')
+        add_user_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    # Attempt to blacklist the given refresh token
+                    refresh.blacklist()
+                except AttributeError:
+                    # If blacklist app not installed, `blacklist` method will not be present
+                    pass
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+
+            data['refresh'] = str(refresh)
+
+        return data
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
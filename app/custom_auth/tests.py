@@ -1,3 +1,55 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .authentication import user_cache
+from .models import User
+
+
+class ClaimsAuthenticationTests(TestCase):
+    """
+    Guards against token authenticated requests loading the user from the database.
+    """
+
+    def setUp(self):
+        user_cache.invalidate()
+        self.user = User.objects.create_user(username='guest@example.com', email='guest@example.com', password='pw')
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post('/auth/login/', {'email': 'guest@example.com', 'password': 'pw'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_access_token_carries_user_claims(self):
+        access = AccessToken(self.login()['access'])
+        self.assertEqual(access['user_id'], str(self.user.pk))
+        self.assertIs(access['is_staff'], False)
+        self.assertIs(access['is_superuser'], False)
+
+    def test_authenticated_request_does_not_load_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/trips/trips/')
+        self.assertEqual(response.status_code, 200)
+        user_table = User._meta.db_table
+        self.assertFalse([query['sql'] for query in context.captured_queries if user_table in query['sql']])
+
+    def test_full_user_is_loaded_when_needed(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+
+        response = self.client.get(f'/auth/user/{self.user.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], 'guest@example.com')
+
+    def test_refresh_updates_claims(self):
+        refresh = self.login()['refresh']
+        self.user.is_staff = True
+        self.user.save()
+
+        response = self.client.post('/auth/login/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(AccessToken(response.json()['access'])['is_staff'], True)
@@ -0,0 +1,27 @@
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+
+# User fields copied into tokens, so requests can be authorized without loading the user
+USER_CLAIMS = ('is_staff', 'is_superuser')
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class ClaimsAccessToken(AccessToken):
+
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+class ClaimsRefreshToken(RefreshToken):
+    # Access tokens made from a refresh token copy its claims
+    access_token_class = ClaimsAccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
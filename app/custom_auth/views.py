@@ -20,7 +20,7 @@ class UserDetailView(RetrieveAPIView):
         if user.is_staff or user.is_superuser:
             # Allow staff and admins to view any user's details
             return models.User.objects.get(pk=self.kwargs['pk'])
-        elif str(user.pk) == self.kwargs['pk']:
+        elif str(user.pk) == str(self.kwargs['pk']):
             # Allow users to view their own details
             return user
         else:
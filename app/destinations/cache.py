@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.local import Local
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from . import models, serializers
+from .pagination import ExperiencePagination
+from .search import PrefixIndex
+
+
+CATALOG_MODELS = (models.Destination, models.Location, models.Land, models.Experience)
+
+# Outside of requests (management commands, shells) the version is rechecked after this many seconds
+DEFAULT_MAX_AGE = 5
+
+
+class CatalogSnapshot:
+    """
+    An immutable copy of the whole destination catalog at a given version.
+    Experiences come with their lands and locations prefetched, their lists
+    are sorted for ExperiencePagination, and the names are indexed for autocomplete.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.by_id = {}
+        self.by_disney_id = {}
+        self.locations_by_destination = defaultdict(list)
+        self.lands_by_park = defaultdict(list)
+        self.experiences = []
+        self.experiences_by_location = defaultdict(list)
+        self.search_index = None
+
+    @classmethod
+    def load(cls, version):
+        snapshot = cls(version)
+        querysets = {
+            models.Destination: models.Destination.objects.all(),
+            models.Location: models.Location.objects.all(),
+            models.Land: models.Land.objects.all(),
+            models.Experience: serializers.ExperienceSerializer.setup_eager_loading(models.Experience.objects.all()),
+        }
+        for model, queryset in querysets.items():
+            rows = list(queryset.order_by('name', 'id'))
+            snapshot.by_id[model] = {row.pk: row for row in rows}
+            snapshot.by_disney_id[model] = {row.disney_id: row for row in rows}
+
+        for location in snapshot.by_id[models.Location].values():
+            snapshot.locations_by_destination[location.destination_id].append(location)
+        for land in snapshot.by_id[models.Land].values():
+            snapshot.lands_by_park[land.park_id].append(land)
+        for experience in snapshot.by_id[models.Experience].values():
+            for location in experience.locations.all():
+                snapshot.experiences_by_location[location.pk].append(experience)
+
+        pagination = ExperiencePagination()
+        snapshot.experiences = pagination.sort_rows(snapshot.by_id[models.Experience].values())
+        for location_id, experiences in snapshot.experiences_by_location.items():
+            snapshot.experiences_by_location[location_id] = pagination.sort_rows(experiences)
+
+        snapshot.search_index = PrefixIndex.build(snapshot)
+        return snapshot
+
+
+class CatalogCache:
+    """
+    Read-through cache of the destination catalog held by each worker process.
+
+    The cached snapshot is tagged with the CatalogVersion it was loaded at. The
+    version is checked at most once per request, and a worker reloads the
+    whole catalog when it has moved on. Only one thread loads at a time, the
+    others wait for it and reuse its snapshot.
+
+    Cached instances are shared between requests and must not be modified.
+
+    The per request state is kept in an asgiref Local, which is per thread
+    under WSGI and shared by a request's coroutines and the threads they hand
+    work to under ASGI. Async code calls `aget_snapshot()` once, the lookups
+    that follow are then served from memory.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._load_lock = threading.Lock()
+        self._local = Local()
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'CATALOG_CACHE_MAX_AGE', DEFAULT_MAX_AGE)
+
+    def request_started(self, **kwargs):
+        self._local.checked_at = None
+
+    def invalidate(self):
+        self._snapshot = None
+        self._local.checked_at = None
+
+    def get_version(self):
+        checked_at = getattr(self._local, 'checked_at', None)
+        if checked_at is None or time.monotonic() - checked_at > self.max_age:
+            self._local.version = models.CatalogVersion.current()
+            self._local.checked_at = time.monotonic()
+        return self._local.version
+
+    async def aget_version(self):
+        checked_at = getattr(self._local, 'checked_at', None)
+        if checked_at is None or time.monotonic() - checked_at > self.max_age:
+            return await sync_to_async(self.get_version)()
+        return self._local.version
+
+    def get_current_snapshot(self):
+        """
+        Returns the snapshot if it can be used without checking the database, else None.
+        """
+        checked_at = getattr(self._local, 'checked_at', None)
+        if checked_at is None or time.monotonic() - checked_at > self.max_age:
+            return None
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != self._local.version:
+            return None
+        return snapshot
+
+    async def aget_snapshot(self):
+        snapshot = self.get_current_snapshot()
+        if snapshot is None:
+            snapshot = await sync_to_async(self.get_snapshot)()
+        return snapshot
+
+    def get_snapshot(self):
+        version = self.get_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with self._load_lock:
+            # Another thread may have loaded it while we were waiting
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = CatalogSnapshot.load(version)
+                self._snapshot = snapshot
+        return snapshot
+
+    def get(self, model, pk):
+        try:
+            pk = model._meta.pk.to_python(pk)
+        except ValidationError:
+            return None
+        return self.get_snapshot().by_id[model].get(pk)
+
+    def get_by_disney_id(self, model, disney_id):
+        return self.get_snapshot().by_disney_id[model].get(disney_id)
+
+    def all(self, model):
+        return list(self.get_snapshot().by_id[model].values())
+
+    def locations_for_destination(self, destination_id):
+        return list(self.get_snapshot().locations_by_destination.get(destination_id, []))
+
+    def lands_for_park(self, park_id):
+        return list(self.get_snapshot().lands_by_park.get(park_id, []))
+
+    def experiences_for_location(self, location_id=None):
+        """
+        Returns the experiences of a location, or all of them, sorted for ExperiencePagination.
+        The list is shared and must not be modified.
+        """
+        snapshot = self.get_snapshot()
+        if location_id is None:
+            return snapshot.experiences
+        return snapshot.experiences_by_location.get(location_id, [])
+
+    def autocomplete(self, destination_id, query, experience_type=None, limit=10):
+        return self.get_snapshot().search_index.search(destination_id, query, experience_type, limit)
+
+
+catalog = CatalogCache()
@@ -0,0 +1,341 @@
+import gzip
+import json
+import sys
+import time
+from collections import Counter, namedtuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from destinations import models
+from destinations.signals import bump_catalog_version
+
+
+# How a record type maps to its model. Foreign keys and relations are given in
+# the dump as the disney_id of the row they point to.
+RecordType = namedtuple('RecordType', ['model', 'fields', 'optional_fields', 'foreign_keys', 'relations'])
+
+RECORD_TYPES = {
+    'destination': RecordType(models.Destination, ('name',), (), {}, {}),
+    'location': RecordType(
+        models.Location, ('name', 'location_type'), (), {'destination': models.Destination}, {},
+    ),
+    'land': RecordType(models.Land, ('name',), (), {'park': models.Location}, {}),
+    'experience': RecordType(
+        models.Experience, ('name', 'experience_type'), ('short_name', 'destination'),
+        {'destination': models.Destination}, {'lands': models.Land, 'locations': models.Location},
+    ),
+}
+
+# Parents are written before the rows pointing to them
+INGEST_ORDER = ('destination', 'location', 'land', 'experience')
+
+
+def unique_fields(model):
+    """
+    Returns the fields written by the ingest that are unique on their own, besides disney_id.
+    """
+    return [
+        field.name for field in model._meta.concrete_fields
+        if field.unique and not field.primary_key and field.name != 'disney_id'
+    ]
+
+
+def iter_ndjson(stream):
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise CommandError(f"Line {number} isn't valid JSON: {e}")
+
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """
+    Yields the items of a JSON array read from `stream` one chunk at a time, so
+    only the records being decoded are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while not buffer:
+        chunk = stream.read(chunk_size)
+        buffer = chunk.lstrip()
+        if not chunk:
+            break
+    if not buffer.startswith('['):
+        raise CommandError("A JSON dump must be an array of records.")
+    position, eof = 1, False
+
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer):
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise CommandError(f"The JSON dump is invalid: {e}")
+            else:
+                yield item
+                continue
+        elif eof:
+            raise CommandError("The JSON array isn't terminated.")
+
+        # The next record continues in the next chunk
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Upserts destinations, locations, lands and experiences from a JSON or NDJSON dump of Disney's API. "
+        "Each record has a 'type' (destination, location, land or experience), a 'disney_id' and the fields "
+        "of its model, foreign keys and the lands/locations of experiences are given as disney_ids. Records "
+        "are written in batches keyed on disney_id, rows that didn't change are skipped, and the catalog "
+        "version is bumped once at the end if anything changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The dump, '-' reads stdin. Files ending in .gz are decompressed.")
+        parser.add_argument(
+            '--format', choices=['auto', 'json', 'ndjson'], default='auto',
+            help="A JSON array of records or one record per line. Defaults to the file extension.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Records written per transaction.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        self.batch_size = options['batch_size']
+        self.stats = {record_type: Counter() for record_type in INGEST_ORDER}
+        self.relation_stats = Counter()
+        # disney_id -> pk of every catalog row, including soft deleted ones which are restored by the dump
+        self.ids = {
+            spec.model: dict(spec.model.all_objects.values_list('disney_id', 'pk'))
+            for spec in RECORD_TYPES.values()
+        }
+        self.pending = {record_type: {} for record_type in INGEST_ORDER}
+
+        started = time.monotonic()
+        with self.open(options['path']) as stream:
+            for record in self.parse(stream, options['format'], options['path']):
+                self.add(record)
+        for record_type in INGEST_ORDER:
+            self.flush(record_type)
+        elapsed = time.monotonic() - started
+
+        changed = any(stats['created'] or stats['updated'] for stats in self.stats.values()) or any(
+            self.relation_stats.values()
+        )
+        if changed:
+            bump_catalog_version()
+        self.report(elapsed, changed)
+
+    def open(self, path):
+        if path == '-':
+            return sys.stdin
+        try:
+            if path.endswith('.gz'):
+                return gzip.open(path, 'rt', encoding='utf-8')
+            return open(path, encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f"Can't read {path}: {e}")
+
+    def parse(self, stream, dump_format, path):
+        if dump_format == 'auto':
+            dump_format = 'json' if path.removesuffix('.gz').endswith('.json') else 'ndjson'
+        if dump_format == 'json':
+            return iter_json_array(stream)
+        return iter_ndjson(stream)
+
+    def skip(self, record_type, disney_id, reason):
+        self.stats[record_type]['skipped'] += 1
+        self.stderr.write(f"Skipped {record_type} {disney_id}: {reason}")
+
+    def add(self, record):
+        record_type = record.get('type') if isinstance(record, dict) else None
+        if record_type not in RECORD_TYPES:
+            self.stderr.write(f"Skipped a record of unknown type: {str(record)[:100]}")
+            return
+        self.stats[record_type]['read'] += 1
+        disney_id = record.get('disney_id')
+        if not disney_id:
+            self.skip(record_type, '(no disney_id)', "disney_id is missing.")
+            return
+        missing = [field for field in RECORD_TYPES[record_type].fields if record.get(field) in (None, '')]
+        if missing:
+            self.skip(record_type, disney_id, f"{', '.join(missing)} missing.")
+            return
+
+        # A record repeated in a batch is only written once, the last one wins
+        pending = self.pending[record_type]
+        pending[disney_id] = record
+        if len(pending) >= self.batch_size:
+            self.flush(record_type)
+
+    def flush(self, record_type):
+        # Rows of this batch may point to parents still waiting in their own batch
+        for parent_type in INGEST_ORDER[:INGEST_ORDER.index(record_type)]:
+            if self.pending[parent_type]:
+                self.flush(parent_type)
+
+        records, self.pending[record_type] = self.pending[record_type], {}
+        if not records:
+            return
+        spec = RECORD_TYPES[record_type]
+        stats = self.stats[record_type]
+
+        rows = {}
+        for disney_id, record in records.items():
+            row = self.build_row(record_type, spec, disney_id, record)
+            if row is not None:
+                rows[disney_id] = row
+
+        self.drop_collisions(record_type, spec, rows)
+
+        with transaction.atomic():
+            self.upsert(spec, rows, stats)
+            for name, related_model in spec.relations.items():
+                self.sync_relation(record_type, spec, name, related_model, records, rows)
+
+    def build_row(self, record_type, spec, disney_id, record):
+        """
+        Returns the column values of a record, or None when it is invalid or points to a row that doesn't exist.
+        """
+        row = {field: record[field] for field in spec.fields}
+        for field in spec.fields:
+            choices = spec.model._meta.get_field(field).choices
+            if choices and row[field] not in dict(choices):
+                self.skip(record_type, disney_id, f"{row[field]} isn't a valid {field}.")
+                return None
+        for field in spec.optional_fields:
+            if field not in spec.foreign_keys:
+                row[field] = record.get(field)
+        for field, parent_model in spec.foreign_keys.items():
+            parent_id = record.get(field)
+            if parent_id is None and field in spec.optional_fields:
+                row[f'{field}_id'] = None
+                continue
+            if parent_id not in self.ids[parent_model]:
+                self.skip(record_type, disney_id, f"{field} {parent_id} doesn't exist.")
+                return None
+            row[f'{field}_id'] = self.ids[parent_model][parent_id]
+        return row
+
+    def drop_collisions(self, record_type, spec, rows):
+        """
+        Skips the rows whose unique fields other than disney_id (the names of destinations and locations) are
+        taken by another row, in the database or earlier in the batch. The upsert only resolves conflicts on
+        disney_id, one of these would abort the whole batch with an IntegrityError.
+        """
+        for field in unique_fields(spec.model):
+            values = {row[field] for row in rows.values()}
+            taken = dict(
+                spec.model.all_objects.filter(**{f'{field}__in': values}).values_list(field, 'disney_id')
+            )
+            for disney_id, row in list(rows.items()):
+                value = row[field]
+                other = taken.setdefault(value, disney_id)
+                if other != disney_id:
+                    self.skip(record_type, disney_id, f"{field} {value!r} is already used by {record_type} {other}.")
+                    del rows[disney_id]
+
+    def upsert(self, spec, rows, stats):
+        model = spec.model
+        columns = list(next(iter(rows.values())).keys()) if rows else []
+        existing = {
+            values['disney_id']: values
+            for values in model.all_objects.filter(disney_id__in=rows).values('pk', 'disney_id', 'is_deleted', *columns)
+        }
+
+        changed = []
+        for disney_id, row in rows.items():
+            current = existing.get(disney_id)
+            if current is None:
+                stats['created'] += 1
+            elif current['is_deleted'] or any(current[column] != value for column, value in row.items()):
+                stats['updated'] += 1
+            else:
+                stats['unchanged'] += 1
+                continue
+            changed.append(model(disney_id=disney_id, is_deleted=False, **row))
+        if not changed:
+            return
+
+        # INSERT ... ON CONFLICT (disney_id) DO UPDATE. Bulk writes don't send signals, the catalog
+        # version is bumped once the whole dump is in.
+        model.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=['disney_id'],
+            update_fields=[*columns, 'is_deleted', 'date_updated'],
+        )
+        for obj in changed:
+            # The pk of an updated row is the one it already had, not the one generated for the insert
+            current = existing.get(obj.disney_id)
+            self.ids[model][obj.disney_id] = current['pk'] if current else obj.pk
+
+    def sync_relation(self, record_type, spec, name, related_model, records, rows):
+        """
+        Makes the `name` relation of the batch's rows match the dump, for the records listing it.
+        """
+        field = spec.model._meta.get_field(name)
+        through = field.remote_field.through
+        source_column = field.m2m_column_name()
+        target_column = field.m2m_reverse_name()
+
+        wanted = set()
+        owner_ids = set()
+        for disney_id, record in records.items():
+            if disney_id not in rows or name not in record:
+                continue
+            owner_id = self.ids[spec.model][disney_id]
+            owner_ids.add(owner_id)
+            for related_disney_id in record[name] or []:
+                related_id = self.ids[related_model].get(related_disney_id)
+                if related_id is None:
+                    self.stderr.write(f"{record_type} {disney_id}: {name} {related_disney_id} doesn't exist.")
+                    continue
+                wanted.add((owner_id, related_id))
+        if not owner_ids:
+            return
+
+        existing = {
+            (owner_id, related_id): pk
+            for pk, owner_id, related_id in through.objects.filter(**{f'{source_column}__in': owner_ids})
+            .values_list('pk', source_column, target_column)
+        }
+        added = wanted - existing.keys()
+        removed = [pk for pair, pk in existing.items() if pair not in wanted]
+        if added:
+            through.objects.bulk_create(
+                [through(**{source_column: owner_id, target_column: related_id}) for owner_id, related_id in added],
+                ignore_conflicts=True,
+            )
+        if removed:
+            through.objects.filter(pk__in=removed).delete()
+        self.relation_stats[f'{name} added'] += len(added)
+        self.relation_stats[f'{name} removed'] += len(removed)
+
+    def report(self, elapsed, changed):
+        for record_type, stats in self.stats.items():
+            self.stdout.write(
+                f"{record_type}: {stats['read']} read, {stats['created']} created, {stats['updated']} updated, "
+                f"{stats['unchanged']} unchanged, {stats['skipped']} skipped."
+            )
+        if self.relation_stats:
+            self.stdout.write("experience relations: " + ', '.join(
+                f"{count} {name}" for name, count in sorted(self.relation_stats.items())
+            ) + '.')
+
+        read = sum(stats['read'] for stats in self.stats.values())
+        rate = read / elapsed if elapsed else 0
+        self.stdout.write(f"Ingested {read} records in {elapsed:.2f}s ({rate:.0f} records/s).")
+        if changed:
+            self.stdout.write(self.style.SUCCESS("Catalog updated."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Catalog unchanged."))
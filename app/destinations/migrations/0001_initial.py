@@ -0,0 +1,80 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Destination',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False, editable=False)),
+                ('name', models.CharField(max_length=150, unique=True)),
+                ('disney_id', models.CharField(help_text="Unique identifier from Disney's API", max_length=150, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False, editable=False)),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('disney_id', models.CharField(help_text="Unique identifier from Disney's API", max_length=150, unique=True)),
+                ('location_type', models.CharField(choices=[('resort', 'Resort'), ('theme-park', 'Theme Park'), ('water-park', 'Water Park'), ('entertainment-venue', 'Entertainment Venue')], max_length=20)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='destinations.destination')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Land',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False, editable=False)),
+                ('name', models.CharField(max_length=200)),
+                ('disney_id', models.CharField(help_text="Unique identifier from Disney's API", max_length=150, unique=True)),
+                ('park', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='destinations.location')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Experience',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False, editable=False)),
+                ('name', models.CharField(max_length=150)),
+                ('short_name', models.CharField(blank=True, help_text='Shortened name for display purposes, especially on smaller screens.', max_length=50, null=True)),
+                ('disney_id', models.CharField(help_text="Unique identifier from Disney's API", max_length=150, unique=True)),
+                ('experience_type', models.CharField(choices=[('attraction', 'Attraction'), ('entertainment', 'Entertainment'), ('event', 'Event'), ('restaurant', 'Restaurant'), ('dining-event', 'Dining Event'), ('dinner-show', 'Dinner Show')], max_length=20)),
+                ('destination', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='destinations.destination')),
+                ('lands', models.ManyToManyField(blank=True, to='destinations.land')),
+                ('locations', models.ManyToManyField(blank=True, to='destinations.location')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
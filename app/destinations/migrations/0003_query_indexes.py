@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0002_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='experience',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['name', 'id'], name='experience_name_idx'),
+        ),
+    ]
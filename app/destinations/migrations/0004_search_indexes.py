@@ -0,0 +1,33 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:44
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0003_query_indexes'),
+    ]
+
+    operations = [
+        # gin_trgm_ops comes with pg_trgm
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='experience',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='experience_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='experience',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['short_name'], name='experience_short_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='land',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='land_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='location_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destinations', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='destination',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['date_updated'], name='destination_purge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='experience',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['date_updated'], name='experience_purge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='land',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['date_updated'], name='land_purge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['date_updated'], name='location_purge_idx'),
+        ),
+    ]
@@ -1,9 +1,35 @@
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db.models import F
 from django.core.exceptions import ValidationError
 
 from common import BaseModel
 
 
+class CatalogVersion(models.Model):
+    """
+    Single row counter bumped whenever a catalog row is saved or deleted.
+    Each worker compares it with the version of its in-process catalog cache.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    date_updated = models.DateTimeField(auto_now=True, editable=False)
+
+    ROW_ID = 1
+
+    @classmethod
+    def current(cls):
+        version = cls.objects.filter(pk=cls.ROW_ID).values_list('version', flat=True).first()
+        return version or 0
+
+    @classmethod
+    def bump(cls):
+        if cls.objects.filter(pk=cls.ROW_ID).update(version=F('version') + 1):
+            return
+        _, created = cls.objects.get_or_create(pk=cls.ROW_ID, defaults={'version': 1})
+        if not created:
+            cls.objects.filter(pk=cls.ROW_ID).update(version=F('version') + 1)
+
+
 class Destination(BaseModel):
     name = models.CharField(max_length=150, unique=True, blank=False)
     disney_id = models.CharField(
@@ -30,6 +56,13 @@ class Location(BaseModel):
     )
     destination = models.ForeignKey(Destination, blank=False, on_delete=models.CASCADE)
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            *BaseModel.Meta.indexes,
+            # Name search, see destinations.search
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='location_name_trgm_idx'),
+        ]
+
     def __str__(self):
         return "{}:{}".format(self.name, self.get_location_type_display())
 
@@ -39,6 +72,12 @@ class Land(BaseModel):
     disney_id = models.CharField(max_length=150, unique=True, help_text="Unique identifier from Disney's API")
     park = models.ForeignKey(Location, blank=False, on_delete=models.CASCADE)
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            *BaseModel.Meta.indexes,
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='land_name_trgm_idx'),
+        ]
+
     def clean(self):
         super().clean()
 
@@ -74,6 +113,16 @@ class Experience(BaseModel):
         blank=False,
     )
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            *BaseModel.Meta.indexes,
+            # Keyset pagination of experiences
+            models.Index(fields=['name', 'id'], name='experience_name_idx', condition=models.Q(is_deleted=False)),
+            # Name search, see destinations.search
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='experience_name_trgm_idx'),
+            GinIndex(fields=['short_name'], opclasses=['gin_trgm_ops'], name='experience_short_trgm_idx'),
+        ]
+
     def __str__(self):
         return "{}:{}".format(self.name, self.get_experience_type_display())
 
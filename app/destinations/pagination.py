@@ -0,0 +1,7 @@
+from common.pagination import KeysetPagination
+
+
+class ExperiencePagination(KeysetPagination):
+    ordering = ('name', 'id')
+    page_size = 100
+    max_page_size = 500
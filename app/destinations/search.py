@@ -0,0 +1,168 @@
+"""
+Search of the experiences, locations and lands of a destination by name.
+
+`search()` matches names in the database with trigram similarity, served by
+the GIN trigram indexes of the catalog tables, so misspelled and partial
+names are found. `PrefixIndex` answers autocomplete from memory: it is built
+with each catalog snapshot, so it is rebuilt whenever the catalog changes.
+"""
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Greatest
+
+from . import models
+
+SEARCH_LIMIT = 20
+
+# Kinds of results, in the order they are listed when they rank the same
+KINDS = ('experience', 'location', 'land')
+
+
+def normalize(text):
+    """
+    Lower cases `text` and drops accents and apostrophes, "Peter Pan’s" becomes "peter pans".
+    """
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"['’]", '', text).casefold()
+
+
+def tokenize(text):
+    return re.findall(r'\w+', normalize(text or ''))
+
+
+def experience_filter(destination_id, experience_type=None):
+    # An experience belongs to a destination directly or through one of its locations
+    located = models.Experience.locations.through.objects.filter(location__destination_id=destination_id)
+    condition = Q(destination_id=destination_id) | Q(pk__in=located.values('experience_id'))
+    if experience_type:
+        condition &= Q(experience_type=experience_type)
+    return condition
+
+
+def search(destination_id, query, experience_type=None, limit=SEARCH_LIMIT):
+    """
+    Returns the pks of the experiences, locations and lands of a destination matching `query`, best matches first.
+    Only experiences are searched when `experience_type` is given.
+    """
+    querysets = {
+        'experience': (models.Experience.objects.filter(experience_filter(destination_id, experience_type)),
+                       ['name', 'short_name']),
+    }
+    if not experience_type:
+        querysets['location'] = (models.Location.objects.filter(destination_id=destination_id), ['name'])
+        querysets['land'] = (models.Land.objects.filter(park__destination_id=destination_id), ['name'])
+
+    results = {}
+    for kind, (queryset, fields) in querysets.items():
+        condition = Q()
+        if connection.vendor == 'postgresql':
+            # word_similarity() scores the query against the best matching part of the name, so it finds
+            # substrings too. Unlike icontains' UPPER(name) LIKE, the GIN trigram indexes serve it.
+            for field in fields:
+                condition |= Q(**{f'{field}__trigram_word_similar': query})
+            similarities = [TrigramWordSimilarity(query, field) for field in fields]
+            rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+            queryset = queryset.filter(condition).annotate(rank=rank).order_by('-rank', 'name', 'id')
+        else:
+            # Trigram matching needs PostgreSQL, other databases only match substrings
+            for field in fields:
+                condition |= Q(**{f'{field}__icontains': query})
+            queryset = queryset.filter(condition).order_by('name', 'id')
+        results[kind] = list(queryset.values_list('pk', flat=True)[:limit])
+    return results
+
+
+Entry = namedtuple('Entry', ['kind', 'obj', 'names'])
+
+
+class PrefixIndex:
+    """
+    The words of the names in the catalog of each destination, sorted so the
+    words starting with a prefix are found with a binary search.
+
+    A query matches a name when each of its words starts a word of the name,
+    "thun mou" matches "Big Thunder Mountain Railroad". Names starting with
+    the query come first, then shorter names. Entries are numbered in that
+    order when the index is built, so ranking matches only compares numbers.
+    """
+
+    def __init__(self):
+        # destination id -> entries, and the sorted (word, entry number) pairs of their names
+        self.entries = {}
+        self.words = {}
+        self.word_entries = {}
+
+    @classmethod
+    def build(cls, snapshot):
+        entries = defaultdict(list)
+
+        def add(destination_id, kind, obj, *names):
+            names = [' '.join(tokenize(name)) for name in names if name]
+            entries[destination_id].append(Entry(kind, obj, names))
+
+        for location in snapshot.by_id[models.Location].values():
+            add(location.destination_id, 'location', location, location.name)
+        for land in snapshot.by_id[models.Land].values():
+            park = snapshot.by_id[models.Location].get(land.park_id)
+            if park is not None:
+                add(park.destination_id, 'land', land, land.name)
+        for experience in snapshot.by_id[models.Experience].values():
+            destination_ids = {location.destination_id for location in experience.locations.all()}
+            if experience.destination_id is not None:
+                destination_ids.add(experience.destination_id)
+            for destination_id in destination_ids:
+                add(destination_id, 'experience', experience, experience.name, experience.short_name)
+
+        index = cls()
+        for destination_id, destination_entries in entries.items():
+            destination_entries.sort(key=lambda entry: (
+                min(len(name) for name in entry.names), KINDS.index(entry.kind), entry.names[0], str(entry.obj.pk),
+            ))
+            pairs = sorted(
+                (word, number)
+                for number, entry in enumerate(destination_entries)
+                for word in {word for name in entry.names for word in name.split()}
+            )
+            index.entries[destination_id] = destination_entries
+            index.words[destination_id] = [word for word, _ in pairs]
+            index.word_entries[destination_id] = [number for _, number in pairs]
+        return index
+
+    def matching_entries(self, destination_id, prefix):
+        words = self.words[destination_id]
+        start = bisect_left(words, prefix)
+        # Words are sorted, so the ones starting with the prefix sort before prefix + the last code point
+        end = bisect_left(words, prefix + '\U0010ffff', start)
+        return set(self.word_entries[destination_id][start:end])
+
+    def search(self, destination_id, query, experience_type=None, limit=10):
+        tokens = tokenize(query)
+        if not tokens or destination_id not in self.entries:
+            return []
+
+        numbers = None
+        # The longest words match the fewest entries
+        for token in sorted(set(tokens), key=len, reverse=True):
+            matches = self.matching_entries(destination_id, token)
+            numbers = matches if numbers is None else numbers & matches
+            if not numbers:
+                return []
+
+        query = ' '.join(tokens)
+        entries = self.entries[destination_id]
+        ranked = []
+        for number in numbers:
+            entry = entries[number]
+            if experience_type and (entry.kind != 'experience' or entry.obj.experience_type != experience_type):
+                continue
+            starts = any(name.startswith(query) for name in entry.names)
+            ranked.append(number if starts else number + len(entries))
+        return [entries[rank % len(entries)] for rank in heapq.nsmallest(limit, ranked)]
@@ -1,9 +1,10 @@
 from rest_framework import serializers
 
+from common import DynamicFieldsMixin
 from . import models
 
 
-class DestinationSerializer(serializers.ModelSerializer):
+class DestinationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = models.Destination
         fields = [
@@ -13,7 +14,7 @@ class DestinationSerializer(serializers.ModelSerializer):
         ]
 
 
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = models.Location
         fields = [
@@ -25,7 +26,7 @@ class LocationSerializer(serializers.ModelSerializer):
         ]
 
 
-class LandSerializer(serializers.ModelSerializer):
+class LandSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = models.Land
         fields = [
@@ -43,11 +44,41 @@ class LandSerializer(serializers.ModelSerializer):
         return value
 
 
-class ExperienceSerializer(serializers.ModelSerializer):
-    # Be sure to comment this out if you are doing a data dump into the db
+class ExperienceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     lands = LandSerializer(many=True, read_only=True)  # This will serialize the related Land
     locations = LocationSerializer(many=True, read_only=True)  # This will serialize all related Locations
 
+    # Many to many relations the nested fields read, load them in bulk with setup_eager_loading
+    eager_relations = ('lands', 'locations')
+
     class Meta:
         model = models.Experience
         exclude = ['date_created', 'is_deleted', 'date_updated']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, prefix=''):
+        """
+        Prefetches the nested relations for a queryset of experiences, or of
+        objects pointing at an experience through `prefix`.
+        """
+        return queryset.prefetch_related(*(prefix + relation for relation in cls.eager_relations))
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the search and autocomplete endpoints.
+    """
+    q = serializers.CharField(max_length=100)
+    experience_type = serializers.ChoiceField(choices=models.Experience.ExperienceType.choices, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, required=False)
+
+
+class AutocompleteSerializer(serializers.Serializer):
+    """
+    A compact autocomplete suggestion, built from a search index entry.
+    """
+    type = serializers.CharField(source='kind')
+    id = serializers.UUIDField(source='obj.id')
+    name = serializers.CharField(source='obj.name')
+    short_name = serializers.CharField(source='obj.short_name', default=None)
+    experience_type = serializers.CharField(source='obj.experience_type', default=None)
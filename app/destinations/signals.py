@@ -0,0 +1,36 @@
+from django.core.signals import request_started
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from . import models
+from .cache import catalog, CATALOG_MODELS
+
+
+CATALOG_THROUGH_MODELS = (models.Experience.lands.through, models.Experience.locations.through)
+
+request_started.connect(catalog.request_started, dispatch_uid='catalog_cache_request_started')
+
+
+def bump_catalog_version():
+    # The bump is part of the writing transaction, so other workers only see the new
+    # version once the catalog change is committed. This worker drops its copy right away.
+    models.CatalogVersion.bump()
+    catalog.invalidate()
+
+
+def catalog_row_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+def catalog_relation_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version()
+
+
+# Connected per model: a post_delete receiver without a sender would stop Django from
+# fast deleting rows of every other model
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_row_changed, sender=model, dispatch_uid=f'catalog_saved_{model._meta.label_lower}')
+    post_delete.connect(catalog_row_changed, sender=model, dispatch_uid=f'catalog_deleted_{model._meta.label_lower}')
+for through in CATALOG_THROUGH_MODELS:
+    m2m_changed.connect(catalog_relation_changed, sender=through,
+                        dispatch_uid=f'catalog_relation_changed_{through._meta.label_lower}')
@@ -1,3 +1,347 @@
+import base64
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.deletion import Collector
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from custom_auth.models import User
+from trips.models import ItineraryItem
+from . import models
+from .cache import catalog
+from .pagination import ExperiencePagination
+
+
+class CatalogFixtureMixin:
+
+    def setUp(self):
+        catalog.invalidate()
+        self.user = User.objects.create_user(username='guest@example.com', email='guest@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.destination = models.Destination.objects.create(name='Walt Disney World', disney_id='wdw')
+        self.park = models.Location.objects.create(
+            name='Magic Kingdom',
+            disney_id='mk',
+            location_type=models.Location.LocationType.THEME_PARK,
+            destination=self.destination,
+        )
+        self.lands = [
+            models.Land.objects.create(name=f'Land {i}', disney_id=f'land-{i}', park=self.park) for i in range(3)
+        ]
+
+    def create_experiences(self, count):
+        for i in range(count):
+            experience = models.Experience.objects.create(
+                name=f'Experience {models.Experience.objects.count()}',
+                disney_id=f'experience-{models.Experience.objects.count()}',
+                destination=self.destination,
+                experience_type=models.Experience.ExperienceType.ATTRACTION,
+            )
+            experience.locations.add(self.park)
+            experience.lands.add(self.lands[i % len(self.lands)])
+
+
+class ExperienceQueryCountTests(CatalogFixtureMixin, TestCase):
+    """
+    Guards against the nested lands/locations of experiences being loaded one experience at a time.
+    """
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_experience_list_query_count_does_not_grow(self):
+        url = f'/destinations/locations/{self.park.id}/experiences/'
+
+        self.create_experiences(2)
+        few_queries, response = self.count_queries(url)
+        self.assertEqual(len(response.json()['results']), 2)
+
+        self.create_experiences(40)
+        many_queries, response = self.count_queries(url)
+        self.assertEqual(len(response.json()['results']), 42)
+        self.assertEqual(few_queries, many_queries)
+
+        for experience in response.json()['results']:
+            self.assertEqual(len(experience['lands']), 1)
+            self.assertEqual(experience['locations'][0]['id'], str(self.park.id))
+
+    def test_warm_experience_list_only_checks_catalog_version(self):
+        url = f'/destinations/locations/{self.park.id}/experiences/'
+        self.create_experiences(10)
+        self.count_queries(url)
+
+        queries, _ = self.count_queries(url)
+        self.assertEqual(queries, 1)
+
+
+class ExperiencePaginationTests(CatalogFixtureMixin, TestCase):
+    """
+    Experiences are served from the catalog cache, so they are paginated in memory with the same cursors.
+    """
+
+    def get_pages(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            url = response.json()['next']
+        return pages
+
+    def test_pages_follow_the_name_order(self):
+        self.create_experiences(5)
+        pages = self.get_pages(f'/destinations/locations/{self.park.id}/experiences/?page_size=2')
+
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+        self.assertEqual(
+            [experience['name'] for page in pages for experience in page['results']],
+            sorted(models.Experience.objects.values_list('name', flat=True)),
+        )
+        self.assertIsNone(pages[0]['previous'])
+        self.assertEqual(self.client.get(pages[2]['previous']).json()['results'], pages[1]['results'])
+
+    def test_pages_bisect_the_cached_lists(self):
+        self.create_experiences(5)
+        catalog.get_snapshot()
+        with mock.patch.object(ExperiencePagination, 'sort_rows') as sort_rows:
+            for url in ('/destinations/experiences/?page_size=2',
+                        f'/destinations/locations/{self.park.id}/experiences/?page_size=2'):
+                pages = self.get_pages(url)
+                self.assertEqual(sum(len(page['results']) for page in pages), 5)
+        sort_rows.assert_not_called()
+
+    def test_invalid_cursors_are_not_found(self):
+        self.create_experiences(3)
+        url = f'/destinations/locations/{self.park.id}/experiences/'
+        for cursor in ({'k': [1, 2]}, {'k': ['Experience 1']}, {'k': None}, 'not a cursor'):
+            with self.subTest(cursor=cursor):
+                encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+                self.assertEqual(self.client.get(url, {'cursor': encoded}).status_code, 404)
+
+
+class ExperienceShapingTests(CatalogFixtureMixin, TestCase):
+    """
+    ?fields= trims the experiences, ?expand= chooses which of their lands and locations are embedded rather than
+    given as ids.
+    """
+
+    def get_experience(self, query):
+        self.create_experiences(1)
+        response = self.client.get(f'/destinations/locations/{self.park.id}/experiences/?{query}')
+        self.assertEqual(response.status_code, 200)
+        [experience] = response.json()['results']
+        return experience
+
+    def test_fields(self):
+        experience = self.get_experience('fields=id,name,lands')
+        self.assertEqual(set(experience), {'id', 'name', 'lands'})
+        # ?fields= isn't applied to the nested objects
+        self.assertEqual(experience['lands'][0]['name'], 'Land 0')
+
+    def test_expand(self):
+        experience = self.get_experience('expand=')
+        self.assertIn('experience_type', experience)
+        self.assertEqual(experience['lands'], [str(self.lands[0].id)])
+        self.assertEqual(experience['locations'], [str(self.park.id)])
+
+    def test_expand_some(self):
+        experience = self.get_experience('expand=lands')
+        self.assertEqual(experience['lands'][0]['id'], str(self.lands[0].id))
+        self.assertEqual(experience['locations'], [str(self.park.id)])
+
+
+class CatalogSignalTests(TestCase):
+
+    def test_catalog_changes_bump_the_version(self):
+        version = models.CatalogVersion.current()
+        destination = models.Destination.objects.create(name='Disneyland Resort', disney_id='dlr')
+        location = models.Location.objects.create(name='Disneyland Park', disney_id='dl', destination=destination)
+        experience = models.Experience.objects.create(name='Matterhorn', disney_id='matterhorn', destination=destination)
+        experience.locations.add(location)
+        self.assertEqual(models.CatalogVersion.current(), version + 4)
+
+    def test_other_models_are_fast_deleted(self):
+        collector = Collector(using='default')
+        self.assertTrue(collector.can_fast_delete(ItineraryItem.objects.all()))
+        self.assertFalse(collector.can_fast_delete(models.Experience.objects.all()))
+
+
+class IngestCatalogTests(TestCase):
+    records = [
+        {'type': 'destination', 'disney_id': 'wdw', 'name': 'Walt Disney World'},
+        {'type': 'location', 'disney_id': 'mk', 'name': 'Magic Kingdom', 'location_type': 'theme-park',
+         'destination': 'wdw'},
+        {'type': 'land', 'disney_id': 'adventureland', 'name': 'Adventureland', 'park': 'mk'},
+        {'type': 'land', 'disney_id': 'frontierland', 'name': 'Frontierland', 'park': 'mk'},
+        {'type': 'experience', 'disney_id': 'pirates', 'name': 'Pirates of the Caribbean', 'short_name': 'Pirates',
+         'experience_type': 'attraction', 'destination': 'wdw', 'lands': ['adventureland'], 'locations': ['mk']},
+        {'type': 'experience', 'disney_id': 'btmrr', 'name': 'Big Thunder Mountain Railroad',
+         'experience_type': 'attraction', 'lands': ['frontierland'], 'locations': ['mk']},
+    ]
+
+    def ingest(self, records, extension='ndjson', stderr=None, **options):
+        with tempfile.NamedTemporaryFile('w', suffix=f'.{extension}', delete=False) as dump:
+            if extension == 'json':
+                json.dump(records, dump)
+            else:
+                dump.write(''.join(json.dumps(record) + '\n' for record in records))
+        self.addCleanup(os.remove, dump.name)
+        stdout = StringIO()
+        call_command('ingest_catalog', dump.name, stdout=stdout, stderr=stderr or StringIO(), **options)
+        return stdout.getvalue()
+
+    def test_ingest_creates_catalog_and_rerun_is_a_no_op(self):
+        self.ingest(self.records, batch_size=1)
+
+        pirates = models.Experience.objects.get(disney_id='pirates')
+        self.assertEqual(pirates.short_name, 'Pirates')
+        self.assertEqual(pirates.destination.disney_id, 'wdw')
+        self.assertEqual([land.disney_id for land in pirates.lands.all()], ['adventureland'])
+        self.assertEqual([location.disney_id for location in pirates.locations.all()], ['mk'])
+        self.assertEqual(models.Land.objects.get(disney_id='frontierland').park.disney_id, 'mk')
+        version = models.CatalogVersion.current()
+        self.assertEqual(version, 1)
+
+        with CaptureQueriesContext(connection) as context:
+            output = self.ingest(self.records, extension='json')
+        self.assertIn('experience: 2 read, 0 created, 0 updated, 2 unchanged', output)
+        self.assertIn('Catalog unchanged.', output)
+        self.assertEqual(models.CatalogVersion.current(), version)
+        self.assertFalse([query for query in context.captured_queries if 'INSERT' in query['sql']])
+
+    def test_ingest_updates_changed_rows_and_relations(self):
+        self.ingest(self.records)
+        models.Experience.objects.get(disney_id='btmrr').delete()
+        version = models.CatalogVersion.current()
+
+        records = [dict(record) for record in self.records]
+        records[4].update(name='Pirates of the Caribbean (Refurbished)', lands=['frontierland'])
+        records.append({'type': 'land', 'disney_id': 'atlantis', 'name': 'Atlantis', 'park': 'unknown'})
+        output = self.ingest(records)
+
+        self.assertIn('experience: 2 read, 0 created, 2 updated, 0 unchanged', output)
+        self.assertIn('1 skipped', output)
+        pirates = models.Experience.objects.get(disney_id='pirates')
+        self.assertEqual(pirates.name, 'Pirates of the Caribbean (Refurbished)')
+        self.assertEqual([land.disney_id for land in pirates.lands.all()], ['frontierland'])
+        # The soft deleted experience is restored by the dump
+        self.assertTrue(models.Experience.objects.filter(disney_id='btmrr').exists())
+        self.assertFalse(models.Land.objects.filter(disney_id='atlantis').exists())
+        self.assertEqual(models.CatalogVersion.current(), version + 1)
+
+    def test_ingest_skips_records_whose_name_is_taken(self):
+        self.ingest(self.records)
+
+        records = [
+            # Taken by an existing row, and by an earlier record of the dump
+            {'type': 'location', 'disney_id': 'mk-2', 'name': 'Magic Kingdom', 'location_type': 'theme-park',
+             'destination': 'wdw'},
+            {'type': 'location', 'disney_id': 'epcot', 'name': 'EPCOT', 'location_type': 'theme-park',
+             'destination': 'wdw'},
+            {'type': 'location', 'disney_id': 'epcot-2', 'name': 'EPCOT', 'location_type': 'theme-park',
+             'destination': 'wdw'},
+            {'type': 'destination', 'disney_id': 'wdw-2', 'name': 'Walt Disney World'},
+            {'type': 'land', 'disney_id': 'frontierland-2', 'name': 'Frontierland', 'park': 'mk'},
+        ]
+        stderr = StringIO()
+        output = self.ingest(records, stderr=stderr)
+
+        self.assertIn('location: 3 read, 1 created, 0 updated, 0 unchanged, 2 skipped.', output)
+        self.assertIn('destination: 1 read, 0 created, 0 updated, 0 unchanged, 1 skipped.', output)
+        self.assertIn("Skipped location mk-2: name 'Magic Kingdom' is already used by location mk.", stderr.getvalue())
+        self.assertIn("Skipped location epcot-2: name 'EPCOT' is already used by location epcot.", stderr.getvalue())
+        self.assertEqual(
+            sorted(models.Location.objects.values_list('disney_id', flat=True)), ['epcot', 'mk'],
+        )
+        # Names of lands aren't unique
+        self.assertTrue(models.Land.objects.filter(disney_id='frontierland-2').exists())
+
+
+class CatalogSearchTests(TestCase):
+    def setUp(self):
+        catalog.invalidate()
+        self.user = User.objects.create_user(username='guest@example.com', email='guest@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.destination = models.Destination.objects.create(name='Walt Disney World', disney_id='wdw')
+        other = models.Destination.objects.create(name='Disneyland Resort', disney_id='dlr')
+        self.park = models.Location.objects.create(
+            name='Magic Kingdom', disney_id='mk', location_type=models.Location.LocationType.THEME_PARK,
+            destination=self.destination,
+        )
+        self.land = models.Land.objects.create(name='Frontierland', disney_id='frontierland', park=self.park)
+        self.thunder = self.create_experience('Big Thunder Mountain Railroad', 'btmrr', location=self.park)
+        self.create_experience('Peter Pan’s Flight', 'peter-pan', location=self.park)
+        self.create_experience(
+            "Be Our Guest Restaurant", 'be-our-guest', location=self.park,
+            experience_type=models.Experience.ExperienceType.RESTAURANT,
+        )
+        self.create_experience('Big Thunder Ranch', 'big-thunder-ranch', destination=other)
+
+    def create_experience(self, name, disney_id, location=None, destination=None,
+                          experience_type=models.Experience.ExperienceType.ATTRACTION):
+        experience = models.Experience.objects.create(
+            name=name, disney_id=disney_id, destination=destination, experience_type=experience_type,
+        )
+        if location is not None:
+            experience.locations.add(location)
+        return experience
+
+    def autocomplete(self, query, **params):
+        response = self.client.get(
+            f'/destinations/destinations/{self.destination.id}/autocomplete/', {'q': query, **params},
+        )
+        self.assertEqual(response.status_code, 200)
+        return [result['name'] for result in response.json()]
+
+    def test_autocomplete_matches_word_prefixes_within_the_destination(self):
+        self.assertEqual(self.autocomplete('thun mou'), ['Big Thunder Mountain Railroad'])
+        self.assertEqual(self.autocomplete('big'), ['Big Thunder Mountain Railroad'])
+        self.assertEqual(self.autocomplete('PETER PANS'), ['Peter Pan’s Flight'])
+        self.assertEqual(self.autocomplete('front'), ['Frontierland'])
+        self.assertEqual(self.autocomplete('magic'), ['Magic Kingdom'])
+        self.assertEqual(self.autocomplete('r', experience_type='restaurant'), ['Be Our Guest Restaurant'])
+        # Names starting with the query come first
+        self.assertEqual(self.autocomplete('f'), ['Frontierland', 'Peter Pan’s Flight'])
+        self.assertEqual(self.autocomplete('f', limit=1), ['Frontierland'])
+
+        response = self.client.get(f'/destinations/destinations/{self.destination.id}/autocomplete/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_autocomplete_is_served_from_memory_and_follows_catalog_changes(self):
+        self.autocomplete('space')
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.autocomplete('big'), ['Big Thunder Mountain Railroad'])
+        self.assertEqual(len(context.captured_queries), 1)
+
+        self.create_experience('Space Mountain', 'space-mountain', location=self.park)
+        self.assertEqual(self.autocomplete('space'), ['Space Mountain'])
+
+    def test_search(self):
+        response = self.client.get(f'/destinations/destinations/{self.destination.id}/search/', {'q': 'thunder'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([experience['id'] for experience in results['experiences']], [str(self.thunder.id)])
+        self.assertEqual(results['experiences'][0]['lands'], [])
+        self.assertEqual(results['locations'], [])
+
+        response = self.client.get(
+            f'/destinations/destinations/{self.destination.id}/search/', {'q': 'land', 'experience_type': 'attraction'},
+        )
+        self.assertEqual(response.json(), {'experiences': [], 'locations': [], 'lands': []})
 
-# Create your tests here.
+        response = self.client.get(f'/destinations/destinations/{self.park.id}/search/', {'q': 'thunder'})
+        self.assertEqual(response.status_code, 404)
@@ -1,20 +1,29 @@
 from django.urls import path
+
+from common.async_views import read_view
 from . import views
 
+
+def catalog_view(view_class, action):
+    return read_view(view_class.as_view(), view_class.as_async_view(action))
+
+
 urlpatterns = [
-    path('destinations/', views.DestinationListView.as_view(), name='destination-list'),
-    path('destinations/<uuid:dest_id>/', views.DestinationDetailView.as_view(), name='destination-detail'),
+    path('destinations/', catalog_view(views.DestinationListView, 'list'), name='destination-list'),
+    path('destinations/<uuid:dest_id>/', catalog_view(views.DestinationDetailView, 'retrieve'), name='destination-detail'),
+    path('destinations/<uuid:dest_id>/search/', views.CatalogSearchView.as_view(), name='catalog-search'),
+    path('destinations/<uuid:dest_id>/autocomplete/', catalog_view(views.CatalogAutocompleteView, 'list'), name='catalog-autocomplete'),
 
     # For locations, lands and experiences, the URLs are nested under the associated destination
-    path('destinations/<uuid:dest_id>/locations/', views.LocationListView.as_view(), name='location-list'),
-    path('destinations/<uuid:dest_id>/locations/<uuid:loc_id>/', views.LocationDetailView.as_view(), name='location-detail'),
+    path('destinations/<uuid:dest_id>/locations/', catalog_view(views.LocationListView, 'list'), name='location-list'),
+    path('destinations/<uuid:dest_id>/locations/<uuid:loc_id>/', catalog_view(views.LocationDetailView, 'retrieve'), name='location-detail'),
 
     # For lands, the URLs are nested under the associated location
-    path('locations/<uuid:loc_id>/lands/', views.LandListView.as_view(), name='land-list'),
-    path('locations/<uuid:loc_id>/lands/<uuid:land_id>/', views.LandDetailView.as_view(), name='land-detail'),
+    path('locations/<uuid:loc_id>/lands/', catalog_view(views.LandListView, 'list'), name='land-list'),
+    path('locations/<uuid:loc_id>/lands/<uuid:land_id>/', catalog_view(views.LandDetailView, 'retrieve'), name='land-detail'),
 
     # For experiences, the URLs are nested under the associated location
-    path('experiences/', views.ExperienceListView.as_view(), name='experience-create'),
-    path('locations/<uuid:loc_id>/experiences/', views.ExperienceListView.as_view(), name='experience-list'),
-    path('locations/<uuid:loc_id>/experiences/<uuid:exp_id>/', views.ExperienceDetailView.as_view(), name='experience-detail'),
+    path('experiences/', catalog_view(views.ExperienceListView, 'list'), name='experience-create'),
+    path('locations/<uuid:loc_id>/experiences/', catalog_view(views.ExperienceListView, 'list'), name='experience-list'),
+    path('locations/<uuid:loc_id>/experiences/<uuid:exp_id>/', catalog_view(views.ExperienceDetailView, 'retrieve'), name='experience-detail'),
 ]
@@ -1,13 +1,34 @@
 from rest_framework import permissions
 from rest_framework import generics
-from . import models, serializers
+from rest_framework.response import Response
+from django.http import Http404
+from . import models, search, serializers
+from .cache import catalog
+from .pagination import ExperiencePagination
 from common import IsStaffOrSuperuser
+from common.async_views import AsyncReadMixin
 
 
-class DestinationListView(generics.ListCreateAPIView):
-    queryset = models.Destination.objects.all()
+class CatalogReadMixin(AsyncReadMixin):
+    """
+    Async reads of the catalog views. Once the catalog version is checked the whole response is built from memory.
+    """
+
+    async def async_list(self, request, *args, **kwargs):
+        await catalog.aget_snapshot()
+        return self.list(request, *args, **kwargs)
+
+    async def async_retrieve(self, request, *args, **kwargs):
+        await catalog.aget_snapshot()
+        return self.retrieve(request, *args, **kwargs)
+
+
+class DestinationListView(CatalogReadMixin, generics.ListCreateAPIView):
     serializer_class = serializers.DestinationSerializer
 
+    def get_queryset(self):
+        return catalog.all(models.Destination)
+
     def get_permissions(self):
         """
         Instantiates and returns the list of permissions that this view requires.
@@ -17,18 +38,22 @@ class DestinationListView(generics.ListCreateAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class DestinationDetailView(generics.RetrieveAPIView):
-    queryset = models.Destination.objects.all()
+class DestinationDetailView(CatalogReadMixin, generics.RetrieveAPIView):
     serializer_class = serializers.DestinationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_object(self):
+        destination = catalog.get(models.Destination, self.kwargs['dest_id'])
+        if destination is None:
+            raise Http404
+        return destination
+
 
-class LocationListView(generics.ListCreateAPIView):
+class LocationListView(CatalogReadMixin, generics.ListCreateAPIView):
     serializer_class = serializers.LocationSerializer
 
     def get_queryset(self):
-        dest_id = self.kwargs['dest_id']
-        return models.Location.objects.filter(destination__id=dest_id)
+        return catalog.locations_for_destination(self.kwargs['dest_id'])
 
     def get_permissions(self):
         """
@@ -39,21 +64,23 @@ class LocationListView(generics.ListCreateAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class LocationDetailView(generics.RetrieveAPIView):
+class LocationDetailView(CatalogReadMixin, generics.RetrieveAPIView):
     serializer_class = serializers.LocationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        return models.Location.objects.filter(id=self.kwargs['pk'], destination__id=self.kwargs['dest_id'])
+    def get_object(self):
+        location = catalog.get(models.Location, self.kwargs['loc_id'])
+        if location is None or location.destination_id != self.kwargs['dest_id']:
+            raise Http404
+        return location
 
 
-class LandListView(generics.ListCreateAPIView):
+class LandListView(CatalogReadMixin, generics.ListCreateAPIView):
     serializer_class = serializers.LandSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        loc_id = self.kwargs['loc_id']
-        return models.Land.objects.filter(park__id=loc_id)
+        return catalog.lands_for_park(self.kwargs['loc_id'])
 
     def get_permissions(self):
         """
@@ -64,20 +91,24 @@ class LandListView(generics.ListCreateAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class LandDetailView(generics.RetrieveAPIView):
+class LandDetailView(CatalogReadMixin, generics.RetrieveAPIView):
     serializer_class = serializers.LandSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        return models.Land.objects.filter(id=self.kwargs['pk'], location__id=self.kwargs['loc_id'])
+    def get_object(self):
+        land = catalog.get(models.Land, self.kwargs['land_id'])
+        if land is None or land.park_id != self.kwargs['loc_id']:
+            raise Http404
+        return land
 
 
-class ExperienceListView(generics.ListCreateAPIView):
+class ExperienceListView(CatalogReadMixin, generics.ListCreateAPIView):
     serializer_class = serializers.ExperienceSerializer
+    pagination_class = ExperiencePagination
 
     def get_queryset(self):
-        loc_id = self.kwargs['loc_id']
-        return models.Experience.objects.filter(locations__id=loc_id)
+        # Shared with the other requests, ExperiencePagination only bisects it
+        return catalog.experiences_for_location(self.kwargs.get('loc_id'))
 
     def get_permissions(self):
         """
@@ -88,9 +119,62 @@ class ExperienceListView(generics.ListCreateAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class ExperienceDetailView(generics.RetrieveAPIView):
+class ExperienceDetailView(CatalogReadMixin, generics.RetrieveAPIView):
     serializer_class = serializers.ExperienceSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        return models.Experience.objects.filter(id=self.kwargs['pk'], location__id=self.kwargs['loc_id'])
+    def get_object(self):
+        experience = catalog.get(models.Experience, self.kwargs['exp_id'])
+        if experience is None or self.kwargs['loc_id'] not in {location.pk for location in experience.locations.all()}:
+            raise Http404
+        return experience
+
+
+class CatalogSearchMixin:
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_search_params(self):
+        if catalog.get(models.Destination, self.kwargs['dest_id']) is None:
+            raise Http404
+        params = serializers.SearchQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+
+class CatalogSearchView(CatalogSearchMixin, generics.GenericAPIView):
+    """
+    Experiences, locations and lands of a destination whose names match `q`, best matches first.
+    """
+
+    def get(self, request, *args, **kwargs):
+        params = self.get_search_params()
+        results = search.search(
+            self.kwargs['dest_id'], params['q'], params.get('experience_type'), params.get('limit', search.SEARCH_LIMIT),
+        )
+        # The database ranks the matches, the rows themselves come from the catalog cache
+        data = {}
+        for kind, model, serializer_class in (
+            ('experience', models.Experience, serializers.ExperienceSerializer),
+            ('location', models.Location, serializers.LocationSerializer),
+            ('land', models.Land, serializers.LandSerializer),
+        ):
+            rows = [row for row in (catalog.get(model, pk) for pk in results.get(kind, [])) if row is not None]
+            data[f'{kind}s'] = serializer_class(rows, many=True, context=self.get_serializer_context()).data
+        return Response(data)
+
+
+class CatalogAutocompleteView(CatalogSearchMixin, CatalogReadMixin, generics.GenericAPIView):
+    """
+    Name suggestions for a destination, served from the in-memory prefix index of the catalog.
+    """
+    serializer_class = serializers.AutocompleteSerializer
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        params = self.get_search_params()
+        entries = catalog.autocomplete(
+            self.kwargs['dest_id'], params['q'], params.get('experience_type'), params.get('limit', 10),
+        )
+        return Response(self.get_serializer(entries, many=True).data)
@@ -0,0 +1,257 @@
+"""
+Registry of the activity types an itinerary item can point to.
+
+Each type maps the name used by the API (the content type's model name) to its
+model, serializer and the handlers that create and update its activities, so
+dispatching on the type of an item is a dictionary lookup. The types are
+registered when the app is ready, their content types are loaded together the
+first time one is needed and kept for the life of the process.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Model
+from django.utils.functional import cached_property
+from rest_framework import serializers
+
+from destinations import models as dest_models
+from destinations.cache import catalog
+from . import models
+
+
+def assign_fields(instance, data):
+    """
+    Sets validated data on a model instance, accepting raw ids for foreign keys.
+    Returns the names of the concrete fields that were set, for bulk_update().
+    """
+    fields_by_name = {}
+    for field in instance._meta.concrete_fields:
+        fields_by_name[field.name] = field
+        fields_by_name[field.attname] = field
+
+    assigned = set()
+    for name, value in data.items():
+        field = fields_by_name.get(name)
+        if field is None or field.primary_key:
+            continue
+        if field.is_relation and not isinstance(value, Model):
+            setattr(instance, field.attname, value)
+        else:
+            setattr(instance, field.name, value)
+        assigned.add(field.name)
+    return assigned
+
+
+class ActivityType:
+    """
+    One kind of activity. `build` returns the activity for a new itinerary
+    item from the item's `activity` data and its validated data, and
+    `summarize` a one line description of an activity, used by the exports.
+    Activities of read only types are looked up rather than created and are never updated.
+    """
+
+    def __init__(self, name, model, serializer_class, build, summarize=str, read_only=False):
+        self.name = name
+        self.model = model
+        self.serializer_class = serializer_class
+        self.build = build
+        self.summarize = summarize
+        self.read_only = read_only
+
+    def __repr__(self):
+        return f'<ActivityType: {self.name}>'
+
+    @property
+    def content_type(self):
+        return registry.get_content_type(self)
+
+    def bulk_create(self, activities):
+        if self.read_only:
+            return []
+        return self.model.objects.bulk_create(activities)
+
+    @cached_property
+    def foreign_key_names(self):
+        """
+        Maps the column names of foreign keys the serializer only knows by name, e.g. a note's location_id,
+        so they can be given as on create.
+        """
+        serializer_fields = self.serializer_class().fields
+        return {
+            field.attname: field.name for field in self.model._meta.concrete_fields
+            if field.is_relation and field.attname not in serializer_fields
+        }
+
+    def validate(self, data):
+        """
+        Validates the `activity` data of an item update with this type's serializer and returns the validated data.
+        Unlike the serializer, unknown fields and ids of catalog rows that don't exist are rejected too.
+        """
+        if isinstance(data, dict):
+            data = {self.foreign_key_names.get(name, name): value for name, value in data.items()}
+        serializer = self.serializer_class(data=data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        errors = {name: ['Unknown field.'] for name in data if name not in serializer.fields}
+        validated_data = dict(serializer.validated_data)
+        for field in self.model._meta.concrete_fields:
+            value = validated_data.get(field.attname)
+            if field.is_relation and value is not None and catalog.get(field.related_model, value) is None:
+                errors[field.attname] = [f'Invalid pk "{value}" - object does not exist.']
+        if errors:
+            raise serializers.ValidationError(errors)
+        return validated_data
+
+    def update(self, activity_id, data):
+        if self.read_only or not data:
+            return
+        self.model.objects.filter(id=activity_id).update(**data)
+
+    def bulk_update(self, changes):
+        """
+        Applies `changes`, a dict of activity id to validated data, with one query to load the activities and one update.
+        """
+        if self.read_only or not changes:
+            return
+        activities = list(self.model.objects.filter(id__in=changes))
+        fields = set()
+        for activity in activities:
+            fields.update(assign_fields(activity, changes[activity.id]))
+        if activities and fields:
+            self.model.objects.bulk_update(activities, list(fields))
+
+
+class ActivityRegistry:
+
+    def __init__(self):
+        self._by_name = {}
+        self._by_model = {}
+        self._content_types = None
+        self._by_content_type_id = None
+
+    def register(self, activity_type):
+        self._by_name[activity_type.name] = activity_type
+        self._by_model[activity_type.model] = activity_type
+        self._content_types = None
+        self._by_content_type_id = None
+
+    def __iter__(self):
+        return iter(self._by_name.values())
+
+    def get(self, name):
+        if not isinstance(name, str):
+            return None
+        return self._by_name.get(name.lower())
+
+    def for_model(self, model):
+        return self._by_model.get(model)
+
+    def load_content_types(self):
+        """
+        Resolves the content types of every registered type, with at most one query.
+        """
+        if self._content_types is None:
+            by_model = ContentType.objects.get_for_models(*self._by_model)
+            self._content_types = {self._by_model[model]: content_type for model, content_type in by_model.items()}
+            self._by_content_type_id = {
+                content_type.id: activity_type for activity_type, content_type in self._content_types.items()
+            }
+        return self._content_types
+
+    def clear_cache(self, **kwargs):
+        # Content types are recreated with new ids when the database is flushed, e.g. between TransactionTestCases
+        self._content_types = None
+        self._by_content_type_id = None
+
+    def get_content_type(self, activity_type):
+        return self.load_content_types()[activity_type]
+
+    def for_content_type_id(self, content_type_id):
+        self.load_content_types()
+        return self._by_content_type_id.get(content_type_id)
+
+
+registry = ActivityRegistry()
+
+
+def get_location(location_id, message):
+    location = catalog.get(dest_models.Location, location_id)
+    if location is None:
+        raise serializers.ValidationError(message)
+    return location
+
+
+def build_experience(activity, validated_data):
+    experience = catalog.get(dest_models.Experience, validated_data.get('activity_id'))
+    if experience is None:
+        raise serializers.ValidationError("Invalid experience_id provided.")
+    return experience
+
+
+def build_break(activity, validated_data):
+    return models.Break(location=get_location(activity['location'], "Location does not exist."))
+
+
+def build_meal(activity, validated_data):
+    return models.Meal(**activity)
+
+
+def build_note(activity, validated_data):
+    return models.Note(**activity)
+
+
+def build_travel_event(activity, validated_data):
+    activity = dict(activity)
+    from_location_instance = None
+    to_location_instance = None
+
+    # Check if from_location_id and to_location_id are provided, and if so, fetch them.
+    if activity.get('from_location_id'):
+        from_location_instance = get_location(activity.pop('from_location_id'), "From location does not exist.")
+        activity['from_location'] = from_location_instance
+
+    if activity.get('to_location_id'):
+        to_location_instance = get_location(activity.pop('to_location_id'), "To location does not exist.")
+        activity['to_location'] = to_location_instance
+
+    # If neither location ID nor custom location is provided, raise an error.
+    if not from_location_instance and not activity.get('custom_from_location'):
+        raise serializers.ValidationError("Either from_location_id or custom_from_location must be provided.")
+
+    if not to_location_instance and not activity.get('custom_to_location'):
+        raise serializers.ValidationError("Either to_location_id or custom_to_location must be provided.")
+
+    return models.TravelEvent(**activity)
+
+
+def summarize_experience(activity):
+    return activity.name
+
+
+def summarize_break(activity):
+    return f"Break at {activity.location.name}"
+
+
+def summarize_meal(activity):
+    return f"{activity.get_meal_type_display()} at {activity.meal_experience.name}"
+
+
+def summarize_travel_event(activity):
+    origin = activity.from_location.name if activity.from_location else activity.custom_from_location
+    destination = activity.to_location.name if activity.to_location else activity.custom_to_location
+    return f"{activity.get_travel_type_display()}: {origin} to {destination}"
+
+
+def summarize_note(activity):
+    return activity.note or ''
+
+
+def register_default_types():
+    from destinations.serializers import ExperienceSerializer
+    from .serializers import BreakSerializer, MealSerializer, NoteSerializer, TravelEventSerializer
+
+    # Experiences come from the destination catalog and are immutable
+    registry.register(ActivityType('experience', dest_models.Experience, ExperienceSerializer, build_experience,
+                                   summarize_experience, read_only=True))
+    registry.register(ActivityType('break', models.Break, BreakSerializer, build_break, summarize_break))
+    registry.register(ActivityType('travelevent', models.TravelEvent, TravelEventSerializer, build_travel_event,
+                                   summarize_travel_event))
+    registry.register(ActivityType('meal', models.Meal, MealSerializer, build_meal, summarize_meal))
+    registry.register(ActivityType('note', models.Note, NoteSerializer, build_note, summarize_note))
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TripsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trips'
+
+    def ready(self):
+        from . import activities
+        activities.register_default_types()
+        post_migrate.connect(activities.registry.clear_cache, dispatch_uid='activity_registry_clear_cache')
@@ -0,0 +1,107 @@
+"""
+Ownership checks for trips, itinerary items and their activities.
+
+A set of ids is checked with one query that reads the owner of every row, and
+objects fetched for a request are kept on the request, so the permission
+check and the handler of a view share a single lookup.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import NotFound, PermissionDenied
+
+from . import models
+
+
+def is_privileged(user):
+    return user.is_staff or user.is_superuser
+
+
+def owner_lookup(model):
+    """
+    Returns the lookup from `model` to the user owning a row.
+    """
+    if model is models.Trip:
+        return 'created_by'
+    if model is models.ItineraryItem:
+        return 'trip__created_by'
+    # Activities are owned through the itinerary item pointing to them
+    return 'itinerary_items__trip__created_by'
+
+
+def owned_by(queryset, user):
+    """
+    Limits a queryset to the rows the user may access, staff may access every row.
+    """
+    if is_privileged(user):
+        return queryset
+    return queryset.filter(**{owner_lookup(queryset.model): user.pk})
+
+
+def authorize_ids(request, model, ids):
+    """
+    Proves with one query that every id of `ids` exists and may be accessed by the user.
+    Raises NotFound if one of them doesn't exist and PermissionDenied if one belongs to someone else.
+    """
+    try:
+        ids = {model._meta.pk.to_python(pk) for pk in ids}
+    except DjangoValidationError:
+        raise NotFound("One or more ids are invalid.")
+
+    queryset = model.objects.filter(pk__in=ids)
+    if is_privileged(request.user):
+        owners = {pk: None for pk in queryset.values_list('pk', flat=True)}
+    else:
+        owners = defaultdict(set)
+        for pk, owner_id in queryset.values_list('pk', owner_lookup(model)):
+            owners[pk].add(owner_id)
+
+    if len(owners) != len(ids):
+        raise NotFound(f"One or more {model._meta.verbose_name_plural} were not found.")
+    if not is_privileged(request.user) and any(request.user.pk not in owner_ids for owner_ids in owners.values()):
+        raise PermissionDenied()
+    return ids
+
+
+def get_object(request, queryset, pk):
+    """
+    Returns the object `pk` of a queryset limited to the user's rows, fetched once per request.
+    """
+    objects = request.__dict__.setdefault('_authorized_objects', {})
+    key = (queryset.model, str(pk))
+    if key not in objects:
+        objects[key] = get_object_or_404(owned_by(queryset, request.user), pk=pk)
+    return objects[key]
+
+
+async def aget_object(request, queryset, pk):
+    objects = request.__dict__.setdefault('_authorized_objects', {})
+    key = (queryset.model, str(pk))
+    if key not in objects:
+        obj = await owned_by(queryset, request.user).filter(pk=pk).afirst()
+        if obj is None:
+            raise Http404
+        objects[key] = obj
+    return objects[key]
+
+
+class OwnedObjectMixin:
+    """
+    View mixin fetching the object of a detail route once per request, limited to the user's rows.
+    """
+
+    def get_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = get_object(self.request, queryset, self.kwargs[lookup_url_kwarg])
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = await aget_object(self.request, queryset, self.kwargs[lookup_url_kwarg])
+        self.check_object_permissions(self.request, obj)
+        return obj
@@ -0,0 +1,129 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+
+from destinations.cache import catalog
+from . import models
+
+
+def make_trip_etag(trip_id, versions, catalog_version, user, path='', media_type=''):
+    """
+    Builds a strong ETag for a trip representation from the trip id, the
+    timestamps that change with its content, the version of the catalog data
+    it embeds, the requesting user, the request path and the negotiated media type.
+    """
+    parts = [str(trip_id), str(user.pk)] + [version.isoformat() for version in versions]
+    parts += [str(catalog_version), path, media_type]
+    return hashlib.sha1(':'.join(parts).encode()).hexdigest()
+
+
+def negotiated_media_type(request):
+    # Set by DRF's content negotiation, JSON and MessagePack representations of a URL get different ETags
+    return getattr(request, 'accepted_media_type', None) or ''
+
+
+def trip_versions(trip_id, user, include_staff=True):
+    trips = models.Trip.objects.filter(pk=trip_id)
+    if not (include_staff and (user.is_staff or user.is_superuser)):
+        trips = trips.filter(created_by=user.pk)
+    return trips.values_list('last_content_update', 'date_updated')
+
+
+def get_trip_versions(trip_id, user, include_staff=True):
+    """
+    Returns the content timestamps of a trip visible to the user with a single
+    indexed lookup, or None if the user can't see the trip.
+    """
+    return trip_versions(trip_id, user, include_staff).first()
+
+
+async def aget_trip_versions(trip_id, user, include_staff=True):
+    return await trip_versions(trip_id, user, include_staff).afirst()
+
+
+def trip_etag(request, *args, **kwargs):
+    versions = get_trip_versions(kwargs.get('pk'), request.user)
+    if versions is None:
+        return None
+    return make_trip_etag(kwargs.get('pk'), versions, catalog.get_version(), request.user, request.get_full_path(),
+                          negotiated_media_type(request))
+
+
+def itinerary_etag(request, *args, **kwargs):
+    trip_id = kwargs.get('trip_id')
+    if trip_id is None:
+        return None
+
+    # Itinerary lists are only visible to the trip's owner
+    versions = get_trip_versions(trip_id, request.user, include_staff=False)
+    if versions is None:
+        return None
+    return make_trip_etag(trip_id, versions, catalog.get_version(), request.user, request.get_full_path(),
+                          negotiated_media_type(request))
+
+
+async def async_trip_etag(request, *args, **kwargs):
+    versions = await aget_trip_versions(kwargs.get('pk'), request.user)
+    if versions is None:
+        return None
+    catalog_version = await catalog.aget_version()
+    return make_trip_etag(kwargs.get('pk'), versions, catalog_version, request.user, request.get_full_path(),
+                          negotiated_media_type(request))
+
+
+async def async_itinerary_etag(request, *args, **kwargs):
+    trip_id = kwargs.get('trip_id')
+    if trip_id is None:
+        return None
+
+    versions = await aget_trip_versions(trip_id, request.user, include_staff=False)
+    if versions is None:
+        return None
+    catalog_version = await catalog.aget_version()
+    return make_trip_etag(trip_id, versions, catalog_version, request.user, request.get_full_path(),
+                          negotiated_media_type(request))
+
+
+def async_condition(etag_func):
+    """
+    Django's condition() for the async handlers of a view, `etag_func` is a coroutine.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        async def inner(self, request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await handler(self, request, *args, **kwargs)
+            if etag and request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('ETag', etag)
+            patch_vary_headers(response, ['Accept'])
+            return response
+        return inner
+    return decorator
+
+
+def sync_condition(etag_func):
+    """
+    Django's condition(), the responses vary on the Accept header their ETag depends on.
+    """
+    def decorator(handler):
+        conditional_handler = condition(etag_func=etag_func)(handler)
+
+        @wraps(handler)
+        def inner(request, *args, **kwargs):
+            response = conditional_handler(request, *args, **kwargs)
+            patch_vary_headers(response, ['Accept'])
+            return response
+        return inner
+    return decorator
+
+
+trip_condition = sync_condition(trip_etag)
+itinerary_condition = sync_condition(itinerary_etag)
+async_trip_condition = async_condition(async_trip_etag)
+async_itinerary_condition = async_condition(async_itinerary_etag)
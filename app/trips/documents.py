@@ -0,0 +1,198 @@
+import json
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from destinations.cache import catalog
+from . import models, serializers
+from .prefetch import prefetch_activities
+
+
+ITEM_ORDERING = ('day', 'activity_order', 'id')
+
+
+def render_days(trip_id, days=None):
+    """
+    Serializes the itinerary items of a trip grouped by ISO day.
+    When `days` is given only those days are rendered.
+    """
+    queryset = models.ItineraryItem.objects.filter(trip_id=trip_id).order_by(*ITEM_ORDERING)
+    if days is not None:
+        queryset = queryset.filter(day__in=days)
+
+    items = prefetch_activities(queryset)
+    data = serializers.ItineraryItemSerializer(items, many=True).data
+
+    rendered = {}
+    for item, item_data in zip(items, data):
+        rendered.setdefault(item.day.isoformat(), []).append(item_data)
+
+    # Round trip through JSON so the result compares equal to what is stored
+    return json.loads(json.dumps(rendered, cls=DjangoJSONEncoder))
+
+
+def build_document(trip):
+    """
+    Renders the whole itinerary of a trip and stores it.
+    """
+    # Read before rendering, a catalog change made meanwhile leaves the document stale rather than mislabeled
+    catalog_version = catalog.get_version()
+    document, _ = models.ItineraryDocument.objects.update_or_create(
+        trip=trip,
+        defaults={'version': trip.last_content_update, 'catalog_version': catalog_version,
+                  'days': render_days(trip.id)},
+    )
+    return document
+
+
+def patch_document(document, days, version):
+    """
+    Re-renders only the given days of a locked document and moves it to `version`.
+    """
+    day_keys = {day.isoformat() if hasattr(day, 'isoformat') else str(day) for day in days}
+    rendered = render_days(document.trip_id, day_keys)
+    for day in day_keys:
+        if day in rendered:
+            document.days[day] = rendered[day]
+        else:
+            document.days.pop(day, None)
+
+    document.version = version
+    document.save(update_fields=['version', 'days', 'date_updated'])
+    return document
+
+
+def apply_itinerary_change(trip_id, days):
+    """
+    Bumps the trip's last_content_update with a single UPDATE and patches the changed days of its document.
+
+    If the stored document wasn't at the trip's previous version it missed a
+    write, and if the catalog changed since it was rendered its other days embed
+    outdated catalog data, so it is rebuilt in full instead.
+    """
+    with transaction.atomic():
+        # The document is read anyway, the trip's previous version comes along with it
+        document = (
+            models.ItineraryDocument.objects
+            .select_for_update(of=('self',))
+            .select_related('trip')
+            .filter(trip_id=trip_id)
+            .first()
+        )
+        version = timezone.now()
+        if not models.Trip.objects.filter(pk=trip_id).update(last_content_update=version):
+            return None
+
+        if not is_current(document, catalog.get_version()):
+            return build_document(models.Trip.objects.get(pk=trip_id))
+        return patch_document(document, days, version)
+
+
+class PendingItineraryChanges:
+    """
+    The trips and days changed within a transaction, applied once it commits.
+    """
+
+    def __init__(self):
+        self.days_by_trip = defaultdict(set)
+
+    def add(self, trip_id, days):
+        self.days_by_trip[str(trip_id)].update(days)
+
+    def __call__(self):
+        for trip_id, days in self.days_by_trip.items():
+            apply_itinerary_change(trip_id, days)
+
+
+def record_itinerary_change(trip_id, days, using=None):
+    """
+    Records that the items of a trip changed on the given days.
+
+    Within a transaction the changes are collected and applied once it
+    commits, with one UPDATE per trip however many writes touched it.
+    Outside of one they are applied right away.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        apply_itinerary_change(trip_id, days)
+        return
+
+    # Reuse the callback already queued for this transaction, rolled back callbacks are dropped by Django
+    for _, callback, *_ in connection.run_on_commit:
+        if isinstance(callback, PendingItineraryChanges):
+            break
+    else:
+        callback = PendingItineraryChanges()
+        transaction.on_commit(callback, using=using)
+    callback.add(trip_id, days)
+
+
+def stored_document(trip_id, user):
+    return (
+        models.ItineraryDocument.objects
+        .select_related('trip')
+        .filter(trip_id=trip_id, trip__created_by=user.pk, trip__is_deleted=False)
+    )
+
+
+def is_current(document, catalog_version):
+    return (
+        document is not None
+        and document.version == document.trip.last_content_update
+        and document.catalog_version == catalog_version
+    )
+
+
+def rebuild_document(trip_id, user):
+    trip = models.Trip.objects.filter(id=trip_id, created_by=user.pk).first()
+    if trip is None:
+        return None
+    return build_document(trip)
+
+
+def get_document(trip_id, user):
+    """
+    Returns the up to date itinerary document for a trip owned by the user,
+    building it if it is missing or stale. Returns None if the trip isn't found.
+    """
+    document = stored_document(trip_id, user).first()
+    if is_current(document, catalog.get_version()):
+        return document
+    return rebuild_document(trip_id, user)
+
+
+async def aget_document(trip_id, user):
+    document = await stored_document(trip_id, user).afirst()
+    if is_current(document, await catalog.aget_version()):
+        return document
+    return await sync_to_async(rebuild_document)(trip_id, user)
+
+
+def check_document(trip):
+    """
+    Compares a trip's stored document with the live itinerary tables.
+    Returns a list of problems, empty when the document is consistent.
+    """
+    document = models.ItineraryDocument.objects.filter(trip=trip).first()
+    if document is None:
+        return ['Document is missing.']
+
+    problems = []
+    if document.version != trip.last_content_update:
+        problems.append(
+            f"Version {document.version.isoformat()} doesn't match last_content_update "
+            f"{trip.last_content_update.isoformat()}."
+        )
+    catalog_version = catalog.get_version()
+    if document.catalog_version != catalog_version:
+        problems.append(f"Catalog version {document.catalog_version} doesn't match {catalog_version}.")
+
+    rendered = render_days(trip.id)
+    for day in sorted(set(rendered) | set(document.days)):
+        if rendered.get(day) != document.days.get(day):
+            problems.append(f"Day {day} doesn't match the itinerary items.")
+
+    return problems
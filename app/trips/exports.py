@@ -0,0 +1,222 @@
+"""
+Streaming exports of itinerary items as NDJSON, CSV or iCalendar.
+
+Items are read with a server side cursor (`QuerySet.iterator()`) and handled
+in batches: the activities of a batch are resolved together, the batch is
+rendered and sent, and only then is the next one read, so memory use doesn't
+grow with the size of the export.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from common.async_views import streaming_content
+from . import serializers
+from .activities import registry
+from .prefetch import prefetch_activities
+
+BATCH_SIZE = 500
+
+EXPORT_ORDERING = ('trip_id', 'day', 'activity_order', 'id')
+
+
+def iter_batches(queryset, batch_size=None):
+    """
+    Yields the items of `queryset` in lists of `batch_size`, with their trip and activity loaded.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    items = queryset.select_related('trip').order_by(*EXPORT_ORDERING).iterator(chunk_size=batch_size)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        yield prefetch_activities(batch)
+
+
+def activity_summary(item):
+    """
+    A one line description of an item's activity.
+    """
+    activity = item.activity
+    if activity is None:
+        return ''
+    activity_type = registry.for_model(type(activity))
+    return activity_type.summarize(activity) if activity_type is not None else str(activity)
+
+
+def content_type_name(item):
+    activity_type = registry.for_content_type_id(item.content_type_id)
+    return activity_type.name if activity_type is not None else ''
+
+
+class Exporter:
+    """
+    Renders an export: `header()`, then `render()` for each batch of items, then `footer()`.
+    """
+    content_type = None
+    extension = None
+
+    def __init__(self, request):
+        self.request = request
+
+    def header(self):
+        return ''
+
+    def render(self, items):
+        raise NotImplementedError
+
+    def footer(self):
+        return ''
+
+
+class NDJSONExporter(Exporter):
+    """
+    One serialized item, as returned by the itinerary endpoints, per line.
+    """
+    content_type = 'application/x-ndjson'
+    extension = 'ndjson'
+
+    def render(self, items):
+        data = serializers.ItineraryItemSerializer(items, many=True, context={'request': self.request}).data
+        return ''.join(json.dumps(item, cls=DjangoJSONEncoder) + '\n' for item in data)
+
+
+class CSVExporter(Exporter):
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+    columns = [
+        'trip_id', 'trip_title', 'day', 'start_time', 'end_time', 'content_type', 'activity_id', 'activity',
+        'note', 'item_id',
+    ]
+
+    def write_rows(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+    def header(self):
+        return self.write_rows([self.columns])
+
+    def render(self, items):
+        return self.write_rows([
+            item.trip_id, item.trip.title, item.day.isoformat(),
+            item.start_time.isoformat() if item.start_time else '',
+            item.end_time.isoformat() if item.end_time else '',
+            content_type_name(item), item.activity_id, activity_summary(item), item.note or '', item.id,
+        ] for item in items)
+
+
+class ICalendarExporter(Exporter):
+    """
+    An iCalendar (RFC 5545) calendar with one event per item. Items without a
+    start time are all day events, times are floating, in the park's local time.
+    """
+    content_type = 'text/calendar; charset=utf-8'
+    extension = 'ics'
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.stamp = timezone.now().strftime('%Y%m%dT%H%M%SZ')
+
+    @staticmethod
+    def escape(text):
+        return (
+            text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n')
+        )
+
+    @staticmethod
+    def fold(line):
+        # Content lines are limited to 75 octets, longer ones continue on lines starting with a space
+        encoded = line.encode()
+        if len(encoded) <= 75:
+            return line + '\r\n'
+        parts = []
+        while encoded:
+            limit = 75 if not parts else 74
+            cut = min(limit, len(encoded))
+            # Don't split a multi byte character
+            while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+                cut -= 1
+            parts.append(encoded[:cut].decode())
+            encoded = encoded[cut:]
+        return '\r\n '.join(parts) + '\r\n'
+
+    def lines(self, *lines):
+        return ''.join(self.fold(line) for line in lines)
+
+    def header(self):
+        return self.lines(
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//Mouse Tracks//Itinerary export//EN',
+            'CALSCALE:GREGORIAN',
+        )
+
+    def event_times(self, item):
+        if item.start_time is None:
+            return [
+                f'DTSTART;VALUE=DATE:{item.day:%Y%m%d}',
+                f'DTEND;VALUE=DATE:{item.day + timedelta(days=1):%Y%m%d}',
+            ]
+        start = datetime.combine(item.day, item.start_time)
+        times = [f'DTSTART:{start:%Y%m%dT%H%M%S}']
+        if item.end_time is not None and item.end_time > item.start_time:
+            times.append(f'DTEND:{datetime.combine(item.day, item.end_time):%Y%m%dT%H%M%S}')
+        return times
+
+    def render(self, items):
+        events = []
+        for item in items:
+            description = '\n'.join([item.trip.title] + ([item.note] if item.note else []))
+            events.append(self.lines(
+                'BEGIN:VEVENT',
+                f'UID:{item.id}@mouse-tracks',
+                f'DTSTAMP:{self.stamp}',
+                *self.event_times(item),
+                f'SUMMARY:{self.escape(activity_summary(item) or content_type_name(item))}',
+                f'DESCRIPTION:{self.escape(description)}',
+                f'CATEGORIES:{content_type_name(item).upper()}',
+                'END:VEVENT',
+            ))
+        return ''.join(events)
+
+    def footer(self):
+        return self.lines('END:VCALENDAR')
+
+
+EXPORTERS = {
+    exporter.extension: exporter for exporter in (NDJSONExporter, CSVExporter, ICalendarExporter)
+}
+
+
+def iter_export(exporter, queryset, batch_size=None):
+    yield exporter.header()
+    for batch in iter_batches(queryset, batch_size):
+        yield exporter.render(batch)
+    yield exporter.footer()
+
+
+def export_response(request, export_format, queryset, filename):
+    """
+    Returns a StreamingHttpResponse exporting the items of `queryset`, or None for an unknown format.
+    """
+    exporter_class = EXPORTERS.get(export_format)
+    if exporter_class is None:
+        return None
+    exporter = exporter_class(request)
+
+    response = StreamingHttpResponse(
+        streaming_content(iter_export(exporter, queryset)),
+        content_type=exporter.content_type,
+    )
+    filename = slugify(filename) or 'itinerary'
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{exporter.extension}"'
+    return response
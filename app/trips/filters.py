@@ -12,7 +12,7 @@ class ItineraryItemFilter(django_filters.FilterSet):
 
 
 class BreakFilter(django_filters.FilterSet):
-    itinerary_item_id = django_filters.UUIDFilter(field_name='itinerary_item__id')
+    itinerary_item_id = django_filters.UUIDFilter(field_name='itinerary_items__id')
 
     class Meta:
         model = models.Break
@@ -20,7 +20,7 @@ class BreakFilter(django_filters.FilterSet):
 
 
 class TravelEventFilter(django_filters.FilterSet):
-    itinerary_item_id = django_filters.UUIDFilter(field_name='itinerary_item__id')
+    itinerary_item_id = django_filters.UUIDFilter(field_name='itinerary_items__id')
 
     class Meta:
         model = models.TravelEvent
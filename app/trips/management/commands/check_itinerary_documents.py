@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trips import models, documents
+
+
+class Command(BaseCommand):
+    help = "Checks the stored itinerary documents against the itinerary items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('trip_ids', nargs='*', help="Only check these trips. Defaults to every trip.")
+        parser.add_argument('--fix', action='store_true', help="Rebuild the documents that don't match.")
+
+    def handle(self, *args, **options):
+        trips = models.Trip.objects.all()
+        if options['trip_ids']:
+            trips = trips.filter(id__in=options['trip_ids'])
+
+        inconsistent = 0
+        for trip in trips.iterator():
+            problems = documents.check_document(trip)
+            if not problems:
+                continue
+
+            inconsistent += 1
+            for problem in problems:
+                self.stdout.write(f"{trip.id}: {problem}")
+            if options['fix']:
+                documents.build_document(trip)
+                self.stdout.write(f"{trip.id}: rebuilt")
+
+        if inconsistent and not options['fix']:
+            raise CommandError(f"{inconsistent} itinerary document(s) are inconsistent.")
+        self.stdout.write(self.style.SUCCESS(f"Checked itinerary documents, {inconsistent} inconsistent."))
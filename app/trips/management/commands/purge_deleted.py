@@ -0,0 +1,102 @@
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.contrib.contenttypes.fields import GenericRelation
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+from common.models import BaseModel
+from trips.documents import record_itinerary_change
+from trips.models import ItineraryItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Hard deletes the rows that were soft deleted more than --days ago. Rows are deleted in batches of "
+        "--batch-size, each in its own transaction, so locks are only held for one batch at a time. Activities "
+        "still used by live itinerary items are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*', metavar='app_label.Model',
+            help="Only purge these models. Defaults to every soft deletable model.",
+        )
+        parser.add_argument('--days', type=int, default=30, help="Keep rows deleted within this many days.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows deleted per transaction.")
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to wait between batches.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the rows that would be purged.")
+
+    def get_models(self, labels):
+        if not labels:
+            return [model for model in apps.get_models() if issubclass(model, BaseModel)]
+
+        models = []
+        for label in labels:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError(f"Unknown model: {label}")
+            if not issubclass(model, BaseModel):
+                raise CommandError(f"{label} isn't soft deletable.")
+            models.append(model)
+        return models
+
+    def exclude_in_use(self, model, queryset):
+        """
+        Leaves out the rows that live rows still point to through a generic relation, such as activities of
+        live itinerary items. The generic relation would delete those along with them.
+        """
+        for field in model._meta.private_fields:
+            if isinstance(field, GenericRelation) and issubclass(field.related_model, BaseModel):
+                queryset = queryset.exclude(**{f'{field.name}__is_deleted': False})
+        return queryset
+
+    def delete(self, model, ids):
+        """
+        Deletes the rows and the rows that reference them through a cascading foreign key. The itineraries of
+        live items deleted on the way are updated once the batch commits.
+        """
+        collector = Collector(using=router.db_for_write(model))
+        collector.collect(model.all_objects.filter(pk__in=ids))
+
+        # Items are either fast deleted with a query or collected as instances
+        items = [queryset for queryset in collector.fast_deletes if queryset.model is ItineraryItem]
+        if ItineraryItem in collector.data:
+            items.append(ItineraryItem.all_objects.filter(pk__in=[item.pk for item in collector.data[ItineraryItem]]))
+        for queryset in items:
+            for trip_id, day in queryset.filter(is_deleted=False).values_list('trip_id', 'day').distinct():
+                record_itinerary_change(trip_id, [day])
+
+        collector.delete()
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--days can't be negative and --batch-size must be at least 1.")
+
+        # date_updated is set when a row is soft deleted
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        for model in self.get_models(options['models']):
+            expired = self.exclude_in_use(model, model.all_objects.filter(is_deleted=True, date_updated__lt=cutoff))
+            if options['dry_run']:
+                self.stdout.write(f"{model._meta.label}: {expired.count()} row(s) would be purged.")
+                continue
+
+            purged = 0
+            while True:
+                with transaction.atomic():
+                    ids = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+                    if not ids:
+                        break
+                    self.delete(model, ids)
+                purged += len(ids)
+                if options['pause']:
+                    time.sleep(options['pause'])
+
+            self.stdout.write(f"{model._meta.label}: purged {purged} row(s).")
+
+        self.stdout.write(self.style.SUCCESS("Purged soft deleted rows."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Length
+
+from trips import models, ordering
+
+
+class Command(BaseCommand):
+    help = "Rewrites the activity_order keys of itinerary days whose keys have grown too long."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-length',
+            type=int,
+            default=ordering.REBALANCE_KEY_LENGTH,
+            help="Rebalance days holding a key longer than this.",
+        )
+
+    def handle(self, *args, **options):
+        days = (
+            models.ItineraryItem.objects
+            .annotate(key_length=Length('activity_order'))
+            .filter(key_length__gt=options['max_length'])
+            .values_list('trip_id', 'day')
+            .distinct()
+        )
+
+        count = 0
+        for trip_id, day in days:
+            ordering.rebalance_day(trip_id, day)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebalanced {count} itinerary day(s)."))
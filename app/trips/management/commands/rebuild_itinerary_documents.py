@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from trips import models, documents
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the stored itinerary documents from the itinerary items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('trip_ids', nargs='*', help="Only rebuild these trips. Defaults to every trip.")
+
+    def handle(self, *args, **options):
+        trips = models.Trip.objects.all()
+        if options['trip_ids']:
+            trips = trips.filter(id__in=options['trip_ids'])
+
+        count = 0
+        for trip in trips.iterator():
+            documents.build_document(trip)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} itinerary document(s)."))
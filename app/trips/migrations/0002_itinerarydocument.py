@@ -0,0 +1,24 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:17
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItineraryDocument',
+            fields=[
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='itinerary_document', serialize=False, to='trips.trip')),
+                ('version', models.DateTimeField()),
+                ('days', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:17
+
+import re
+
+from django.db import migrations, models
+
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+LEGACY_KEY_WIDTH = 5
+
+
+def legacy_key(position):
+    # A copy of trips.ordering.legacy_key as of this migration
+    position = max(0, min(position, len(DIGITS) ** LEGACY_KEY_WIDTH - 1))
+    digits = []
+    for _ in range(LEGACY_KEY_WIDTH):
+        position, remainder = divmod(position, len(DIGITS))
+        digits.append(DIGITS[remainder])
+    return ''.join(reversed(digits)) + DIGITS[len(DIGITS) // 2]
+
+
+def convert_positions(apps, schema_editor):
+    """
+    Rewrites the integer positions, now stored as strings that would sort "1", "10", "2", to rank keys.
+    """
+    ItineraryItem = apps.get_model('trips', 'ItineraryItem')
+    # The historical manager includes soft deleted rows
+    items = ItineraryItem.objects.only('pk', 'activity_order').order_by('pk')
+    batch = []
+    for item in items.iterator(chunk_size=2000):
+        if re.match(r'^-?[0-9]+$', item.activity_order):
+            item.activity_order = legacy_key(int(item.activity_order))
+            batch.append(item)
+        if len(batch) >= 2000:
+            ItineraryItem.objects.bulk_update(batch, ['activity_order'])
+            batch = []
+    ItineraryItem.objects.bulk_update(batch, ['activity_order'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0002_itinerarydocument'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='itineraryitem',
+            name='activity_order',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.RunPython(convert_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0003_activity_order_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='itineraryitem',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['trip', 'day', 'activity_order', 'id'], name='itinerary_item_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itineraryitem',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['content_type', 'activity_id'], name='itinerary_item_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['created_by', 'start_date', 'id'], name='trip_owner_start_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['start_date', 'id'], name='trip_start_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itinerarydocument',
+            name='catalog_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
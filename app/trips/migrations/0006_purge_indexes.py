@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_document_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='break',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['date_updated'], name='break_purge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itineraryitem',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['date_updated'], name='itineraryitem_purge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meal',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['date_updated'], name='meal_purge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['date_updated'], name='note_purge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='travelevent',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['date_updated'], name='travelevent_purge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['date_updated'], name='trip_purge_idx'),
+        ),
+    ]
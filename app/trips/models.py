@@ -1,6 +1,7 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.exceptions import ValidationError
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 
 from common import BaseModel
@@ -19,6 +20,19 @@ class Trip(BaseModel):
     end_date = models.DateField(blank=False)
     last_content_update = models.DateTimeField(auto_now_add=True)
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            *BaseModel.Meta.indexes,
+            # Keyset pagination of trips, per user and for staff. The indexes are partial on the
+            # is_deleted predicate that BaseModelManager adds to every query.
+            models.Index(
+                fields=['created_by', 'start_date', 'id'],
+                name='trip_owner_start_date_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(fields=['start_date', 'id'], name='trip_start_date_idx', condition=models.Q(is_deleted=False)),
+        ]
+
     def __str__(self):
         return f"{self.created_by.first_name}'s:{self.title}"
 
@@ -33,6 +47,7 @@ class Trip(BaseModel):
 
 class Break(BaseModel):
     location = models.ForeignKey(dest_models.Location, on_delete=models.CASCADE)
+    itinerary_items = GenericRelation('ItineraryItem', content_type_field='content_type', object_id_field='activity_id')
 
     def __str__(self):
         return f"Break: {self.location.name}"
@@ -42,6 +57,7 @@ class Note(BaseModel):
     location = models.ForeignKey(dest_models.Location, on_delete=models.CASCADE)
     land = models.ForeignKey(dest_models.Land, blank=True, null=True, on_delete=models.CASCADE)
     note = models.CharField(max_length=800, blank=True, null=True)
+    itinerary_items = GenericRelation('ItineraryItem', content_type_field='content_type', object_id_field='activity_id')
 
     def __str__(self):
         if self.land:
@@ -70,6 +86,7 @@ class TravelEvent(BaseModel):
         choices=EventType.choices,
         blank=False,
     )
+    itinerary_items = GenericRelation('ItineraryItem', content_type_field='content_type', object_id_field='activity_id')
 
     def __str__(self):
         return (
@@ -107,6 +124,7 @@ class Meal(BaseModel):
         choices=MealType.choices,
         blank=False,
     )
+    itinerary_items = GenericRelation('ItineraryItem', content_type_field='content_type', object_id_field='activity_id')
 
     def __str__(self):
         return f"{self.meal_type}: {self.meal_experience.name}"
@@ -115,7 +133,8 @@ class Meal(BaseModel):
 class ItineraryItem(BaseModel):
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE)
     note = models.CharField(max_length=800, blank=True, null=True)
-    activity_order = models.IntegerField(blank=False)
+    # Fractional rank key ordering the items of a day, see trips.ordering
+    activity_order = models.CharField(max_length=64, blank=False)
     start_time = models.TimeField(blank=True, null=True)
     end_time = models.TimeField(blank=True, null=True)
     day = models.DateField(blank=False)
@@ -127,6 +146,23 @@ class ItineraryItem(BaseModel):
 
     attributes = models.JSONField(blank=True, null=True)
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            *BaseModel.Meta.indexes,
+            # Keyset pagination of a trip's itinerary
+            models.Index(
+                fields=['trip', 'day', 'activity_order', 'id'],
+                name='itinerary_item_order_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            # Reverse lookups of the generic relation, from an activity to its item
+            models.Index(
+                fields=['content_type', 'activity_id'],
+                name='itinerary_item_activity_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.day}:{self.activity_order}"
 
@@ -136,3 +172,23 @@ class ItineraryItem(BaseModel):
             raise ValidationError(
                 {'content_type': 'Invalid content type.'}
             )
+
+
+class ItineraryDocument(models.Model):
+    """
+    Pre-rendered itinerary for a trip, stored as serialized itinerary items grouped by day.
+    `version` matches the trip's last_content_update the document was rendered for, and
+    `catalog_version` the CatalogVersion of the destinations, locations and experiences it embeds.
+    """
+    trip = models.OneToOneField(Trip, primary_key=True, related_name='itinerary_document', on_delete=models.CASCADE)
+    version = models.DateTimeField()
+    catalog_version = models.PositiveBigIntegerField(default=0)
+    days = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    date_updated = models.DateTimeField(auto_now=True, editable=False)
+
+    def __str__(self):
+        return f"Itinerary document: {self.trip_id}@{self.version}"
+
+    @property
+    def items(self):
+        return [item for day in sorted(self.days) for item in self.days[day]]
@@ -0,0 +1,188 @@
+"""
+Fractional rank keys for ItineraryItem.activity_order.
+
+A key is a string of base 36 digits read as a fraction (`"i"` is 18/36), so a
+key can always be generated between any two others and moving an item only
+rewrites that item. Keys never end in "0", which keeps the representation of
+every fraction unique. Only lowercase letters and digits are used, so keys sort
+the same under the C collation and the usual locale collations.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, connections, transaction
+
+from . import models
+
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+
+KEY_PATTERN = re.compile(r'^[0-9a-z]*[1-9a-z]$')
+
+# Integer positions of older clients, sent as numbers or, by form and multipart clients, as strings
+LEGACY_POSITION_PATTERN = re.compile(r'^-?[0-9]+$')
+
+# Width of the keys generated for legacy integer positions, enough for 36**5 positions
+LEGACY_KEY_WIDTH = 5
+
+# Days holding a key longer than this are rebalanced in the background
+REBALANCE_KEY_LENGTH = 12
+
+_rebalance_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='itinerary-rebalance')
+
+
+class NoRoomBetweenKeys(Exception):
+    """
+    Raised when neighbours share a key, nothing sorts between them until their day is rebalanced.
+    """
+
+
+def is_valid_key(key):
+    return isinstance(key, str) and bool(KEY_PATTERN.match(key))
+
+
+def is_legacy_position(value):
+    if isinstance(value, int):
+        return not isinstance(value, bool)
+    return isinstance(value, str) and bool(LEGACY_POSITION_PATTERN.match(value))
+
+
+def encode(value, width):
+    digits = []
+    for _ in range(width):
+        value, remainder = divmod(value, BASE)
+        digits.append(DIGITS[remainder])
+    return ''.join(reversed(digits))
+
+
+def midpoint(low, high):
+    """
+    Returns a key strictly between `low` and `high`, where `low` may be empty
+    (the start of the range) and `high` may be None (the end of the range).
+    """
+    if high is not None:
+        # Keep the common prefix and look for a midpoint after it
+        prefix = 0
+        while prefix < len(high) and (low[prefix] if prefix < len(low) else '0') == high[prefix]:
+            prefix += 1
+        if prefix > 0:
+            return high[:prefix] + midpoint(low[prefix:], high[prefix:])
+
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+
+    # The first digits are adjacent
+    if high is not None and len(high) > 1:
+        return high[:1]
+    return DIGITS[low_digit] + midpoint(low[1:], None)
+
+
+def key_between(before=None, after=None):
+    """
+    Returns a key that sorts after `before` and before `after`, either may be None.
+    Raises NoRoomBetweenKeys if they are equal and ValueError if they are out of order.
+    """
+    if before is not None and after is not None:
+        if before == after:
+            raise NoRoomBetweenKeys(f"No key sorts between two items ordered {before!r}.")
+        if before > after:
+            raise ValueError(f"{before!r} doesn't sort before {after!r}")
+    return midpoint(before or '', after)
+
+
+def legacy_key(position):
+    """
+    Maps an integer activity_order from older clients to a key that keeps integer ordering.
+    """
+    position = max(0, min(int(position), BASE ** LEGACY_KEY_WIDTH - 1))
+    return encode(position, LEGACY_KEY_WIDTH) + DIGITS[BASE // 2]
+
+
+def evenly_spaced_keys(count):
+    """
+    Returns `count` short, increasing keys spread evenly over the whole range.
+    """
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    width += 1
+    step = BASE ** width // (count + 1)
+    return [encode(step * (i + 1), width).rstrip('0') for i in range(count)]
+
+
+def key_for_move(item, day, after_id=None, before_id=None):
+    """
+    Returns the key that places `item` on `day` right after the item `after_id`
+    and/or right before the item `before_id`, or at the end of the day when
+    neither is given. Only the moved item has to be written.
+
+    Raises ValueError if a neighbour isn't on that day or the neighbours are
+    out of order, and NoRoomBetweenKeys if they share a key, in which case the
+    day needs to be rebalanced first.
+    """
+    if after_id and after_id == before_id:
+        raise ValueError("An item can't be placed both after and before the same item.")
+    siblings = models.ItineraryItem.objects.filter(trip_id=item.trip_id, day=day).exclude(pk=item.pk)
+    keys = siblings.values_list('activity_order', flat=True)
+
+    def neighbour_key(neighbour_id):
+        key = keys.filter(pk=neighbour_id).first()
+        if key is None:
+            raise ValueError(f"Itinerary item {neighbour_id} isn't on {day}.")
+        return key
+
+    before = neighbour_key(after_id) if after_id else None
+    after = neighbour_key(before_id) if before_id else None
+
+    if after_id and not before_id:
+        after = keys.filter(activity_order__gt=before).order_by('activity_order').first()
+    elif before_id and not after_id:
+        before = keys.filter(activity_order__lt=after).order_by('-activity_order').first()
+    elif not after_id and not before_id:
+        before = keys.order_by('-activity_order').first()
+
+    return key_between(before, after)
+
+
+def rebalance_day(trip_id, day):
+    """
+    Rewrites the keys of one day of a trip with short, evenly spaced keys, keeping the current order.
+    """
+    from .documents import record_itinerary_change
+
+    with transaction.atomic():
+        items = list(
+            models.ItineraryItem.objects
+            .select_for_update()
+            .filter(trip_id=trip_id, day=day)
+            .order_by('activity_order', 'id')
+        )
+        for item, key in zip(items, evenly_spaced_keys(len(items))):
+            item.activity_order = key
+        models.ItineraryItem.objects.bulk_update(items, ['activity_order'])
+
+        if items:
+            record_itinerary_change(trip_id, [day])
+
+
+def _rebalance_in_background(trip_id, day):
+    close_old_connections()
+    try:
+        rebalance_day(trip_id, day)
+    finally:
+        # Database connections are per thread, don't leave this one open
+        connections.close_all()
+
+
+def schedule_rebalance(trip_id, day):
+    """
+    Rebalances a day once the current transaction commits, outside of the request.
+    """
+    transaction.on_commit(lambda: _rebalance_executor.submit(_rebalance_in_background, trip_id, day))
+
+
+def needs_rebalance(key):
+    return len(key) > REBALANCE_KEY_LENGTH
@@ -0,0 +1,13 @@
+from common.pagination import KeysetPagination
+
+
+class TripPagination(KeysetPagination):
+    ordering = ('start_date', 'id')
+    page_size = 50
+    max_page_size = 100
+
+
+class ItineraryItemPagination(KeysetPagination):
+    ordering = ('day', 'activity_order', 'id')
+    page_size = 200
+    max_page_size = 500
@@ -0,0 +1,136 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+
+from destinations import models as dest_models
+from destinations.serializers import ExperienceSerializer
+from destinations.cache import catalog
+from . import models
+
+
+# Related objects each activity model needs loaded to be serialized without
+# further queries. FKs are joined in, M2Ms are prefetched in one query each.
+ACTIVITY_RELATIONS = {
+    dest_models.Experience: {
+        'select_related': [],
+        'prefetch_related': list(ExperienceSerializer.eager_relations),
+    },
+    models.Break: {
+        'select_related': ['location'],
+        'prefetch_related': [],
+    },
+    models.Meal: {
+        'select_related': ['meal_experience'],
+        'prefetch_related': ['meal_experience__' + relation for relation in ExperienceSerializer.eager_relations],
+    },
+    models.TravelEvent: {
+        'select_related': ['from_location', 'to_location'],
+        'prefetch_related': [],
+    },
+    models.Note: {
+        'select_related': ['location', 'land'],
+        'prefetch_related': [],
+    },
+}
+
+# Foreign keys from activities into the destination catalog, resolved from the catalog cache
+ACTIVITY_CATALOG_FIELDS = {
+    models.Break: ['location'],
+    models.Meal: ['meal_experience'],
+    models.TravelEvent: ['from_location', 'to_location'],
+    models.Note: ['location', 'land'],
+}
+
+
+def get_activity_queryset(model):
+    """
+    Returns a queryset for the given activity model with its related objects
+    eager loaded.
+    """
+    relations = ACTIVITY_RELATIONS.get(model, {})
+    # Use the base manager to match how the generic relation resolves objects
+    queryset = model._base_manager.all()
+    if relations.get('select_related'):
+        queryset = queryset.select_related(*relations['select_related'])
+    if relations.get('prefetch_related'):
+        queryset = queryset.prefetch_related(*relations['prefetch_related'])
+    return queryset
+
+
+def attach_catalog_objects(activities, model):
+    """
+    Sets the catalog foreign keys of the activities from the catalog cache.
+    Returns the activities that reference a row the cache doesn't hold.
+    """
+    missing = []
+    for activity in activities:
+        for field_name in ACTIVITY_CATALOG_FIELDS.get(model, []):
+            field = model._meta.get_field(field_name)
+            related_id = getattr(activity, field.attname)
+            if related_id is None:
+                field.set_cached_value(activity, None)
+                continue
+
+            related = catalog.get(field.related_model, related_id)
+            if related is None:
+                missing.append(activity)
+                break
+            field.set_cached_value(activity, related)
+    return missing
+
+
+def load_activities(model, activity_ids):
+    """
+    Loads the activities of one model with their catalog relations, serving
+    catalog rows from the catalog cache. Rows the cache doesn't hold (such as
+    soft deleted ones) are loaded from the database.
+    """
+    if model is dest_models.Experience:
+        activities = [catalog.get(model, activity_id) for activity_id in activity_ids]
+        found = [activity for activity in activities if activity is not None]
+        missing_ids = set(activity_ids) - {activity.pk for activity in found}
+        if missing_ids:
+            found += list(get_activity_queryset(model).filter(pk__in=missing_ids))
+        return found
+
+    activities = list(model._base_manager.filter(pk__in=activity_ids))
+    missing = attach_catalog_objects(activities, model)
+    if missing:
+        reloaded = {activity.pk: activity for activity in get_activity_queryset(model).filter(
+            pk__in=[activity.pk for activity in missing]
+        )}
+        activities = [reloaded.get(activity.pk, activity) for activity in activities]
+    return activities
+
+
+def prefetch_activities(items):
+    """
+    Resolves the `activity` generic relation for a list of itinerary items.
+
+    Items are grouped by content type and each activity model is loaded with
+    a single query, with its destination catalog relations served from the
+    catalog cache, so the number of queries does not grow with the number of items.
+    """
+    items = list(items)
+    activity_field = models.ItineraryItem._meta.get_field('activity')
+    content_type_field = models.ItineraryItem._meta.get_field('content_type')
+
+    ids_by_content_type = defaultdict(set)
+    for item in items:
+        # ContentType.objects.get_for_id() is served from Django's content type cache
+        content_type = ContentType.objects.get_for_id(item.content_type_id)
+        content_type_field.set_cached_value(item, content_type)
+        ids_by_content_type[content_type].add(item.activity_id)
+
+    activities = {}
+    for content_type, activity_ids in ids_by_content_type.items():
+        model = content_type.model_class()
+        if model is None:
+            continue
+        for activity in load_activities(model, activity_ids):
+            activities[(content_type.id, activity.pk)] = activity
+
+    for item in items:
+        activity_field.set_cached_value(item, activities.get((item.content_type_id, item.activity_id)))
+
+    return items
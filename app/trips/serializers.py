@@ -1,20 +1,27 @@
+from collections import defaultdict
+
 from rest_framework import serializers
-from . import models
+from . import models, ordering
+from .activities import assign_fields, registry
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
-from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
 
+from common import DynamicFieldsMixin
+from common.serializers import is_expanded
 from destinations import serializers as dest_serializers
 from destinations import models as dest_models
+from destinations.cache import catalog
 
 
-class TripSerializer(serializers.ModelSerializer):
+class TripSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     destination = dest_serializers.DestinationSerializer(read_only=True)
     destination_id = serializers.UUIDField(write_only=True)
 
     class Meta:
         model = models.Trip
         exclude = ['date_created', 'is_deleted', 'date_updated']
+        read_only_fields = ['created_by']
 
     def validate(self, data):
         if data['start_date'] > data['end_date']:
@@ -23,12 +30,14 @@ class TripSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         destination_id = validated_data.pop('destination_id')
-        destination_instance = dest_models.Destination.objects.get(pk=destination_id)
+        destination_instance = catalog.get(dest_models.Destination, destination_id)
+        if destination_instance is None:
+            raise serializers.ValidationError("Destination does not exist.")
         trip = models.Trip.objects.create(destination=destination_instance, **validated_data)
         return trip
 
 
-class BreakSerializer(serializers.ModelSerializer):
+class BreakSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     location = dest_serializers.LocationSerializer(read_only=True)
     location_id = serializers.UUIDField(write_only=True)
 
@@ -37,14 +46,14 @@ class BreakSerializer(serializers.ModelSerializer):
         exclude = ['date_created', 'is_deleted', 'date_updated']
 
 
-class NoteSerializer(serializers.ModelSerializer):
+class NoteSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = models.Note
         exclude = ['date_created', 'is_deleted', 'date_updated']
 
 
-class TravelEventSerializer(serializers.ModelSerializer):
+class TravelEventSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     from_location = dest_serializers.LocationSerializer(read_only=True)
     to_location = dest_serializers.LocationSerializer(read_only=True)
 
@@ -56,7 +65,7 @@ class TravelEventSerializer(serializers.ModelSerializer):
         exclude = ['date_created', 'is_deleted', 'date_updated']
 
 
-class MealSerializer(serializers.ModelSerializer):
+class MealSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     meal_experience = dest_serializers.ExperienceSerializer(read_only=True)
     meal_experience_id = serializers.UUIDField(write_only=True)
 
@@ -72,13 +81,49 @@ class ContentTypeField(serializers.RelatedField):
         return value.model
 
     def to_internal_value(self, data):
-        if data == 'note':
-            return None
-        return ContentType.objects.get(model=data)
+        activity_type = registry.get(data)
+        if activity_type is None:
+            raise serializers.ValidationError(f"Invalid content type: {data}")
+        return activity_type.content_type
+
+
+class ActivityOrderField(serializers.Field):
+    """
+    Rank key of an item within its day. Integers sent by older clients, as
+    numbers or strings of digits, are converted to keys that keep the integer
+    ordering, so a key made only of digits is read as a position too.
+    """
+    default_error_messages = {
+        'invalid': 'Must be an integer or a rank key of digits and lowercase letters not ending in "0".',
+    }
+
+    def to_internal_value(self, data):
+        if ordering.is_legacy_position(data):
+            return ordering.legacy_key(data)
+        if not ordering.is_valid_key(data):
+            self.fail('invalid')
+        return data
+
+    def to_representation(self, value):
+        return value
+
+
+class TripField(serializers.PrimaryKeyRelatedField):
+    """
+    Looks each trip up once per root serializer, since every item of a bulk payload references the same trip.
+    """
+
+    def to_internal_value(self, data):
+        trips = self.root.__dict__.setdefault('_trip_lookups', {})
+        if str(data) not in trips:
+            trips[str(data)] = super().to_internal_value(data)
+        return trips[str(data)]
 
 
-class ItineraryItemSerializer(serializers.ModelSerializer):
+class ItineraryItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=False, required=False)
+    trip = TripField(queryset=models.Trip.objects.all())
+    activity_order = ActivityOrderField()
     activity = serializers.JSONField(required=False)  # Add this line
     content_type_id = serializers.IntegerField(read_only=True)
     activity_id = serializers.UUIDField(required=False, allow_null=True)
@@ -102,14 +147,13 @@ class ItineraryItemSerializer(serializers.ModelSerializer):
         ]
 
     def validate(self, data):
-        # print('in validate')
         content_type = data.get('content_type')
 
         # Validate content_type
         data['content_type_id'] = content_type.id  # Add content_type_id to validated_data
 
         # Other validations when content_type is not None
-        if content_type == 'note' and 'note' not in data.get('activity', None):
+        if content_type.model == 'note' and 'note' not in (data.get('activity') or {}):
             raise serializers.ValidationError({'notes': 'The notes field is required when content_type is "note".'})
         elif content_type.model == 'experience' and not data.get('activity_id'):
             raise serializers.ValidationError({'activity_id': 'This field is required for experiences.'})
@@ -124,74 +168,46 @@ class ItineraryItemSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
-        self.fields['activity'] = serializers.SerializerMethodField()
+        if 'activity' in self.fields:
+            if is_expanded(self.context.get('request'), 'activity'):
+                self.fields['activity'] = serializers.SerializerMethodField()
+            else:
+                # Like the other nested objects, the activity is returned as its id when it isn't expanded
+                self.fields['activity'] = serializers.UUIDField(source='activity_id', read_only=True)
 
         representation = super().to_representation(instance)
 
-        if representation['content_type'] is None:
+        if representation.get('content_type', "note") is None:
             representation['content_type'] = "note"
 
         return representation
 
-    def handle_travel_event_create(self, activity):
-        from_location_instance = None
-        to_location_instance = None
-
-        # Check if from_location_id and to_location_id are provided, and if so, fetch them.
-        if activity.get('from_location_id'):
-            try:
-                from_location_instance = dest_models.Location.objects.get(id=activity.pop('from_location_id'))
-                activity['from_location'] = from_location_instance
-            except ObjectDoesNotExist:
-                raise serializers.ValidationError("From location does not exist.")
-
-        if activity.get('to_location_id'):
-            try:
-                to_location_instance = dest_models.Location.objects.get(id=activity.pop('to_location_id'))
-                activity['to_location'] = to_location_instance
-            except ObjectDoesNotExist:
-                raise serializers.ValidationError("To location does not exist.")
-
-        # If neither location ID nor custom location is provided, raise an error.
-        if not from_location_instance and not activity.get('custom_from_location'):
-            raise serializers.ValidationError("Either from_location_id or custom_from_location must be provided.")
-
-        if not to_location_instance and not activity.get('custom_to_location'):
-            raise serializers.ValidationError("Either to_location_id or custom_to_location must be provided.")
-
-        return models.TravelEvent.objects.create(**activity)
-
-    def create(self, validated_data):
+    def build_itinerary_item(self, validated_data):
+        """
+        Returns an unsaved itinerary item and its activity, the activity is
+        unsaved too unless it is an existing catalog experience.
+        """
+        validated_data = dict(validated_data)
         content_type = validated_data.pop('content_type', None)
         activity = validated_data.pop('activity', None)
 
         # Create the activity based on the content type
-        if content_type.model == 'meal':
-            activity_obj = models.Meal.objects.create(**activity)
-        elif content_type.model == 'note':
-            activity_obj = models.Note.objects.create(**activity)
-        elif content_type.model == 'break':
-            try:
-                location_instance = dest_models.Location.objects.get(id=activity['location'])
-                activity_obj = models.Break.objects.create(location=location_instance)
-            except ObjectDoesNotExist:
-                raise serializers.ValidationError("Location does not exist.")
-        elif content_type.model == 'travelevent':
-            activity_obj = self.handle_travel_event_create(activity)
-
-        elif content_type.model == 'experience':
-            activity_id = validated_data.get('activity_id')
-            if not dest_models.Experience.objects.filter(id=activity_id).exists():
-                raise serializers.ValidationError("Invalid experience_id provided.")
-            activity_obj = dest_models.Experience.objects.get(id=activity_id)
-        else:
+        activity_type = registry.for_content_type_id(content_type.id)
+        if activity_type is None:
             raise serializers.ValidationError('Invalid activity type')
+        activity_obj = activity_type.build(activity, validated_data)
 
         validated_data['activity_id'] = activity_obj.id
         validated_data['content_type_id'] = content_type.id
+        return models.ItineraryItem(**validated_data), activity_obj
+
+    def create(self, validated_data):
+        itinerary_item, activity_obj = self.build_itinerary_item(validated_data)
+        if activity_obj._state.adding:
+            activity_obj.save()
 
         # Create the itinerary item
-        itinerary_item = models.ItineraryItem.objects.create(**validated_data)
+        itinerary_item.save()
         return itinerary_item
 
     def update(self, instance, validated_data):
@@ -206,74 +222,128 @@ class ItineraryItemSerializer(serializers.ModelSerializer):
         activity_data = validated_data.pop('activity', None)
 
         # Update the activity model corresponding to the instance's content_type.
-        if instance.content_type.model == 'meal':
-            models.Meal.objects.filter(id=instance.activity_id).update(**activity_data)
-        elif instance.content_type.model == 'note':
-            models.Note.objects.filter(id=instance.activity_id).update(**activity_data)
-        elif instance.content_type.model == 'break':
-            models.Break.objects.filter(id=instance.activity_id).update(**activity_data)
-        elif instance.content_type.model == 'travelevent':
-            models.TravelEvent.objects.filter(id=instance.activity_id).update(**activity_data)
-        elif instance.content_type.model == 'experience':
-            # No updates for Experience as they are immutable.
-            pass
-        else:
+        activity_type = registry.for_content_type_id(instance.content_type_id)
+        if activity_type is None:
             # If we encounter an unknown content_type.model, raise an error.
             raise serializers.ValidationError('Unknown activity type encountered during update.')
+        # Experiences are immutable, their type ignores updates
+        if activity_data and not activity_type.read_only:
+            activity_type.update(instance.activity_id, self.validated_activity(activity_type, activity_data))
 
         instance = super().update(instance, validated_data)
 
         return instance
 
+    def validated_activity(self, activity_type, activity_data):
+        """
+        Returns the validated `activity` data of an update, its errors are reported under `activity`.
+        """
+        try:
+            return activity_type.validate(activity_data)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({'activity': exc.detail})
+
+    def get_activity_serializer(self, activity):
+        """
+        Returns a serializer for the activity's model, reused across items so a
+        list of items doesn't build a new nested serializer per row.
+        """
+        if not hasattr(self, '_activity_serializers'):
+            self._activity_serializers = {}
+
+        model = type(activity)
+        if model not in self._activity_serializers:
+            activity_type = registry.for_model(model)
+            context = dict(self.context, nested=True)
+            self._activity_serializers[model] = activity_type.serializer_class(context=context) if activity_type else None
+        return self._activity_serializers[model]
+
     def get_activity(self, obj):
-        if isinstance(obj.activity, dest_models.Experience):
-            return dest_serializers.ExperienceSerializer(obj.activity).data
-        elif isinstance(obj.activity, models.Break):
-            return BreakSerializer(obj.activity).data
-        elif isinstance(obj.activity, models.TravelEvent):
-            return TravelEventSerializer(obj.activity).data
-        elif isinstance(obj.activity, models.Meal):
-            return MealSerializer(obj.activity).data
-        elif isinstance(obj.activity, models.Note):
-            return NoteSerializer(obj.activity).data
-        return None
+        # Lists should resolve activities in bulk with prefetch.prefetch_activities first
+        activity = obj.activity
+        if activity is None:
+            return None
+
+        serializer = self.get_activity_serializer(activity)
+        if serializer is None:
+            return None
+        return serializer.to_representation(activity)
+
+
+class ItineraryItemMoveSerializer(serializers.Serializer):
+    day = serializers.DateField(required=False)
+    after_id = serializers.UUIDField(required=False, allow_null=True)
+    before_id = serializers.UUIDField(required=False, allow_null=True)
 
 
 class ItineraryItemsBulkSerializer(serializers.ListSerializer):
     child = ItineraryItemSerializer()
 
     def create(self, validated_data):
-        print("Bulk create method called")
-        # Using Django's transaction.atomic to ensure atomic transactions
+        # Validate and build everything in memory first, the catalog lookups are served from the catalog cache
+        items = []
+        new_activities = defaultdict(list)
+        for item_data in validated_data:
+            item, activity_obj = self.child.build_itinerary_item(item_data)
+            if activity_obj._state.adding:
+                new_activities[registry.for_model(type(activity_obj))].append(activity_obj)
+            items.append(item)
+
+        # Then insert them with one statement per activity model and one for the items
         with transaction.atomic():
-            items = []
-            for item_data in validated_data:
-                item = self.child.create(item_data)
-                items.append(item)
-            return items
+            for activity_type, activities in new_activities.items():
+                activity_type.bulk_create(activities)
+            return models.ItineraryItem.objects.bulk_create(items)
 
     def update(self, instances, validated_data):
-        print("Bulk update method called")
+        trip_id = self.context.get('trip_id')
+        instances_by_id = {instance.id: instance for instance in instances}
+
         updated_instances = []
-        # TODO: Make sure this is an atomic transaction
+        item_fields = set()
+        activity_changes = defaultdict(dict)
         for attrs in validated_data:
-            instance = next(i for i in instances if i.id == attrs['id'])
+            attrs = dict(attrs)
+            instance = instances_by_id[attrs.pop('id')]
+            if instance.trip_id != trip_id:
+                raise serializers.ValidationError(
+                    "Mismatch between trip_id in URL and the ItineraryItem's associated trip."
+                )
+
+            # We don't want to modify the activity directly
+            activity_data = attrs.pop('activity', None)
+            activity_type = registry.for_content_type_id(instance.content_type_id)
+            if activity_type is None:
+                # If we encounter an unknown content_type.model, raise an error.
+                raise serializers.ValidationError('Unknown activity type encountered during update.')
+            # No updates for Experience as they are immutable.
+            if activity_data and not activity_type.read_only:
+                activity_changes[activity_type][instance.activity_id] = self.child.validated_activity(
+                    activity_type, activity_data)
+
+            item_fields.update(assign_fields(instance, attrs))
+            updated_instances.append(instance)
 
-            # Use the singleton serializer (child) to handle the update
-            serializer = self.child
-            updated_instance = serializer.update(instance, attrs)
-            updated_instances.append(updated_instance)
+        with transaction.atomic():
+            # One query to load and one bulk update per activity model
+            for activity_type, changes in activity_changes.items():
+                activity_type.bulk_update(changes)
+
+            # bulk_update doesn't run the auto_now of date_updated
+            now = timezone.now()
+            for instance in updated_instances:
+                instance.date_updated = now
+            models.ItineraryItem.objects.bulk_update(updated_instances, list(item_fields | {'date_updated'}))
 
         return updated_instances
 
 
 class ItineraryItemsBulkDeleteSerializer(serializers.Serializer):
-    ids = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+    ids = serializers.ListField(child=serializers.UUIDField())
 
     def to_internal_value(self, data):
-        # This method maps the direct list of IDs to the internal structure
-        # Expected by the rest of the serializer.
-        return {'ids': data}
+        # The request body is the list of ids itself
+        return super().to_internal_value({'ids': data})
 
     def validate_ids(self, value):
         """
@@ -287,4 +357,4 @@ class ItineraryItemsBulkDeleteSerializer(serializers.Serializer):
             raise serializers.ValidationError(
                 "One or more IDs are invalid, do not exist, or don't belong to the specified trip.")
 
-        return value
+        return list(existing_ids)
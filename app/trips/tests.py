@@ -1,3 +1,1209 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import datetime
+import decimal
+import io
+import json
+import re
+import uuid
+from collections import Counter
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import async_to_sync
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from common.profiling import sql_shape
+from common.renderers import ORJSONRenderer
+from custom_auth.models import User
+from destinations import models as dest_models
+from destinations import views as dest_views
+from destinations.cache import catalog
+from . import activities, authorization, documents, exports, models, ordering, serializers, views
+from .prefetch import prefetch_activities
+
+
+class ItineraryFixtureMixin:
+
+    def setUp(self):
+        catalog.invalidate()
+        self.user = User.objects.create_user(username='guest@example.com', email='guest@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.destination = dest_models.Destination.objects.create(name='Walt Disney World', disney_id='wdw')
+        self.park = dest_models.Location.objects.create(
+            name='Magic Kingdom',
+            disney_id='mk',
+            location_type=dest_models.Location.LocationType.THEME_PARK,
+            destination=self.destination,
+        )
+        self.land = dest_models.Land.objects.create(name='Adventureland', disney_id='adventureland', park=self.park)
+        self.experience = dest_models.Experience.objects.create(
+            name='Jungle Cruise',
+            disney_id='jungle-cruise',
+            destination=self.destination,
+            experience_type=dest_models.Experience.ExperienceType.ATTRACTION,
+        )
+        self.experience.lands.add(self.land)
+        self.experience.locations.add(self.park)
+
+    def new_items(self, trip, count):
+        kinds = ['experience', 'break', 'meal', 'travelevent', 'note']
+        activities = {
+            'break': {'location': str(self.park.id)},
+            'meal': {'meal_experience_id': str(self.experience.id), 'meal_type': 'lunch'},
+            'travelevent': {
+                'from_location_id': str(self.park.id), 'to_location_id': str(self.park.id), 'travel_type': 'park-hop',
+            },
+            'note': {'location_id': str(self.park.id), 'note': 'Fast pass'},
+        }
+        items = []
+        for position in range(count):
+            kind = kinds[position % len(kinds)]
+            item = {'trip': str(trip.id), 'day': '2024-01-02', 'activity_order': 1000 + position, 'content_type': kind}
+            if kind == 'experience':
+                item['activity_id'] = str(self.experience.id)
+            else:
+                item['activity'] = activities[kind]
+            items.append(item)
+        return items
+
+    def create_trip(self, item_count):
+        trip = models.Trip.objects.create(
+            title='Family trip',
+            created_by=self.user,
+            destination=self.destination,
+            start_date=datetime.date(2024, 1, 1),
+            end_date=datetime.date(2024, 1, 10),
+        )
+        for i in range(item_count):
+            # Cycle through every activity type
+            activity = [
+                lambda: self.experience,
+                lambda: models.Break.objects.create(location=self.park),
+                lambda: models.Meal.objects.create(meal_experience=self.experience, meal_type='lunch'),
+                lambda: models.TravelEvent.objects.create(
+                    from_location=self.park, to_location=self.park, travel_type='park-hop'
+                ),
+                lambda: models.Note.objects.create(location=self.park, land=self.land, note='Fast pass'),
+            ][i % 5]()
+            models.ItineraryItem.objects.create(
+                trip=trip,
+                activity_order=ordering.legacy_key(i),
+                day=datetime.date(2024, 1, 1 + i % 10),
+                activity_id=activity.id,
+                content_type=ContentType.objects.get_for_model(activity),
+            )
+        return trip
+
+
+class ItineraryQueryCountTests(ItineraryFixtureMixin, TestCase):
+    """
+    Guards against itinerary reads resolving activities, and the experiences nested in them, one item at a time.
+    """
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_itinerary_list_query_count_does_not_grow(self):
+        small_trip = self.create_trip(5)
+        large_trip = self.create_trip(150)
+        # Load the catalog cache so both reads start from the same state
+        self.count_queries('/destinations/destinations/')
+
+        few_queries, response = self.count_queries(f'/trips/trips/{small_trip.id}/itinerary-items/')
+        self.assertEqual(len(response.json()['results']), 5)
+
+        many_queries, response = self.count_queries(f'/trips/trips/{large_trip.id}/itinerary-items/')
+        self.assertEqual(len(response.json()['results']), 150)
+        self.assertEqual(few_queries, many_queries)
+
+        meals = [item['activity'] for item in response.json()['results'] if item['content_type'] == 'meal']
+        self.assertTrue(meals)
+        for meal in meals:
+            self.assertEqual(meal['meal_experience']['lands'][0]['id'], str(self.land.id))
+            self.assertEqual(meal['meal_experience']['locations'][0]['id'], str(self.park.id))
+
+
+class PaginationTests(ItineraryFixtureMixin, TestCase):
+    """
+    Trips are paginated with keyset queries, itineraries from their stored document in memory, or with keyset
+    queries when the response is shaped with ?fields=.
+    """
+
+    def get_pages(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            url = response.json()['next']
+        return pages
+
+    def assert_paginates(self, url, expected_ids):
+        pages = self.get_pages(url)
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+        self.assertEqual([row['id'] for page in pages for row in page['results']], expected_ids)
+        self.assertIsNone(pages[0]['previous'])
+        self.assertIsNone(pages[-1]['next'])
+        self.assertEqual(self.client.get(pages[2]['previous']).json()['results'], pages[1]['results'])
+        self.assertEqual(self.client.get(pages[1]['previous']).json()['results'], pages[0]['results'])
+
+    def assert_invalid_cursor(self, url, cursor):
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        self.assertEqual(self.client.get(f'{url}&cursor={encoded}').status_code, 404, cursor)
+
+    def test_trip_pages(self):
+        for day in (3, 1, 2, 1, 5):
+            trip = self.create_trip(0)
+            models.Trip.objects.filter(pk=trip.pk).update(start_date=datetime.date(2024, 1, day))
+        expected = [
+            str(pk) for pk in models.Trip.objects.order_by('start_date', 'id').values_list('id', flat=True)
+        ]
+        self.assert_paginates('/trips/trips/?page_size=2', expected)
+
+        for cursor in ({'k': ['nope', 'x']}, {'k': [1, 2]}, {'k': ['2024-01-01']}, {'k': 'x'}):
+            with self.subTest(cursor=cursor):
+                self.assert_invalid_cursor('/trips/trips/?page_size=2', cursor)
+
+    def test_itinerary_pages(self):
+        trip = self.create_trip(5)
+        models.ItineraryItem.objects.filter(trip=trip).update(day=datetime.date(2024, 1, 1))
+        expected = [
+            str(pk) for pk in models.ItineraryItem.objects.filter(trip=trip)
+            .order_by('day', 'activity_order', 'id').values_list('id', flat=True)
+        ]
+        # From the stored document, then from the tables
+        for query in ('page_size=2', 'page_size=2&fields=id,day,activity_order'):
+            url = f'/trips/trips/{trip.id}/itinerary-items/?{query}'
+            with self.subTest(url=url):
+                self.assert_paginates(url, expected)
+                for cursor in ({'k': [1, 2, 3]}, {'k': ['2024-01-01', 'i']}, {'k': ['2024-01-01', 'i', None]}):
+                    self.assert_invalid_cursor(url, cursor)
+
+
+class ResponseShapingTests(ItineraryFixtureMixin, TestCase):
+    """
+    ?fields= trims the top level objects, ?expand= chooses which nested objects are embedded rather than given as ids.
+    """
+
+    def get_results(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_trips(self):
+        self.create_trip(0)
+        [trip] = self.get_results('/trips/trips/?fields=id,title,destination')
+        self.assertEqual(set(trip), {'id', 'title', 'destination'})
+        self.assertEqual(trip['destination']['name'], 'Walt Disney World')
+
+        [trip] = self.get_results('/trips/trips/?expand=')
+        self.assertIn('start_date', trip)
+        self.assertEqual(trip['destination'], str(self.destination.id))
+
+        [trip] = self.get_results('/trips/trips/?expand=destination')
+        self.assertEqual(trip['destination']['id'], str(self.destination.id))
+
+    def test_itinerary_items(self):
+        trip = self.create_trip(5)
+        path = f'/trips/trips/{trip.id}/itinerary-items/'
+
+        items = self.get_results(path + '?fields=id,content_type,activity')
+        self.assertEqual({frozenset(item) for item in items}, {frozenset({'id', 'content_type', 'activity'})})
+        # ?fields= isn't applied to the nested activities
+        meal = next(item['activity'] for item in items if item['content_type'] == 'meal')
+        self.assertEqual(meal['meal_type'], 'lunch')
+        self.assertEqual(meal['meal_experience']['id'], str(self.experience.id))
+
+        for item in self.get_results(path + '?expand='):
+            self.assertEqual(item['activity'], item['activity_id'])
+
+        items = self.get_results(path + '?expand=activity')
+        meal = next(item['activity'] for item in items if item['content_type'] == 'meal')
+        self.assertEqual(meal['meal_experience'], str(self.experience.id))
+        break_activity = next(item['activity'] for item in items if item['content_type'] == 'break')
+        self.assertEqual(break_activity['location'], str(self.park.id))
+
+        items = self.get_results(path + '?expand=activity,meal_experience')
+        meal = next(item['activity'] for item in items if item['content_type'] == 'meal')
+        self.assertEqual(meal['meal_experience']['name'], 'Jungle Cruise')
+        self.assertEqual(meal['meal_experience']['lands'], [str(self.land.id)])
+
+
+class AsyncReadViewTests(ItineraryFixtureMixin, TestCase):
+    """
+    The async versions of the read views, served under ASGI, respond like their sync versions.
+    """
+
+    def get(self, view, path, headers=None, **kwargs):
+        request = APIRequestFactory().get(path, **(headers or {}))
+        force_authenticate(request, self.user)
+        if asyncio.iscoroutinefunction(view):
+            return async_to_sync(view)(request, **kwargs)
+        return view(request, **kwargs).render()
+
+    def assert_same_response(self, view_class, action, path, **kwargs):
+        actions = {'get': action} if hasattr(view_class, 'get_extra_actions') else {}
+        sync_response = self.get(view_class.as_view(actions) if actions else view_class.as_view(), path, **kwargs)
+        async_response = self.get(view_class.as_async_view(action), path, **kwargs)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        self.assertEqual(async_response.get('ETag'), sync_response.get('ETag'))
+        self.assertEqual(async_response.get('Vary'), sync_response.get('Vary'))
+        return async_response
+
+    def test_trip_and_itinerary_reads(self):
+        trip = self.create_trip(10)
+        response = self.assert_same_response(views.TripView, 'retrieve', f'/trips/trips/{trip.id}/', pk=trip.id)
+        self.assertEqual(response.status_code, 200)
+
+        path = f'/trips/trips/{trip.id}/itinerary-items/'
+        response = self.assert_same_response(views.ItineraryItemView, 'list', path, trip_id=trip.id)
+        self.assertEqual(len(json.loads(response.content)['results']), 10)
+        self.assert_same_response(views.ItineraryItemView, 'list', path + '?fields=id,activity', trip_id=trip.id)
+
+        not_modified = self.get(
+            views.ItineraryItemView.as_async_view('list'), path, {'HTTP_IF_NONE_MATCH': response['ETag']},
+            trip_id=trip.id,
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_other_users_trip_is_not_found(self):
+        trip = self.create_trip(1)
+        self.user = User.objects.create_user(username='other@example.com', email='other@example.com')
+        response = self.get(views.TripView.as_async_view('retrieve'), f'/trips/trips/{trip.id}/', pk=trip.id)
+        self.assertEqual(response.status_code, 404)
+
+    def test_catalog_reads(self):
+        self.assert_same_response(dest_views.DestinationListView, 'list', '/destinations/destinations/')
+        self.assert_same_response(
+            dest_views.ExperienceListView, 'list', f'/destinations/locations/{self.park.id}/experiences/',
+            loc_id=self.park.id,
+        )
+        self.assert_same_response(
+            dest_views.ExperienceDetailView, 'retrieve',
+            f'/destinations/locations/{self.park.id}/experiences/{self.experience.id}/',
+            loc_id=self.park.id, exp_id=self.experience.id,
+        )
+
+
+class ConditionalRequestTests(ItineraryFixtureMixin, TestCase):
+
+    def assert_revalidates(self, path, change):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        change()
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_trip_changes_invalidate_etags(self):
+        trip = self.create_trip(2)
+
+        def change_trip():
+            models.Trip.objects.filter(pk=trip.pk).update(last_content_update=timezone.now())
+
+        self.assert_revalidates(f'/trips/trips/{trip.id}/', change_trip)
+        self.assert_revalidates(f'/trips/trips/{trip.id}/itinerary-items/', change_trip)
+
+    def test_catalog_changes_invalidate_etags(self):
+        trip = self.create_trip(2)
+
+        def change_catalog():
+            self.experience.name = 'Jungle Cruise Reimagined'
+            self.experience.save()
+
+        self.assert_revalidates(f'/trips/trips/{trip.id}/', change_catalog)
+        self.assert_revalidates(f'/trips/trips/{trip.id}/itinerary-items/', change_catalog)
+
+    def test_etags_depend_on_the_negotiated_format(self):
+        trip = self.create_trip(2)
+        path = f'/trips/trips/{trip.id}/itinerary-items/'
+        json_response = self.client.get(path)
+        msgpack_response = self.client.get(path, HTTP_ACCEPT='application/msgpack')
+        self.assertNotEqual(json_response['ETag'], msgpack_response['ETag'])
+        self.assertIn('Accept', json_response['Vary'])
+
+        response = self.client.get(path, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=json_response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        response = self.client.get(path, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=msgpack_response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept', response['Vary'])
+
+    def test_etags_are_per_user(self):
+        trip = self.create_trip(1)
+        etag = self.client.get(f'/trips/trips/{trip.id}/')['ETag']
+
+        self.client.force_authenticate(User.objects.create_user(
+            username='staff@example.com', email='staff@example.com', is_staff=True,
+        ))
+        response = self.client.get(f'/trips/trips/{trip.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class OrderingTests(TestCase):
+
+    def test_key_between(self):
+        keys = [ordering.key_between()]
+        for _ in range(50):
+            keys.append(ordering.key_between(keys[-1], None))
+            keys.insert(0, ordering.key_between(None, keys[0]))
+            keys.insert(len(keys) // 2, ordering.key_between(keys[len(keys) // 2 - 1], keys[len(keys) // 2]))
+        self.assertEqual(keys, sorted(set(keys)))
+        self.assertTrue(all(ordering.is_valid_key(key) for key in keys))
+
+        self.assertEqual(ordering.key_between('0i', '1'), '0r')
+        self.assertLess(ordering.key_between(None, '01'), '01')
+        with self.assertRaises(ordering.NoRoomBetweenKeys):
+            ordering.key_between('i', 'i')
+        with self.assertRaises(ValueError):
+            ordering.key_between('j', 'i')
+
+    def test_legacy_and_evenly_spaced_keys(self):
+        keys = [ordering.legacy_key(position) for position in (0, 1, 9, 10, 35, 36, 1000, 10 ** 9)]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(ordering.legacy_key(-5), ordering.legacy_key(0))
+        self.assertEqual(ordering.legacy_key(10 ** 9), ordering.legacy_key(ordering.BASE ** 5 - 1))
+
+        for count in (1, 2, 35, 36, 500):
+            keys = ordering.evenly_spaced_keys(count)
+            self.assertEqual(len(keys), count)
+            self.assertEqual(keys, sorted(set(keys)))
+            self.assertTrue(all(ordering.is_valid_key(key) for key in keys))
+
+
+    def test_activity_order_field_reads_positions_of_older_clients(self):
+        field = serializers.ActivityOrderField()
+        for position in (5, '5', 10, '10', '-3'):
+            with self.subTest(position=position):
+                self.assertEqual(field.to_internal_value(position), ordering.legacy_key(int(position)))
+        self.assertEqual(field.to_internal_value('0i'), '0i')
+        for invalid in ('i0', 'I', '1.5', True, None):
+            with self.subTest(invalid=invalid), self.assertRaises(ValidationError):
+                field.to_internal_value(invalid)
+
+
+class ActivityOrderMigrationTests(TransactionTestCase):
+    """
+    Integer positions stored before activity_order held rank keys are converted by the migration changing its type.
+    """
+    before = [('trips', '0002_itinerarydocument')]
+    after = [('trips', '0003_activity_order_keys')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_positions_become_keys_that_keep_their_order(self):
+        old_apps = self.migrate(self.before)
+        Destination = old_apps.get_model('destinations', 'Destination')
+        Trip = old_apps.get_model('trips', 'Trip')
+        ItineraryItem = old_apps.get_model('trips', 'ItineraryItem')
+        ContentType = old_apps.get_model('contenttypes', 'ContentType')
+        User = old_apps.get_model('custom_auth', 'User')
+
+        trip = Trip.objects.create(
+            title='Family trip',
+            created_by=User.objects.create(username='guest@example.com', email='guest@example.com'),
+            destination=Destination.objects.create(name='Walt Disney World', disney_id='wdw'),
+            start_date=datetime.date(2024, 1, 1),
+            end_date=datetime.date(2024, 1, 10),
+        )
+        content_type, _ = ContentType.objects.get_or_create(app_label='trips', model='note')
+        positions = [2, 10, 1, 100]
+        for position in positions:
+            ItineraryItem.objects.create(
+                trip=trip, activity_order=position, day=datetime.date(2024, 1, 1), activity_id=uuid.uuid4(),
+                content_type=content_type, is_deleted=position == 100,
+            )
+
+        new_apps = self.migrate(self.after)
+        ItineraryItem = new_apps.get_model('trips', 'ItineraryItem')
+        keys = list(ItineraryItem.objects.order_by('activity_order').values_list('activity_order', flat=True))
+        self.assertEqual(keys, [ordering.legacy_key(position) for position in sorted(positions)])
+
+
+class MoveItineraryItemTests(ItineraryFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.trip = self.create_trip(4)
+        # Four items on the first day, ordered a, b, c, d
+        models.ItineraryItem.objects.filter(trip=self.trip).update(day=datetime.date(2024, 1, 1))
+        self.items = list(models.ItineraryItem.objects.filter(trip=self.trip).order_by('activity_order'))
+
+    def day_order(self, day=datetime.date(2024, 1, 1)):
+        items = models.ItineraryItem.objects.filter(trip=self.trip, day=day).order_by('activity_order', 'id')
+        return [self.items.index(item) for item in items]
+
+    def move(self, item, **data):
+        return self.client.post(f'/trips/itinerary-items/{item.id}/move/', data, format='json')
+
+    def test_move_within_and_across_days(self):
+        a, b, c, d = self.items
+        self.assertEqual(self.move(d, after_id=str(a.id)).status_code, 200)
+        self.assertEqual(self.day_order(), [0, 3, 1, 2])
+
+        self.assertEqual(self.move(a, before_id=str(c.id)).status_code, 200)
+        self.assertEqual(self.day_order(), [3, 1, 0, 2])
+
+        self.assertEqual(self.move(b, after_id=str(d.id), before_id=str(a.id)).status_code, 200)
+        self.assertEqual(self.day_order(), [3, 1, 0, 2])
+
+        response = self.move(c, day='2024-01-02')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['day'], '2024-01-02')
+        self.assertEqual(self.day_order(), [3, 1, 0])
+        self.assertEqual(self.day_order(datetime.date(2024, 1, 2)), [2])
+
+    def test_invalid_neighbours_are_rejected_without_rebalancing(self):
+        a, b, c, d = self.items
+        with mock.patch.object(ordering, 'rebalance_day') as rebalance_day:
+            self.assertEqual(self.move(a, day='2024-01-02', after_id=str(b.id)).status_code, 400)
+            self.assertEqual(self.move(a, after_id=str(d.id), before_id=str(b.id)).status_code, 400)
+            self.assertEqual(self.move(a, after_id=str(b.id), before_id=str(b.id)).status_code, 400)
+            self.assertEqual(self.move(a, after_id=str(a.id)).status_code, 400)
+        rebalance_day.assert_not_called()
+        self.assertEqual(self.day_order(), [0, 1, 2, 3])
+
+    def test_neighbours_sharing_a_key_are_rebalanced(self):
+        a, b, c, d = self.items
+        models.ItineraryItem.objects.filter(pk__in=[b.pk, c.pk]).update(activity_order=b.activity_order)
+        self.items = list(models.ItineraryItem.objects.filter(trip=self.trip).order_by('activity_order', 'id'))
+        first, second = self.items[1], self.items[2]
+
+        response = self.move(d, after_id=str(first.id), before_id=str(second.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.day_order(), [0, 1, 3, 2])
+        keys = list(models.ItineraryItem.objects.filter(trip=self.trip).values_list('activity_order', flat=True))
+        self.assertEqual(len(set(keys)), 4)
+
+    def test_rebalance_day_keeps_the_order(self):
+        for item in self.items:
+            item.activity_order += 'z' * ordering.REBALANCE_KEY_LENGTH
+        models.ItineraryItem.objects.bulk_update(self.items, ['activity_order'])
+
+        ordering.rebalance_day(self.trip.id, datetime.date(2024, 1, 1))
+        self.assertEqual(self.day_order(), [0, 1, 2, 3])
+        keys = models.ItineraryItem.objects.filter(trip=self.trip).values_list('activity_order', flat=True)
+        self.assertTrue(all(not ordering.needs_rebalance(key) for key in keys))
+
+
+class ExportTests(ItineraryFixtureMixin, TestCase):
+    """
+    Trip and user exports stream every item in each format, reading the items in batches.
+    """
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_trip_export_formats(self):
+        trip = self.create_trip(12)
+        self.create_trip(3)
+
+        lines = self.export(f'/trips/trips/{trip.id}/export/ndjson/').splitlines()
+        self.assertEqual(len(lines), 12)
+        self.assertEqual({json.loads(line)['trip'] for line in lines}, {str(trip.id)})
+
+        rows = list(csv.DictReader(io.StringIO(self.export(f'/trips/trips/{trip.id}/export/csv/'))))
+        self.assertEqual(len(rows), 12)
+        # Summarized by each activity type
+        self.assertEqual({row['activity'] for row in rows}, {
+            'Jungle Cruise', 'Break at Magic Kingdom', 'Lunch at Jungle Cruise',
+            'Park Hop: Magic Kingdom to Magic Kingdom', 'Fast pass',
+        })
+
+        calendar = self.export(f'/trips/trips/{trip.id}/export/ics/')
+        self.assertTrue(calendar.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(calendar.count('BEGIN:VEVENT'), 12)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in calendar.split('\r\n')))
+
+    def test_user_export_reads_items_in_batches(self):
+        self.create_trip(5)
+        self.create_trip(7)
+        self.client.get('/destinations/destinations/')
+
+        with mock.patch.object(exports, 'BATCH_SIZE', 4):
+            with CaptureQueriesContext(connection) as context:
+                lines = self.export('/trips/export/ndjson/').splitlines()
+        self.assertEqual(len(lines), 12)
+        # One cursor over the items, then each batch loads its activities with one query per activity model.
+        # On PostgreSQL the cursor is a server side one, declared with DECLARE ... CURSOR FOR SELECT
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(sum('SELECT "trips_itineraryitem"' in sql for sql in queries), 1)
+        self.assertLessEqual(sum(sql.startswith('SELECT "trips_') for sql in queries), 1 + 3 * 4)
+
+    def test_other_users_trip_and_unknown_format(self):
+        trip = self.create_trip(1)
+        self.assertEqual(self.client.get(f'/trips/trips/{trip.id}/export/pdf/').status_code, 404)
+
+        other = User.objects.create_user(username='other@example.com', email='other@example.com')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/trips/trips/{trip.id}/export/csv/').status_code, 404)
+        self.assertEqual(self.export('/trips/export/ndjson/'), '')
+
+
+class BulkItineraryTests(ItineraryFixtureMixin, TestCase):
+
+    def create_other_users_trip(self, item_count):
+        trip = self.create_trip(item_count)
+        trip.created_by = User.objects.create_user(username='other@example.com', email='other@example.com')
+        trip.save(update_fields=['created_by'])
+        return trip
+
+    def statements(self, context, verb):
+        """
+        Counts the `verb` (INSERT or UPDATE) statements of the captured queries by table.
+        """
+        pattern = re.compile(rf'^{verb} (?:INTO )?"(\w+)"')
+        return Counter(
+            match[1] for match in (pattern.match(query['sql']) for query in context.captured_queries) if match
+        )
+
+    def test_bulk_create_inserts_once_per_activity_model(self):
+        trip = self.create_trip(0)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(f'/trips/trips/{trip.id}/itinerary-items-bulk/', self.new_items(trip, 20),
+                                        format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 20)
+        self.assertEqual(self.statements(context, 'INSERT'), {
+            'trips_break': 1, 'trips_meal': 1, 'trips_travelevent': 1, 'trips_note': 1, 'trips_itineraryitem': 1,
+        })
+        self.assertEqual(models.ItineraryItem.objects.filter(trip=trip).count(), 20)
+        self.assertEqual(models.Note.objects.filter(note='Fast pass').count(), 4)
+
+    def test_bulk_update_updates_once_per_activity_model(self):
+        trip = self.create_trip(0)
+        response = self.client.post(f'/trips/trips/{trip.id}/itinerary-items-bulk/', self.new_items(trip, 20),
+                                    format='json')
+        epcot = dest_models.Location.objects.create(
+            name='EPCOT', disney_id='epcot', location_type=dest_models.Location.LocationType.THEME_PARK,
+            destination=self.destination,
+        )
+        activities = {
+            'break': {'location_id': str(epcot.id)},
+            'meal': {'meal_type': 'dinner'},
+            'travelevent': {'to_location_id': str(epcot.id)},
+            'note': {'note': 'Updated'},
+        }
+        changes = []
+        for item in response.json():
+            change = {key: item[key] for key in ('id', 'trip', 'day', 'activity_order', 'content_type', 'activity_id')}
+            change.update(day='2024-01-03', note='Updated')
+            if item['content_type'] in activities:
+                change['activity'] = activities[item['content_type']]
+            changes.append(change)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.put(f'/trips/trips/{trip.id}/itinerary-items-bulk/', changes, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statements(context, 'UPDATE'), {
+            'trips_break': 1, 'trips_meal': 1, 'trips_travelevent': 1, 'trips_note': 1, 'trips_itineraryitem': 1,
+        })
+        self.assertEqual(models.ItineraryItem.objects.filter(trip=trip, day='2024-01-03', note='Updated').count(), 20)
+        self.assertEqual(models.Break.objects.filter(location=epcot).count(), 4)
+        self.assertEqual(models.Meal.objects.filter(meal_type='dinner').count(), 4)
+        self.assertEqual(models.TravelEvent.objects.filter(to_location=epcot).count(), 4)
+        self.assertEqual(models.Note.objects.filter(note='Updated').count(), 4)
+
+    def test_bulk_update_validates_activities(self):
+        trip = self.create_trip(0)
+        response = self.client.post(f'/trips/trips/{trip.id}/itinerary-items-bulk/', self.new_items(trip, 5),
+                                    format='json')
+        items = {item['content_type']: item for item in response.json()}
+
+        def update(kind, activity):
+            item = items[kind]
+            change = {key: item[key] for key in ('id', 'trip', 'day', 'activity_order', 'content_type', 'activity_id')}
+            change['activity'] = activity
+            return self.client.put(f'/trips/trips/{trip.id}/itinerary-items-bulk/', [change], format='json')
+
+        invalid = [
+            ('meal', {'meal_type': 'brunch'}, 'meal_type'),
+            ('meal', {'meal_experience_id': str(uuid.uuid4())}, 'meal_experience_id'),
+            ('break', {'location_id': str(uuid.uuid4())}, 'location_id'),
+            ('note', {'note': 'Updated', 'colour': 'red'}, 'colour'),
+            ('note', {'note': 'Updated', 'location_id': str(uuid.uuid4())}, 'location'),
+            ('travelevent', {'travel_type': 'teleport'}, 'travel_type'),
+        ]
+        for kind, activity, field in invalid:
+            with self.subTest(kind=kind, activity=activity):
+                response = update(kind, activity)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.json()['activity'])
+        self.assertFalse(models.Meal.objects.exclude(meal_type='lunch').exists())
+        self.assertFalse(models.Note.objects.exclude(note='Fast pass').exists())
+
+        # Foreign keys are accepted by their column name, as on create
+        response = update('note', {'note': 'Updated', 'location_id': str(self.park.id), 'land_id': str(self.land.id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(models.Note.objects.get().land, self.land)
+
+    def permission_queries(self, method, trip, payload):
+        """
+        Returns the number of queries the permission checks of a bulk request ran.
+        """
+        counts = []
+
+        def authorize_ids(*args):
+            with CaptureQueriesContext(connection) as context:
+                try:
+                    return authorize(*args)
+                finally:
+                    counts.append(len(context.captured_queries))
+
+        authorize = authorization.authorize_ids
+        with mock.patch.object(authorization, 'authorize_ids', authorize_ids):
+            response = getattr(self.client, method)(
+                f'/trips/trips/{trip.id}/itinerary-items-bulk/', payload, format='json')
+        self.assertIn(response.status_code, (200, 204))
+        return sum(counts)
+
+    def test_bulk_permission_checks_dont_grow_with_the_payload(self):
+        # One query for the trip, and one for the items of a delete
+        for method, expected in (('put', 1), ('delete', 2)):
+            with self.subTest(method=method):
+                queries = []
+                for item_count in (2, 30):
+                    trip = self.create_trip(item_count)
+                    items = models.ItineraryItem.objects.filter(trip=trip)
+                    if method == 'put':
+                        payload = []
+                        for item in items.select_related('content_type'):
+                            change = {
+                                'id': str(item.id), 'trip': str(trip.id), 'day': '2024-01-03',
+                                'activity_order': item.activity_order, 'content_type': item.content_type.model,
+                                'activity_id': str(item.activity_id),
+                            }
+                            if item.content_type.model == 'note':
+                                change['activity'] = {'note': 'Updated'}
+                            payload.append(change)
+                    else:
+                        payload = [str(pk) for pk in items.values_list('id', flat=True)]
+                    queries.append(self.permission_queries(method, trip, payload))
+                self.assertEqual(queries, [expected, expected])
+
+    def test_bulk_requests_on_other_users_or_unknown_trips(self):
+        trip = self.create_other_users_trip(2)
+        items = [str(pk) for pk in models.ItineraryItem.objects.filter(trip=trip).values_list('id', flat=True)]
+        for trip_id, status_code in ((trip.id, 403), (uuid.uuid4(), 404)):
+            for method, payload in (('put', []), ('delete', items)):
+                with self.subTest(trip_id=trip_id, method=method):
+                    response = getattr(self.client, method)(
+                        f'/trips/trips/{trip_id}/itinerary-items-bulk/', payload, format='json')
+                    self.assertEqual(response.status_code, status_code)
+        self.assertEqual(models.ItineraryItem.objects.filter(trip=trip).count(), 2)
+
+    def test_authorize_ids(self):
+        request = mock.Mock(user=self.user)
+        own = list(models.ItineraryItem.objects.filter(trip=self.create_trip(3)).values_list('id', flat=True))
+        other = list(
+            models.ItineraryItem.objects.filter(trip=self.create_other_users_trip(1)).values_list('id', flat=True))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(authorization.authorize_ids(request, models.ItineraryItem, own), set(own))
+        with self.assertNumQueries(1), self.assertRaises(PermissionDenied):
+            authorization.authorize_ids(request, models.ItineraryItem, own + other)
+        with self.assertNumQueries(1), self.assertRaises(NotFound):
+            authorization.authorize_ids(request, models.ItineraryItem, own + [uuid.uuid4()])
+        with self.assertNumQueries(0), self.assertRaises(NotFound):
+            authorization.authorize_ids(request, models.ItineraryItem, ['not-an-id'])
+
+    def test_bulk_delete_only_deletes_the_users_items_of_the_trip(self):
+        trip = self.create_trip(2)
+        other_item = models.ItineraryItem.objects.get(trip=self.create_other_users_trip(1))
+
+        response = self.client.delete(f'/trips/trips/{trip.id}/itinerary-items-bulk/', [str(other_item.id)],
+                                      format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(models.ItineraryItem.objects.filter(pk=other_item.pk).exists())
+
+        for ids in (['not-an-id'], {'ids': []}):
+            response = self.client.delete(f'/trips/trips/{trip.id}/itinerary-items-bulk/', ids, format='json')
+            self.assertEqual(response.status_code, 400)
+
+        items = [str(pk) for pk in models.ItineraryItem.objects.filter(trip=trip).values_list('id', flat=True)]
+        response = self.client.delete(f'/trips/trips/{trip.id}/itinerary-items-bulk/', items, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(models.ItineraryItem.objects.filter(trip=trip).exists())
+        self.assertTrue(models.ItineraryItem.objects.filter(pk=other_item.pk).exists())
+
+
+class ActivityRegistryTests(ItineraryFixtureMixin, TestCase):
+
+    def test_every_type_resolves_its_content_type(self):
+        registry = activities.registry
+        self.assertEqual(
+            {activity_type.name for activity_type in registry}, {'experience', 'break', 'meal', 'travelevent', 'note'},
+        )
+        for activity_type in registry:
+            content_type = ContentType.objects.get_for_model(activity_type.model)
+            self.assertEqual(activity_type.content_type, content_type)
+            self.assertIs(registry.get(activity_type.name.upper()), activity_type)
+            self.assertIs(registry.for_model(activity_type.model), activity_type)
+            self.assertIs(registry.for_content_type_id(content_type.id), activity_type)
+        self.assertIsNone(registry.get('spaceship'))
+        self.assertIsNone(registry.for_model(models.Trip))
+        self.assertIsNone(registry.for_content_type_id(ContentType.objects.get_for_model(models.Trip).id))
+
+    def test_content_types_are_loaded_once(self):
+        activities.registry.clear_cache()
+        with self.assertNumQueries(1):
+            for activity_type in activities.registry:
+                activity_type.content_type
+                activities.registry.for_content_type_id(activity_type.content_type.id)
+
+    def test_create_dispatches_every_type(self):
+        trip = self.create_trip(0)
+        items = self.new_items(trip, 5)
+        response = self.client.post(f'/trips/trips/{trip.id}/itinerary-items-bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        for item, created in zip(items, response.json()):
+            self.assertEqual(created['content_type'], item['content_type'])
+            activity_type = activities.registry.get(item['content_type'])
+            created = models.ItineraryItem.objects.get(pk=created['id'])
+            self.assertEqual(created.content_type_id, activity_type.content_type.id)
+            self.assertIsInstance(created.activity, activity_type.model)
+
+    def test_unknown_type_is_rejected(self):
+        trip = self.create_trip(0)
+        item = self.new_items(trip, 2)[1]
+        item.update(content_type='spaceship', activity_content_type='spaceship')
+
+        # The single item endpoint resolves activity_content_type, the bulk one content_type
+
+        response = self.client.post(f'/trips/trips/{trip.id}/itinerary-items/', item, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(f'/trips/trips/{trip.id}/itinerary-items-bulk/', [item], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(models.ItineraryItem.objects.filter(trip=trip).exists())
+        self.assertFalse(models.Break.objects.exists())
+
+
+class ItineraryDocumentTests(ItineraryFixtureMixin, TransactionTestCase):
+    """
+    Documents are patched by on_commit callbacks, which only run outside of TestCase's wrapping transaction.
+    """
+
+    def add_item(self, trip, day):
+        item = {
+            'trip': str(trip.id),
+            'day': day,
+            'activity_order': 1000,
+            'content_type': 'experience',
+            'activity_id': str(self.experience.id),
+        }
+        response = self.client.post(f'/trips/trips/{trip.id}/itinerary-items-bulk/', [item], format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_document_is_built_then_patched_on_commit(self):
+        trip = self.create_trip(3)
+        document = documents.get_document(trip.id, self.user)
+        self.assertEqual(len(document.items), 3)
+        self.assertEqual(document.version, trip.last_content_update)
+
+        with mock.patch.object(documents, 'build_document', wraps=documents.build_document) as build_document:
+            self.add_item(trip, '2024-01-02')
+        build_document.assert_not_called()
+
+        trip.refresh_from_db()
+        document.refresh_from_db()
+        self.assertEqual(document.version, trip.last_content_update)
+        self.assertEqual(len(document.days['2024-01-02']), 2)
+        self.assertEqual(documents.check_document(trip), [])
+
+    def test_stale_document_is_rebuilt_after_a_missed_write(self):
+        trip = self.create_trip(2)
+        documents.get_document(trip.id, self.user)
+        models.Trip.objects.filter(pk=trip.pk).update(last_content_update=datetime.datetime(
+            2024, 1, 1, tzinfo=datetime.timezone.utc))
+
+        with mock.patch.object(documents, 'build_document', wraps=documents.build_document) as build_document:
+            self.add_item(trip, '2024-01-05')
+        build_document.assert_called_once()
+        trip.refresh_from_db()
+        self.assertEqual(documents.check_document(trip), [])
+
+    def test_catalog_change_rebuilds_document(self):
+        trip = self.create_trip(1)
+        document = documents.get_document(trip.id, self.user)
+        self.assertEqual(document.items[0]['activity']['name'], 'Jungle Cruise')
+
+        self.experience.name = "Jungle Cruise: Who's the Boss?"
+        self.experience.save()
+        self.assertIn("Catalog version", documents.check_document(trip)[0])
+
+        document = documents.get_document(trip.id, self.user)
+        self.assertEqual(document.items[0]['activity']['name'], "Jungle Cruise: Who's the Boss?")
+        self.assertEqual(document.catalog_version, dest_models.CatalogVersion.current())
+        self.assertEqual(documents.check_document(trip), [])
+
+    def test_check_itinerary_documents(self):
+        trip = self.create_trip(2)
+        documents.get_document(trip.id, self.user)
+        call_command('check_itinerary_documents', stdout=io.StringIO())
+
+        models.ItineraryDocument.objects.filter(trip=trip).update(days={})
+        output = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('check_itinerary_documents', stdout=output)
+        self.assertIn(f"{trip.id}: Day 2024-01-01 doesn't match the itinerary items.", output.getvalue())
+
+        call_command('check_itinerary_documents', '--fix', stdout=io.StringIO())
+        call_command('check_itinerary_documents', str(trip.id), stdout=io.StringIO())
+
+
+class TripContentBumpTests(ItineraryFixtureMixin, TransactionTestCase):
+    """
+    Trips are bumped by on_commit callbacks, which only run outside of TestCase's wrapping transaction.
+    """
+
+    def trip_updates(self, context):
+        return sum(query['sql'].startswith('UPDATE "trips_trip"') for query in context.captured_queries)
+
+    def test_changes_in_a_transaction_bump_each_trip_once_on_commit(self):
+        trip, other_trip = self.create_trip(1), self.create_trip(1)
+
+        with CaptureQueriesContext(connection) as context:
+            with transaction.atomic():
+                for day in ('2024-01-01', '2024-01-02', '2024-01-01'):
+                    documents.record_itinerary_change(trip.id, [day])
+                documents.record_itinerary_change(other_trip.id, ['2024-01-03'])
+                self.assertEqual(self.trip_updates(context), 0)
+        self.assertEqual(self.trip_updates(context), 2)
+
+        for changed in (trip, other_trip):
+            previous = changed.last_content_update
+            changed.refresh_from_db()
+            self.assertGreater(changed.last_content_update, previous)
+
+    def test_rolled_back_changes_dont_bump_the_trip(self):
+        trip = self.create_trip(1)
+
+        with CaptureQueriesContext(connection) as context:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                documents.record_itinerary_change(trip.id, ['2024-01-01'])
+                documents.record_itinerary_change(trip.id, ['2024-01-02'])
+                raise RuntimeError
+        self.assertEqual(self.trip_updates(context), 0)
+        self.assertEqual(models.Trip.objects.get(pk=trip.pk).last_content_update, trip.last_content_update)
+
+        # The next transaction queues a callback of its own
+        with CaptureQueriesContext(connection) as context, transaction.atomic():
+            documents.record_itinerary_change(trip.id, ['2024-01-01'])
+        self.assertEqual(self.trip_updates(context), 1)
+
+    def test_bulk_update_bumps_the_trip_once(self):
+        trip = self.create_trip(10)
+        changes = []
+        for item in models.ItineraryItem.objects.filter(trip=trip).select_related('content_type'):
+            change = {
+                'id': str(item.id), 'trip': str(trip.id), 'day': '2024-01-05', 'activity_order': item.activity_order,
+                'content_type': item.content_type.model, 'activity_id': str(item.activity_id), 'note': 'Moved',
+            }
+            if item.content_type.model == 'note':
+                change['activity'] = {'note': 'Moved'}
+            changes.append(change)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.put(f'/trips/trips/{trip.id}/itinerary-items-bulk/', changes, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.trip_updates(context), 1)
+
+
+class PurgeDeletedTests(ItineraryFixtureMixin, TestCase):
+
+    def test_only_rows_deleted_before_the_cutoff_are_purged(self):
+        trip = self.create_trip(4)
+        old_deleted, recent_deleted, old_live, live = models.ItineraryItem.objects.filter(trip=trip).order_by('day')
+        models.ItineraryItem.all_objects.filter(pk__in=[old_deleted.pk, recent_deleted.pk]).soft_delete()
+        long_ago = timezone.now() - datetime.timedelta(days=31)
+        models.ItineraryItem.all_objects.filter(pk__in=[old_deleted.pk, old_live.pk]).update(date_updated=long_ago)
+
+        stdout = io.StringIO()
+        call_command('purge_deleted', 'trips.ItineraryItem', days=30, batch_size=1, stdout=stdout)
+
+        self.assertIn('trips.ItineraryItem: purged 1 row(s).', stdout.getvalue())
+        self.assertEqual(
+            set(models.ItineraryItem.all_objects.filter(trip=trip).values_list('pk', flat=True)),
+            {recent_deleted.pk, old_live.pk, live.pk},
+        )
+
+    def age(self, queryset):
+        queryset.update(date_updated=timezone.now() - datetime.timedelta(days=31))
+
+    def purge(self, *labels):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('purge_deleted', *labels, days=30, stdout=io.StringIO())
+
+    def test_deleting_an_activity_deletes_its_items(self):
+        trip = self.create_trip(2)
+        item = models.ItineraryItem.objects.get(trip=trip, content_type__model='break')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/trips/itinerary-items/{item.id}/breaks/{item.activity_id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(models.ItineraryItem.objects.filter(pk=item.pk).exists())
+        self.assertGreater(models.Trip.objects.get(pk=trip.pk).last_content_update, trip.last_content_update)
+
+        self.age(models.Break.all_objects.filter(pk=item.activity_id))
+        self.purge('trips.Break')
+        self.assertFalse(models.Break.all_objects.filter(pk=item.activity_id).exists())
+
+    def test_activities_of_live_items_are_kept(self):
+        trip = self.create_trip(2)
+        item = models.ItineraryItem.objects.get(trip=trip, content_type__model='break')
+        models.Break.objects.filter(pk=item.activity_id).soft_delete()
+        self.age(models.Break.all_objects.filter(pk=item.activity_id))
+
+        self.purge('trips.Break')
+        self.assertTrue(models.Break.all_objects.filter(pk=item.activity_id).exists())
+        self.assertTrue(models.ItineraryItem.objects.filter(pk=item.pk).exists())
+
+    def test_cascaded_items_update_their_itinerary(self):
+        trip = self.create_trip(0)
+        epcot = dest_models.Location.objects.create(
+            name='EPCOT', disney_id='epcot', location_type=dest_models.Location.LocationType.THEME_PARK,
+            destination=self.destination,
+        )
+        item = models.ItineraryItem.objects.create(
+            trip=trip, activity_order='i', day=datetime.date(2024, 1, 2),
+            activity_id=models.Break.objects.create(location=epcot).id,
+            content_type=ContentType.objects.get_for_model(models.Break),
+        )
+        documents.get_document(trip.id, self.user)
+        epcot.delete()
+        self.age(dest_models.Location.all_objects.filter(pk=epcot.pk))
+
+        self.purge('destinations.Location')
+        self.assertFalse(models.ItineraryItem.all_objects.filter(pk=item.pk).exists())
+        trip.refresh_from_db()
+        document = models.ItineraryDocument.objects.get(trip=trip)
+        self.assertEqual(document.version, trip.last_content_update)
+        self.assertEqual(document.items, [])
+
+    def test_unknown_and_not_soft_deletable_models_are_rejected(self):
+        for label in ('trips.Spaceship', 'trips.ItineraryDocument'):
+            with self.subTest(label=label), self.assertRaises(CommandError):
+                call_command('purge_deleted', label, stdout=io.StringIO())
+
+
+class RequestProfileTests(ItineraryFixtureMixin, TestCase):
+
+    def test_server_timing_reports_queries_serialization_and_rendering(self):
+        trip = self.create_trip(3)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/trips/trips/{trip.id}/')
+        self.assertEqual(response.status_code, 200)
+
+        metrics = {metric.split(';')[0]: metric for metric in response['Server-Timing'].split(', ')}
+        self.assertEqual(set(metrics), {'db', 'serialize', 'render', 'total'})
+        self.assertIn(f'desc="{len(context.captured_queries)} queries"', metrics['db'])
+
+    @override_settings(REQUEST_QUERY_BUDGET=1, REQUEST_TIME_BUDGET=None)
+    def test_requests_over_budget_are_logged(self):
+        trip = self.create_trip(3)
+        with self.assertLogs('common.middleware', 'WARNING') as logs:
+            self.client.get(f'/trips/trips/{trip.id}/')
+        self.assertIn(f'GET /trips/trips/{trip.id}/ (trips.views.TripView)', logs.output[0])
+
+        with self.assertNoLogs('common.middleware', 'WARNING'):
+            with override_settings(REQUEST_QUERY_BUDGET=100):
+                self.client.get(f'/trips/trips/{trip.id}/')
+
+    def test_sql_shape(self):
+        self.assertEqual(
+            sql_shape('SELECT * FROM "t" WHERE "t"."id" IN (%s, %s, %s) AND "t"."kind" = \'a\' LIMIT 21'),
+            sql_shape('SELECT * FROM "t" WHERE "t"."id" IN (%s, %s) AND "t"."kind" = \'b\' LIMIT 1'),
+        )
+
+
+class RendererTests(ItineraryFixtureMixin, TestCase):
+
+    def test_json_is_rendered_like_drf(self):
+        trip = self.create_trip(5)
+        items = serializers.ItineraryItemSerializer(
+            prefetch_activities(models.ItineraryItem.objects.filter(trip=trip)), many=True,
+        ).data
+        data = {
+            'items': items,
+            'id': uuid.uuid4(),
+            'created': datetime.datetime(2024, 1, 1, 8, 30, 15, 120000, tzinfo=datetime.timezone.utc),
+            'offset': datetime.datetime(2024, 1, 1, 8, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=-5))),
+            'naive': datetime.datetime(2024, 1, 1, 8, 30),
+            'day': datetime.date(2024, 1, 1),
+            'time': datetime.time(9, 15, 30, 500),
+            'price': decimal.Decimal('12.50'),
+            'label': gettext_lazy('Magic Kingdom'),
+            'text': 'Caf\u00e9 \U0001f3f0 line\u2028break',
+            'large': 2 ** 70,
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_msgpack_responses(self):
+        trip = self.create_trip(5)
+        path = f'/trips/trips/{trip.id}/itinerary-items/?fields=id,trip,day,start_time,activity'
+        response = self.client.get(path, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), json.loads(self.client.get(path).content))
+
+    def test_msgpack_requests(self):
+        trip = self.create_trip(1)
+        body = {
+            'title': 'Park hopping',
+            'destination_id': str(self.destination.id),
+            'start_date': '2024-01-01',
+            'end_date': '2024-01-10',
+        }
+        response = self.client.generic('PUT', f'/trips/trips/{trip.id}/', msgpack.packb(body),
+                                       content_type='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        trip.refresh_from_db()
+        self.assertEqual(trip.title, 'Park hopping')
+
+        response = self.client.generic('PATCH', f'/trips/trips/{trip.id}/', b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+
+
+class QueryPlanTests(ItineraryFixtureMixin, TestCase):
+    """
+    Runs EXPLAIN on the queries behind the trip, itinerary and catalog endpoints and purge_deleted, and fails if one
+    would read a whole table. Sequential scans are disabled so the planner only falls back to one when no index matches,
+    which keeps the result independent of how much data is seeded. Needs PostgreSQL, the local sqlite setup skips it.
+    """
+
+    def setUp(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Query plans are only checked on PostgreSQL.')
+        super().setUp()
+
+        # Trips of two users, with deleted trips and items the endpoints must filter out
+        other_user = User.objects.create_user(username='other@example.com', email='other@example.com')
+        trips = [self.create_trip(10) for _ in range(20)]
+        models.Trip.objects.filter(pk__in=[trip.pk for trip in trips[::2]]).update(created_by=other_user)
+        models.Trip.objects.filter(pk__in=[trip.pk for trip in trips[::5]]).update(is_deleted=True)
+        models.ItineraryItem.objects.filter(activity_order=ordering.legacy_key(9)).update(is_deleted=True)
+        self.trip = trips[1]
+        self.item = models.ItineraryItem.objects.filter(
+            trip=self.trip, content_type=ContentType.objects.get_for_model(models.Break),
+        ).first()
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute('SET enable_seqscan = off')
+        self.addCleanup(self.reset_seqscan)
+        # Load the catalog cache, its full table loads aren't an endpoint's query
+        self.client.get('/destinations/destinations/')
+
+    def reset_seqscan(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assert_indexed(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertNotIn('Seq Scan', plan, f'{sql}\n\n{plan}')
+
+    def assert_endpoint_indexed(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        selects = [query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        for sql in selects:
+            with self.subTest(url=url, sql=sql):
+                self.assert_indexed(sql)
+
+    def test_trip_queries_use_indexes(self):
+        self.assert_endpoint_indexed('/trips/trips/')
+        self.assert_endpoint_indexed(f'/trips/trips/{self.trip.id}/')
+
+    def test_itinerary_queries_use_indexes(self):
+        # The stored document, then the live queryset that ?fields= switches to
+        self.assert_endpoint_indexed(f'/trips/trips/{self.trip.id}/itinerary-items/')
+        self.assert_endpoint_indexed(f'/trips/trips/{self.trip.id}/itinerary-items/?fields=id,content_type,activity')
+        self.assert_endpoint_indexed(f'/trips/itinerary-items/{self.item.id}/')
+
+    def test_activity_lookup_uses_index(self):
+        queryset = models.ItineraryItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(models.Break),
+            activity_id=self.item.activity_id,
+        )
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, plan)
+
+    def test_purge_queries_use_indexes(self):
+        cutoff = timezone.now()
+        for model in (models.Trip, models.ItineraryItem, models.Break, dest_models.Experience):
+            with self.subTest(model=model):
+                queryset = model.all_objects.filter(is_deleted=True, date_updated__lt=cutoff)
+                plan = queryset.values_list('pk', flat=True)[:500].explain()
+                self.assertIn(f'{model._meta.model_name}_purge_idx', plan, plan)
+
+    def test_catalog_queries_use_indexes(self):
+        self.assert_endpoint_indexed('/destinations/destinations/')
+        self.assert_endpoint_indexed(f'/destinations/locations/{self.park.id}/experiences/')
+
+    def test_search_queries_use_trigram_indexes(self):
+        # Enough names that reading all of them costs more than the trigram index
+        dest_models.Experience.objects.bulk_create(
+            dest_models.Experience(
+                name=f'Experience {i}', disney_id=f'experience-{i}', destination_id=self.destination.id,
+                experience_type=dest_models.Experience.ExperienceType.ATTRACTION,
+            )
+            for i in range(5000)
+        )
+        with connection.cursor() as cursor:
+            # Rows just inserted wait in the pending list of a GIN index, which the planner counts against it
+            for index in ('experience_name_trgm_idx', 'experience_short_trgm_idx'):
+                cursor.execute('SELECT gin_clean_pending_list(%s::regclass)', [index])
+            cursor.execute('ANALYZE')
+        url = f'/destinations/destinations/{self.destination.id}/search/?q=jungel'
+        self.assert_endpoint_indexed(url)
+
+        # Scanning all of experience_name_idx isn't a Seq Scan either, names must be matched by their trigram index
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        sql = next(
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT "destinations_experience"."id"') and 'WORD_SIMILARITY' in query['sql']
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('experience_name_trgm_idx', plan, f'{sql}\n\n{plan}')
+        self.assertIn('experience_short_trgm_idx', plan, f'{sql}\n\n{plan}')
@@ -1,20 +1,30 @@
 from django.urls import path
+
+from common.async_views import read_view
 from . import views
 
 urlpatterns = [
     path('trips/', views.TripView.as_view({'get': 'list', 'post': 'create'}), name='trip-list'),
-    path('trips/<uuid:pk>/', views.TripView.as_view(
-            {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}),
+    path('trips/<uuid:pk>/', read_view(
+            views.TripView.as_view(
+                {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}),
+            views.TripView.as_async_view('retrieve')),
         name='trip-detail'),
-    path('trips/<uuid:trip_id>/itinerary-items/',
-         views.ItineraryItemView.as_view({'get': 'list', 'post': 'create'}),
+    path('trips/<uuid:trip_id>/itinerary-items/', read_view(
+            views.ItineraryItemView.as_view({'get': 'list', 'post': 'create'}),
+            views.ItineraryItemView.as_async_view('list')),
          name='itinerary-item-list'),
+    path('trips/<uuid:trip_id>/export/<str:export_format>/', views.ItineraryExportView.as_view(),
+         name='trip-export'),
+    path('export/<str:export_format>/', views.ItineraryExportView.as_view(), name='itinerary-export'),
     path('trips/<uuid:trip_id>/itinerary-items-bulk/',
          views.ItineraryItemBulkView.as_view(),
          name='itinerary-items-bulk'),
     path('itinerary-items/<uuid:pk>/', views.ItineraryItemView.as_view(
             {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}),
         name='itinerary-item-detail'),
+    path('itinerary-items/<uuid:pk>/move/', views.ItineraryItemView.as_view({'post': 'move'}),
+         name='itinerary-item-move'),
     path('itinerary-items/<uuid:itinerary_item_pk>/breaks/<uuid:pk>/', views.BreakView.as_view(), name='break-detail'),
     path('itinerary-items/<uuid:itinerary_item_pk>/travel-events/<uuid:pk>/', views.TravelEventView.as_view(),
          name='travel-event-detail'),
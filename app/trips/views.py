@@ -1,79 +1,129 @@
+import asyncio
+import uuid
+
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, generics, permissions, status
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from django.utils import timezone
-from django.contrib.contenttypes.models import ContentType
+from django.utils.decorators import method_decorator
 from rest_framework.views import APIView
 from django.db import transaction
-from rest_framework.exceptions import NotFound
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 
-from . import models, serializers, filters
+from common.async_views import AsyncReadMixin
+from common.serializers import get_query_param_set, is_expanded
+from destinations.cache import catalog
+from . import models, serializers, filters, documents, ordering, authorization, exports
+from .activities import registry
+from .documents import record_itinerary_change
+from .pagination import TripPagination, ItineraryItemPagination
+from .conditional import trip_condition, itinerary_condition, async_trip_condition, async_itinerary_condition
+from .prefetch import prefetch_activities
 
 
-class TripView(viewsets.ModelViewSet):
+class TripView(AsyncReadMixin, authorization.OwnedObjectMixin, viewsets.ModelViewSet):
     serializer_class = serializers.TripSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TripPagination
 
     def get_queryset(self):
         """
         This view should return a list of all the trips
         for the currently authenticated user, or for staff/admin.
         """
-        user = self.request.user
-        if user.is_staff or user.is_superuser:
-            return models.Trip.objects.all()
-
-        return models.Trip.objects.filter(created_by=user)
+        queryset = models.Trip.objects.all()
+        if is_expanded(self.request, 'destination'):
+            queryset = queryset.select_related('destination')
 
-    def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        return authorization.owned_by(queryset, self.request.user)
 
-    def update(self, request, *args, **kwargs):
-        instance = self.get_object()
-        if instance.created_by != request.user and not request.user.is_staff and not request.user.is_superuser:
-            return Response(status=status.HTTP_403_FORBIDDEN)
-        return super().update(request, *args, **kwargs)
+    @method_decorator(trip_condition)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
-    def partial_update(self, request, *args, **kwargs):
-        instance = self.get_object()
-        if instance.created_by != request.user and not request.user.is_staff and not request.user.is_superuser:
-            return Response(status=status.HTTP_403_FORBIDDEN)
-        return super().partial_update(request, *args, **kwargs)
+    @async_trip_condition
+    async def async_retrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
 
-    def destroy(self, request, *args, **kwargs):
-        instance = self.get_object()
-        if instance.created_by != request.user and not request.user.is_staff and not request.user.is_superuser:
-            return Response(status=status.HTTP_403_FORBIDDEN)
-        return super().destroy(request, *args, **kwargs)
+    def perform_create(self, serializer):
+        serializer.save(created_by_id=self.request.user.pk)
 
 
-class ItineraryItemView(viewsets.ModelViewSet):
+class ItineraryItemView(AsyncReadMixin, authorization.OwnedObjectMixin, viewsets.ModelViewSet):
     serializer_class = serializers.ItineraryItemSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_class = filters.ItineraryItemFilter
+    pagination_class = ItineraryItemPagination
 
-    def update_itinerary_item(self, instance):
-        # Then update the last_content_update of the parent Trip
-        trip = instance.trip
-        trip.last_content_update = timezone.now()
-        trip.save()
+    def update_itinerary_item(self, trip_id, days):
+        # Then update the last_content_update of the parent Trip once the request's transaction commits
+        record_itinerary_change(trip_id, days)
 
     def get_content_type_from_activity_content_type(self, activity_content_type):
-        try:
-            content_type = ContentType.objects.get(model=activity_content_type.lower())
-            return content_type
-        except ContentType.DoesNotExist:
+        activity_type = registry.get(activity_content_type)
+        if activity_type is None:
             raise ValueError(f"Invalid activity_content_type: {activity_content_type}")
+        return activity_type.content_type
 
     def get_queryset(self):
         trip_id = self.kwargs.get('trip_id')
         if trip_id is not None:
-            return models.ItineraryItem.objects.filter(trip__id=trip_id, trip__created_by=self.request.user)
-        return models.ItineraryItem.objects.filter(trip__created_by=self.request.user)
+            return models.ItineraryItem.objects.filter(trip__id=trip_id, trip__created_by=self.request.user.pk)
+        return models.ItineraryItem.objects.filter(trip__created_by=self.request.user.pk)
+
+    def serves_document(self, request):
+        # Shaped responses are serialized from the live tables
+        shaped = any(get_query_param_set(request, param) is not None for param in ('fields', 'expand'))
+        return self.kwargs.get('trip_id') is not None and not shaped
+
+    def document_response(self, document):
+        items = document.items if document is not None else []
+        page = self.paginate_queryset(items)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(items)
+
+    def serialize_items(self, items):
+        if is_expanded(self.request, 'activity'):
+            items = prefetch_activities(items)
+        return self.get_serializer(items, many=True).data
+
+    @method_decorator(itinerary_condition)
+    def list(self, request, *args, **kwargs):
+        if self.serves_document(request):
+            # Serve the trip's stored itinerary document instead of serializing every item
+            return self.document_response(documents.get_document(self.kwargs['trip_id'], request.user))
+
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_items(page))
+        return Response(self.serialize_items(queryset))
+
+    @async_itinerary_condition
+    async def async_list(self, request, *args, **kwargs):
+        if self.serves_document(request):
+            return self.document_response(await documents.aget_document(self.kwargs['trip_id'], request.user))
+
+        # The catalog the activities are resolved from and the page of items don't depend on each other
+        _, page = await asyncio.gather(
+            catalog.aget_snapshot(),
+            sync_to_async(self.paginate_queryset)(self.filter_queryset(self.get_queryset())),
+        )
+        data = await sync_to_async(self.serialize_items)(page)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        prefetch_activities([instance])
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
 
+    @method_decorator(transaction.atomic)
     def create(self, request, *args, **kwargs):
         serializer_data = request.data.copy()
         activity_content_type = serializer_data.get('activity_content_type')
@@ -90,47 +140,71 @@ class ItineraryItemView(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=serializer_data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
+        prefetch_activities([serializer.instance])
         headers = self.get_success_headers(serializer.data)
 
         if serializer.instance:
-            self.update_itinerary_item(serializer.instance)
+            self.update_itinerary_item(serializer.instance.trip_id, [serializer.instance.day])
 
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    @method_decorator(transaction.atomic)
     def update(self, request, *args, **kwargs):
+        # Also runs for partial updates. The instance is shared with the serializer, keep its day before it changes.
         instance = self.get_object()
-        if instance.trip.created_by != request.user and not request.user.is_staff and not request.user.is_superuser:
-            return Response(status=status.HTTP_403_FORBIDDEN)
+        previous_day = instance.day
 
         response = super().update(request, *args, **kwargs)
 
         if response.status_code in [status.HTTP_200_OK, status.HTTP_201_CREATED]:
-            self.update_itinerary_item(instance)
+            self.update_itinerary_item(instance.trip_id, [previous_day, response.data['day']])
 
         return response
 
-    def partial_update(self, request, *args, **kwargs):
+    @method_decorator(transaction.atomic)
+    def move(self, request, *args, **kwargs):
+        """
+        Moves an item within or across days by rewriting only its own rank key.
+        """
         instance = self.get_object()
-        if instance.trip.created_by != request.user and not request.user.is_staff and not request.user.is_superuser:
-            return Response(status=status.HTTP_403_FORBIDDEN)
+        serializer = serializers.ItineraryItemMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        day = serializer.validated_data.get('day', instance.day)
+        after_id = serializer.validated_data.get('after_id')
+        before_id = serializer.validated_data.get('before_id')
+
+        try:
+            try:
+                key = ordering.key_for_move(instance, day, after_id, before_id)
+            except ordering.NoRoomBetweenKeys:
+                # Neighbours sharing a key leave no room between them, spread the day out and retry
+                ordering.rebalance_day(instance.trip_id, day)
+                key = ordering.key_for_move(instance, day, after_id, before_id)
+        except ValueError as e:
+            # Neighbours that aren't on the day or are out of order
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        response = super().partial_update(request, *args, **kwargs)
+        previous_day = instance.day
+        instance.activity_order = key
+        instance.day = day
+        instance.save(update_fields=['activity_order', 'day', 'date_updated'])
+        self.update_itinerary_item(instance.trip_id, [previous_day, day])
 
-        if response.status_code == status.HTTP_200_OK:
-            self.update_itinerary_item(instance)
+        if ordering.needs_rebalance(key):
+            ordering.schedule_rebalance(instance.trip_id, day)
 
-        return response
+        prefetch_activities([instance])
+        return Response(self.get_serializer(instance).data)
 
+    @method_decorator(transaction.atomic)
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        if instance.trip.created_by != request.user and not request.user.is_staff and not request.user.is_superuser:
-            return Response(status=status.HTTP_403_FORBIDDEN)
-
-        trip = instance.trip
         response = super().destroy(request, *args, **kwargs)
 
         if response.status_code == status.HTTP_204_NO_CONTENT:
-            self.update_itinerary_item(trip)
+            self.update_itinerary_item(instance.trip_id, [instance.day])
+
+        return response
 
 
 class ItineraryItemBulkView(APIView):
@@ -138,50 +212,37 @@ class ItineraryItemBulkView(APIView):
 
     def check_items_permissions(self, request, item_ids):
         """
-        Check permissions for a list of itinerary items.
+        Check permissions for a list of itinerary items, with a single query.
         """
-        items = models.ItineraryItem.objects.filter(id__in=item_ids)
-
-        if len(item_ids) != items.count():
-            raise NotFound("One or more items were not found.")
-
-        for item in items:
-            if item.itinerary_item.trip.created_by != request.user and not request.user.is_staff and not request.user.is_superuser:
-                self.permission_denied(request)
+        return authorization.authorize_ids(request, models.ItineraryItem, item_ids)
 
     def check_trips_permissions(self, request, trip_ids):
         """
-        Check permissions for a list of trips.
+        Check permissions for a list of trips, with a single query.
         """
-        trips = models.Trip.objects.filter(id__in=trip_ids)
-
-        if len(trip_ids) != trips.count():
-            raise NotFound("One or more trips were not found.")
+        return authorization.authorize_ids(request, models.Trip, trip_ids)
 
-        for trip in trips:
-            if trip.created_by != request.user and not request.user.is_staff and not request.user.is_superuser:
-                self.permission_denied(request)
+    def record_change(self, trip_id, days):
+        if days:
+            record_itinerary_change(trip_id, days)
 
     def post(self, request, trip_id):
-        print("Post method called")
-        print("request data:", request.data)
-        # serializer = serializers.ItineraryItemsBulkSerializer(data=request.data, context={'trip_id': trip_id})
+        self.check_trips_permissions(request, [trip_id])
         serializer = serializers.ItineraryItemsBulkSerializer(
             data=request.data,
             context={'trip_id': trip_id, 'http_method': 'POST'}
         )
+        serializer.is_valid(raise_exception=True)
 
-        # print("Serializer Errors:", serializer.errors)
-        if not serializer.is_valid():
-            print('errors:', serializer.errors)
         with transaction.atomic():
-            if serializer.is_valid(raise_exception=True):
-                print("Serialized Data:", serializer.initial_data)
-                serializer.save()
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
+            serializer.save()
+            self.record_change(trip_id, [item.day for item in serializer.instance])
+        prefetch_activities(serializer.instance)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @method_decorator(transaction.atomic)
     def put(self, request, trip_id):
-        print("bulk put view")
+        self.check_trips_permissions(request, [trip_id])
 
         # Initialize the serializer and validate the data
         serializer = serializers.ItineraryItemsBulkSerializer(
@@ -190,69 +251,73 @@ class ItineraryItemBulkView(APIView):
         )
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        print('hello:', serializer.validated_data[0])
+
         # Fetch all the instances based on the validated data
-        item_ids = [item_data["id"] for item_data in serializer.validated_data]
-        item_instances = models.ItineraryItem.objects.filter(id__in=item_ids)
+        item_ids = {item_data.get("id") for item_data in serializer.validated_data}
+        item_instances = list(models.ItineraryItem.objects.filter(id__in=item_ids, trip_id=trip_id))
 
-        if len(item_instances) != len(item_ids):
+        if None in item_ids or len(item_instances) != len(item_ids):
             raise ValidationError("Some items do not exist.")
-        print('noooo', request.data)
-        # Reinitialize the serializer, passing the instances to indicate update operation
-        serializer = serializers.ItineraryItemsBulkSerializer(
-            instance=item_instances,  # Pass the instances here!
-            data=request.data,
-            context={'trip_id': trip_id, 'http_method': 'PUT'}
-        )
 
-        # Ensure the new serializer instance is also valid before saving
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # The payload is validated once, passing the instances makes save() run the bulk update
+        serializer.instance = item_instances
 
         # Save the validated data
+        previous_days = [item.day for item in item_instances]
         serializer.save()
+        self.record_change(trip_id, previous_days + [item.day for item in serializer.instance])
+        prefetch_activities(serializer.instance)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    # def put(self, request, trip_id):
-    #     print("bulk put view")
-    #     if not all("id" in item_data for item_data in request.data):
-    #         raise ValidationError("All items must contain an 'id' for updating.")
-    #     # self.check_items_permissions(request, item_ids)
-    #
-    #     with transaction.atomic():
-    #         updated_items = []
-    #         for item_data in request.data:
-    #             item_instance = models.ItineraryItem.objects.get(id=item_data["id"])
-    #             # serializer = serializers.ItineraryItemSerializer(item_instance, data=item_data, partial=True,
-    #             #                                                  context={'trip_id': trip_id})
-    #             serializer = serializers.ItineraryItemSerializer(
-    #                 item_instance,
-    #                 data=item_data,
-    #                 partial=True,
-    #                 context={'trip_id': trip_id, 'http_method': 'PUT'}
-    #             )
-    #
-    #             if serializer.is_valid(raise_exception=True):
-    #                 serializer.save()
-    #                 updated_items.append(serializer.data)
-    #             else:
-    #                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    #
-    #         return Response(updated_items, status=status.HTTP_200_OK)
-
     def delete(self, request, trip_id):
+        self.check_trips_permissions(request, [trip_id])
         serializer = serializers.ItineraryItemsBulkDeleteSerializer(data=request.data, context={'trip_id': trip_id})
         if serializer.is_valid(raise_exception=True):
-            # Future: Add checks for trip ownership here.
-
+            item_ids = self.check_items_permissions(request, serializer.validated_data['ids'])
             with transaction.atomic():
-                models.ItineraryItem.objects.filter(id__in=serializer.validated_data['ids']).delete()
+                items = models.ItineraryItem.objects.filter(id__in=item_ids, trip_id=trip_id)
+                days = list(items.values_list('day', flat=True).distinct())
+                if items.soft_delete() != len(item_ids):
+                    # Rolls the update back, e.g. when an item was deleted or moved in the meantime
+                    raise NotFound("One or more itinerary items were not found in this trip.")
+                self.record_change(trip_id, days)
 
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class BaseActivityView(generics.UpdateAPIView, generics.DestroyAPIView):
+class ItineraryExportView(APIView):
+    """
+    Streams the itinerary items of a trip, or of all of the user's trips, as NDJSON, CSV or iCalendar.
+    Staff export every trip, or the trips of one user with ?user=<id>.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The export format comes from the URL, errors are rendered with the default renderer
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, export_format, trip_id=None):
+        items = models.ItineraryItem.objects.filter(trip__is_deleted=False)
+        if trip_id is not None:
+            trip = authorization.get_object(request, models.Trip.objects.all(), trip_id)
+            items, filename = items.filter(trip=trip), trip.title
+        else:
+            items, filename = authorization.owned_by(items, request.user), 'itinerary'
+            user_id = request.query_params.get('user')
+            if user_id and authorization.is_privileged(request.user):
+                try:
+                    items = items.filter(trip__created_by=uuid.UUID(user_id))
+                except ValueError:
+                    raise ValidationError({'user': "Must be a user id."})
+
+        response = exports.export_response(request, export_format, items, filename)
+        if response is None:
+            raise NotFound(f"Unknown export format, use one of: {', '.join(exports.EXPORTERS)}.")
+        return response
+
+
+class BaseActivityView(authorization.OwnedObjectMixin, generics.UpdateAPIView, generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     lookup_url_kwarg = 'pk'
 
@@ -261,20 +326,24 @@ class BaseActivityView(generics.UpdateAPIView, generics.DestroyAPIView):
         This view should return a list of all the instances
         for the currently authenticated user, or for staff/admin.
         """
-        user = self.request.user
-        if user.is_staff or user.is_superuser:
-            return self.serializer_class.Meta.model.objects.all()
-        return self.serializer_class.Meta.model.objects.filter(itinerary_item__trip__created_by=user)
-
-    def get_object(self):
-        obj = get_object_or_404(self.get_queryset(), pk=self.kwargs.get('pk'))
-        return obj
-
-    def check_permissions(self, request):
-        super().check_permissions(request)
-        instance = self.get_object()
-        if instance.itinerary_item.trip.created_by != request.user and not request.user.is_staff and not request.user.is_superuser:
-            self.permission_denied(request)
+        return authorization.owned_by(self.serializer_class.Meta.model.objects.all(), self.request.user)
+
+    def record_change(self, instance):
+        # The activity is rendered in the itinerary of every item pointing to it
+        for trip_id, day in instance.itinerary_items.values_list('trip_id', 'day'):
+            record_itinerary_change(trip_id, [day])
+
+    @method_decorator(transaction.atomic)
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.record_change(serializer.instance)
+
+    @method_decorator(transaction.atomic)
+    def perform_destroy(self, instance):
+        # The items of the activity go with it, they would otherwise point to a deleted activity until it is purged
+        self.record_change(instance)
+        instance.itinerary_items.all().soft_delete()
+        super().perform_destroy(instance)
 
     def update(self, request, *args, **kwargs):
         super().update(request, *args, **kwargs)